@@ -17,7 +17,12 @@ USAGE_PARAMS_SHORT_NAMES = {
     "res_cf_stress_test_folder": "res_cf_stress_test_folder",
     "res_cf_stress_test_cy": "res_cf_stress_test_cy", 
     "mode": "mode",
-    "team": "team"
+    "team": "team",
+    "export_lp_model": "export_lp_model",
+    "lp_model_format": "lp_model_format",
+    "lp_model_compression": "lp_model_compression",
+    "highs_warm_start": "highs_warm_start",
+    "highs_warm_start_measure_savings": "highs_warm_start_measure_savings"
 }
 
 
@@ -72,6 +77,17 @@ class UsageParameters:
     apply_cf_techno_breakthrough: bool = False
     res_cf_stress_test_folder: str = None
     res_cf_stress_test_cy: int = None
+    # export of optimisation model (LP/MPS file, possibly compressed - "gz"/"zst") -> to be deactivated for
+    # production runs
+    export_lp_model: bool = True
+    lp_model_format: str = "lp"
+    lp_model_compression: Optional[str] = None
+    # warm-start HiGHS solves from the basis of previous ones (rolling-horizon windows, successive scenarios of
+    # scenario runner with the same network topology)
+    highs_warm_start: bool = True
+    # measure iterations and time saved by warm starts, re-solving warm-started LPs from scratch -> to be
+    # deactivated for production runs
+    highs_warm_start_measure_savings: bool = False
 
     def check_types(self):
         """
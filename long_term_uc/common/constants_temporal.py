@@ -1 +1,3 @@
 DAY_OF_WEEK = {1: "Mon", 2: "Tue", 3: "Wed", 4: "Thur", 5: "Fri", 6: "Sat", 7: "Sun"}
+# time resolutions (in hours) of UC runs - dividing 24h, so that UC periods (whole days) are made of full time steps
+TIME_RESOLUTIONS_HOURS = [1, 2, 3, 4, 6]
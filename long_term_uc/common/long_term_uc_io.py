@@ -29,6 +29,8 @@ class ColumnNames:
     value: str = "value"
     zone_origin: str = "zone_origin"
     zone_destination: str = "zone_destination"
+    zone: str = "zone"
+    market_node: str = "market_node"
 
 
 @dataclass
@@ -37,6 +39,12 @@ class FilesFormat:
     decimal_sep: str = "."
 
 
+@dataclass
+class SpatialGranularities:
+    country: str = "country"  # (meta-)countries, as in aggregated ERAA data
+    market_node: str = "market_node"  # ERAA market nodes, with tens of zones
+
+
 @dataclass
 class ComplemDataSources:
     from_json_tb_modif: str = "from_json_tb_modif"
@@ -61,12 +69,29 @@ INPUT_LT_UC_COUNTRY_SUBFOLDER = f"{INPUT_LT_UC_SUBFOLDER}/countries"
 INPUT_FUNC_PARAMS_SUBFOLDER = f"{INPUT_FOLDER}/functional_params"
 INTERCO_STR_SEP = "2"
 INPUT_CY_STRESS_TEST_SUBFOLDER = "cy_stress-test"
+INPUT_PECD_SUBFOLDER = "PECD"
+# ERAA data at market node granularity, with same subfolders and file names (node instead of country) as
+# aggregated data
+INPUT_MARKET_NODES_SUBFOLDER = "market_nodes"
 # first date in ERAA data (fictive 364 days calendar)
 MIN_DATE_IN_DATA = datetime(year=1900, month=1, day=1)
 # first date NOT in ERAA data (fictive 364 days calendar)
 MAX_DATE_IN_DATA = datetime(year=1901, month=1, day=1)
+# number of (hourly) time-slots per climatic year in ERAA data
+N_HOURS_PER_CLIMATIC_YEAR = int((MAX_DATE_IN_DATA - MIN_DATE_IN_DATA).total_seconds() // 3600)
 OUTPUT_DATA_FOLDER = "output/long_term_uc/data"
+# typed columnar copies of ERAA csv files (rebuilt automatically when source file changes)
+OUTPUT_ERAA_CACHE_FOLDER = "output/long_term_uc/eraa_cache"
+# dense (climatic year, hour) arrays of ERAA time-series, to be memory-mapped
+OUTPUT_ERAA_DATA_STORE_FOLDER = "output/long_term_uc/eraa_data_store"
+# single (compressed) file with all ERAA data, to be built once and copied on new machines/containers
+OUTPUT_ERAA_WAREHOUSE_FILE = "output/long_term_uc/eraa_warehouse.npz"
 OUTPUT_FIG_FOLDER = "output/long_term_uc/figures"
+# built (pre-solve) PyPSA networks, named after a fingerprint of their inputs
+OUTPUT_NETWORK_SNAPSHOT_FOLDER = "output/long_term_uc/network_snapshots"
+# runs of scenarios grids, with one (isolated) folder per scenario
+OUTPUT_SCENARIOS_FOLDER = "output/long_term_uc/scenarios"
+SPATIAL_GRANULARITIES = SpatialGranularities()
 
 
 def get_json_usage_params_file() -> str:
@@ -89,6 +114,14 @@ def get_json_fuel_sources_tb_modif_file() -> str:
     return os.path.join(INPUT_LT_UC_SUBFOLDER, "fuel_sources_to-be_modif.json")
 
 
+def get_json_scenarios_grid_file() -> str:
+    return os.path.join(INPUT_LT_UC_SUBFOLDER, "scenarios_grid.json")
+
+
+def get_scenario_run_folder(run_name: str, scenario_name: str) -> str:
+    return os.path.join(OUTPUT_SCENARIOS_FOLDER, run_name, scenario_name)
+
+
 def get_json_params_modif_country_files() -> List[str]:
     return map(
         lambda x: os.path.join(INPUT_LT_UC_COUNTRY_SUBFOLDER, x),
@@ -96,6 +129,19 @@ def get_json_params_modif_country_files() -> List[str]:
                os.listdir(INPUT_LT_UC_COUNTRY_SUBFOLDER)))
 
 
+def get_zones_to_market_nodes_file() -> str:
+    return os.path.join(INPUT_ERAA_FOLDER, "zones_to_market_nodes.csv")
+
+
+def get_eraa_zones_folder(spatial_granularity: str) -> str:
+    """
+    Get folder of ERAA data at a given spatial granularity - see SPATIAL_GRANULARITIES
+    """
+    if spatial_granularity == SPATIAL_GRANULARITIES.market_node:
+        return os.path.join(INPUT_ERAA_FOLDER, INPUT_MARKET_NODES_SUBFOLDER)
+    return INPUT_ERAA_FOLDER
+
+
 def get_json_pypsa_static_params_file() -> str:
     return os.path.join(INPUT_LT_UC_SUBFOLDER, "pypsa_static_params.json") 
 
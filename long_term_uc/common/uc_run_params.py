@@ -1,12 +1,16 @@
-from dataclasses import dataclass, field
+import os
+from copy import deepcopy
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple, Union
 
 from long_term_uc.common.constants_extract_eraa_data import ERAADatasetDescr
+from long_term_uc.common.constants_temporal import TIME_RESOLUTIONS_HOURS
 from long_term_uc.common.error_msgs import print_errors_list, print_out_msg
-from long_term_uc.common.long_term_uc_io import MIN_DATE_IN_DATA, MAX_DATE_IN_DATA
+from long_term_uc.common.long_term_uc_io import DT_FILE_PREFIX, DT_SUBFOLDERS, INPUT_CY_STRESS_TEST_SUBFOLDER, \
+    MIN_DATE_IN_DATA, MAX_DATE_IN_DATA, SPATIAL_GRANULARITIES, get_eraa_zones_folder, get_zones_to_market_nodes_file
 from long_term_uc.utils.basic_utils import get_period_str, are_lists_eq
-from long_term_uc.utils.eraa_utils import set_interco_to_tuples
+from long_term_uc.utils.eraa_utils import read_zones_to_market_nodes, set_interco_to_tuples
 
 
 DATE_FORMAT = "%Y/%m/%d"
@@ -37,6 +41,35 @@ class UCRunParams:
     interco_capas_updated_values: Union[Dict[str, float], Dict[Tuple[str, str], float]] = field(default_factory=dict)
     updated_capacities_prod_types: Dict[str, Optional[Dict[str, float]]] = field(default_factory=dict)
     updated_fuel_sources_params: Dict[str, Dict[str, Optional[float]]] = None
+    # zones modelled - (meta-)countries, or their market nodes; see SPATIAL_GRANULARITIES
+    spatial_granularity: str = SPATIAL_GRANULARITIES.country
+    # zones clustering into a reduced network, see long_term_uc/include/zones_clustering.py -> user-defined
+    # {cluster name: its zones}, or number of automatic clusters (None for both -> no clustering)
+    zones_clusters: Dict[str, List[str]] = None
+    n_zones_clusters: int = None
+    # rolling-horizon optimisation, see long_term_uc/include/rolling_horizon.py -> window and overlap durations,
+    # in hours (None window for a single optimisation over the whole UC period)
+    rolling_horizon_window: int = None
+    rolling_horizon_overlap: int = 24
+    # time resolution of UC run (in hours, see TIME_RESOLUTIONS_HOURS) -> demand and CF data resampled (mean
+    # over each time step), snapshots weighted by this resolution; outputs upsampled to hourly ones if asked
+    time_resolution_hours: int = 1
+    hourly_outputs: bool = True
+    # temporal aggregation into representative periods, see long_term_uc/include/temporal_aggregation.py ->
+    # number of periods (None for no aggregation) and their duration in hours
+    n_representative_periods: int = None
+    representative_period_hours: int = 24
+    # adaptive resolution, see long_term_uc/include/adaptive_resolution.py -> max. duration (in hours) of blocks
+    # of calm hours (None for no adaptive resolution) and max. range of (relative) residual loads within them;
+    # hours with residual load above stress ratio x supply limit of a zone, and share of hours with highest
+    # ratios, kept hourly
+    adaptive_resolution_max_hours: int = None
+    adaptive_resolution_max_ratios_range: float = 0.2
+    adaptive_resolution_stress_ratio: float = 0.9
+    adaptive_resolution_stress_share: float = 0.1
+    # selection of aggreg. prod types as read, before expansion of "all" for the target year in coherence_check
+    # -> to expand it for other target years (see scenario runner)
+    raw_selected_prod_types: Dict[str, Optional[List[str]]] = None
 
     def __repr__(self):
         repr_str = "UC long-term model run with params:"
@@ -45,6 +78,19 @@ class UCRunParams:
         period_str = get_period_str(period_start=self.uc_period_start, period_end=self.uc_period_end)
         repr_str += f"\n- year: {self.selected_target_year}, on period {period_str}"
         repr_str += f"\n- climatic year: {self.selected_climatic_year}"
+        if self.spatial_granularity != SPATIAL_GRANULARITIES.country:
+            repr_str += f"\n- spatial granularity: {self.spatial_granularity}"
+        if self.rolling_horizon_window is not None:
+            repr_str += (f"\n- rolling horizon: windows of {self.rolling_horizon_window}h, "
+                         f"overlap {self.rolling_horizon_overlap}h")
+        if self.time_resolution_hours != 1:
+            repr_str += f"\n- time resolution: {self.time_resolution_hours}h"
+        if self.n_representative_periods is not None:
+            repr_str += (f"\n- {self.n_representative_periods} representative periods of "
+                         f"{self.representative_period_hours}h")
+        if self.adaptive_resolution_max_hours is not None:
+            repr_str += (f"\n- adaptive resolution: blocks of up to {self.adaptive_resolution_max_hours}h out of "
+                         f"stress hours")
         return repr_str
 
     def process(self, available_countries: List[str]):
@@ -113,6 +159,8 @@ class UCRunParams:
                  and self.selected_climatic_year not in eraa_data_descr.available_climatic_years_stress_test):
             errors_list.append(f"Unknown climatic year {self.selected_climatic_year}")
 
+        if self.raw_selected_prod_types is None:
+            self.raw_selected_prod_types = deepcopy(self.selected_prod_types)
         for elt_country, current_agg_pt in self.selected_prod_types.items():
             if current_agg_pt == ['all']:
                 self.selected_prod_types[elt_country] = eraa_data_descr.available_aggreg_prod_types[elt_country][year]
@@ -158,9 +206,132 @@ class UCRunParams:
                 if val < 0:
                     errors_list.append(f"Updated fuel source {source} param {name} must be non-negative; but value read {val}")
 
+        # known spatial granularity
+        if self.spatial_granularity not in SPATIAL_GRANULARITIES.__dict__.values():
+            errors_list.append(f"Unknown spatial granularity {self.spatial_granularity}; allowed values are "
+                               f"{list(SPATIAL_GRANULARITIES.__dict__.values())}")
+        elif self.spatial_granularity == SPATIAL_GRANULARITIES.market_node:
+            errors_list.extend(self.get_market_nodes_errors(eraa_data_descr=eraa_data_descr))
+
+        # zones clustering: selected zones, in only one cluster
+        if self.zones_clusters is not None:
+            clustered_zones = [zone for cluster_zones in self.zones_clusters.values() for zone in cluster_zones]
+            if len(set(clustered_zones)) < len(clustered_zones):
+                errors_list.append("Zone(s) in multiple clusters of zones clustering")
+            unknown_clustered_zones = list(set(clustered_zones) - countries_set)
+            if len(unknown_clustered_zones) > 0:
+                errors_list.append(f"Non-selected zone(s) in zones clustering: {unknown_clustered_zones}")
+        if self.n_zones_clusters is not None \
+                and not (isinstance(self.n_zones_clusters, int) and self.n_zones_clusters > 0):
+            errors_list.append(f"Number of zones clusters must be a positive int; but value read "
+                               f"{self.n_zones_clusters}")
+
+        # rolling horizon: positive window, longer than (non-negative) overlap
+        if self.rolling_horizon_window is not None \
+                and not (isinstance(self.rolling_horizon_window, int) and isinstance(self.rolling_horizon_overlap, int)
+                         and 0 <= self.rolling_horizon_overlap < self.rolling_horizon_window):
+            errors_list.append(f"Rolling horizon window ({self.rolling_horizon_window}h) and overlap "
+                               f"({self.rolling_horizon_overlap}h) must be ints, with 0 <= overlap < window")
+
+        if self.time_resolution_hours not in TIME_RESOLUTIONS_HOURS:
+            errors_list.append(f"Time resolution must be in {TIME_RESOLUTIONS_HOURS} (hours); but value read "
+                               f"{self.time_resolution_hours}")
+        elif isinstance(self.representative_period_hours, int) \
+                and self.representative_period_hours % self.time_resolution_hours != 0:
+            errors_list.append(f"Duration of representative periods ({self.representative_period_hours}h) must be "
+                               f"a multiple of time resolution ({self.time_resolution_hours}h)")
+
+        # representative periods: positive ints
+        if self.n_representative_periods is not None \
+                and not (isinstance(self.n_representative_periods, int) and self.n_representative_periods > 0
+                         and isinstance(self.representative_period_hours, int) and self.representative_period_hours > 0):
+            errors_list.append(f"Number of representative periods ({self.n_representative_periods}) and their "
+                               f"duration ({self.representative_period_hours}h) must be positive ints")
+        # (rolling windows would cut representative periods, and their cyclic storage constraints)
+        if self.n_representative_periods is not None and self.rolling_horizon_window is not None:
+            errors_list.append("Representative periods cannot be used with rolling horizon optimisation")
+
+        # adaptive resolution: positive max. block duration, non-negative range, positive ratio and share; from
+        # hourly data, not to be combined with representative periods
+        if self.adaptive_resolution_max_hours is not None:
+            if not (isinstance(self.adaptive_resolution_max_hours, int) and self.adaptive_resolution_max_hours > 0
+                    and isinstance(self.adaptive_resolution_max_ratios_range, (int, float))
+                    and self.adaptive_resolution_max_ratios_range >= 0
+                    and isinstance(self.adaptive_resolution_stress_ratio, (int, float))
+                    and self.adaptive_resolution_stress_ratio > 0
+                    and isinstance(self.adaptive_resolution_stress_share, (int, float))
+                    and 0 <= self.adaptive_resolution_stress_share <= 1):
+                errors_list.append(f"Adaptive resolution max. block duration "
+                                   f"({self.adaptive_resolution_max_hours}h) must be a positive int, max. range of "
+                                   f"residual load ratios ({self.adaptive_resolution_max_ratios_range}) "
+                                   f"non-negative, stress ratio ({self.adaptive_resolution_stress_ratio}) positive "
+                                   f"and stress share "
+                                   f"({self.adaptive_resolution_stress_share}) in [0, 1]")
+            if self.time_resolution_hours != 1 or self.n_representative_periods is not None:
+                errors_list.append("Adaptive resolution can be used neither with a time resolution other than 1h, "
+                                   "nor with representative periods")
+
         # stop if any error
         if len(errors_list) > 0:
             uncoherent_param_stop(param_errors=errors_list)
         else:
             print_out_msg(msg_level="info", msg="Modified LONG-TERM UC PARAMETERS ARE COHERENT!")
             print_out_msg(msg_level="info", msg=f"RUN CAN START with parameters: {str(self)}")
+
+    def is_zones_clustering(self) -> bool:
+        return self.zones_clusters is not None or self.n_zones_clusters is not None
+
+    def get_market_nodes_errors(self, eraa_data_descr: ERAADatasetDescr) -> List[str]:
+        """
+        Check that a run at market node granularity can be done: nodes of the selected (meta-)countries known, and
+        their ERAA data available; country values (updated capas, interco. capas) cannot be split over nodes ->
+        rejected
+        """
+        errors_list = []
+        zones_to_market_nodes = read_zones_to_market_nodes()
+        countries_wo_nodes = [country for country in self.selected_countries if country not in zones_to_market_nodes]
+        if len(countries_wo_nodes) > 0:
+            errors_list.append(f"No market nodes for selected country(ies) {countries_wo_nodes} (see "
+                               f"{get_zones_to_market_nodes_file()})")
+        # update values given per country -> to be emptied (e.g., in JSON country files) for a market node run
+        if len(self.updated_capacities_prod_types) > 0:
+            errors_list.append(f"Updated capacities (per country) cannot be applied at market node granularity; "
+                               f"but values given for {list(self.updated_capacities_prod_types)}")
+        if len(self.interco_capas_updated_values) > 0:
+            errors_list.append(f"Updated interco. capas (per country) cannot be applied at market node "
+                               f"granularity; but values given for {list(self.interco_capas_updated_values)}")
+        # ERAA data at market node granularity: demand and generation capas per node, interco. capas
+        eraa_folder = get_eraa_zones_folder(spatial_granularity=SPATIAL_GRANULARITIES.market_node)
+        if not os.path.isdir(eraa_folder):
+            errors_list.append(f"No ERAA data folder at market node granularity: {eraa_folder} does not exist")
+            return errors_list
+        demand_folder = os.path.join(eraa_folder, DT_SUBFOLDERS.demand)
+        if self.selected_climatic_year not in eraa_data_descr.available_climatic_years:
+            demand_folder = os.path.join(demand_folder, INPUT_CY_STRESS_TEST_SUBFOLDER)
+        year = self.selected_target_year
+        required_files = [os.path.join(eraa_folder, DT_SUBFOLDERS.interco_capas,
+                                       f"{DT_FILE_PREFIX.interco_capas}_{year}.csv")]
+        for country in self.selected_countries:
+            for market_node in zones_to_market_nodes.get(country, []):
+                required_files.extend(
+                    [os.path.join(demand_folder, f"{DT_FILE_PREFIX.demand}_{year}_{market_node}.csv"),
+                     os.path.join(eraa_folder, DT_SUBFOLDERS.generation_capas,
+                                  f"{DT_FILE_PREFIX.generation_capas}_{year}_{market_node}.csv")])
+        missing_files = [file for file in required_files if not os.path.isfile(file)]
+        if len(missing_files) > 0:
+            errors_list.append(f"Missing ERAA data file(s) at market node granularity: {missing_files}")
+        return errors_list
+
+    def get_market_nodes_run_params(self, zones_to_market_nodes: Dict[str, Tuple[str, ...]]) -> "UCRunParams":
+        """
+        Get run params at market node granularity: "countries" are then the market nodes of the selected
+        (meta-)countries, each one with the aggreg. prod types of its country - see get_market_nodes_errors for
+        the conditions checked beforehand
+        :param zones_to_market_nodes: {(meta-)country: its market nodes}, see read_zones_to_market_nodes
+        """
+        market_nodes_prod_types = {market_node: self.selected_prod_types[country]
+                                   for country in self.selected_countries
+                                   for market_node in zones_to_market_nodes[country]}
+        return replace(self, selected_countries=list(market_nodes_prod_types),
+                       selected_prod_types=market_nodes_prod_types,
+                       spatial_granularity=SPATIAL_GRANULARITIES.market_node)
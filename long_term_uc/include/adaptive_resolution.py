@@ -0,0 +1,194 @@
+"""
+Adaptive (variable) time resolution of UC period, focused on stress hours:
+- residual load of each zone - demand minus RES CF x installed capas -, compared to the limit of its supply
+(dispatchable capas plus import capas) -> hours near this limit kept hourly, the other (calm) hours merged into
+blocks of at most max_block_hours hours, with homogeneous residual loads
+- data averaged over each block - between get_countries_data and dataset_builder functions -, with same format as
+the one of get_countries_data; network snapshots (first hour of each block) weighted by block durations -> storage
+state of charge evolving over the elapsed hours of each block (PyPSA "stores" weightings), hence continuous
+across merged blocks
+- UC results then disaggregated back to hourly ones (values of each block repeated on its hours, state of charge
+interpolated within blocks)
+"""
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import pypsa
+
+from long_term_uc.common.error_msgs import print_out_msg
+from long_term_uc.common.long_term_uc_io import COLUMN_NAMES, DATE_FORMAT
+from long_term_uc.utils.df_utils import resample_ts_df, upsample_ts_df_to_hourly
+
+
+ADAPTIVE_RESOLUTION_META_KEY = "adaptive_resolution"
+FAILURE_PROD_TYPE = "failure"
+
+
+@dataclass
+class AdaptiveResolution:
+    # first date (ERAA calendar) of UC period
+    first_date: str
+    # durations (in hours) of successive time steps - 1 for stress hours
+    blocks_hours: List[int]
+
+    def get_hourly_snapshots(self, target_year: int) -> pd.DatetimeIndex:
+        first_date = datetime.strptime(self.first_date, DATE_FORMAT)
+        return pd.date_range(start=first_date.replace(year=target_year), periods=sum(self.blocks_hours), freq="h")
+
+    def get_snapshots(self, target_year: int) -> pd.DatetimeIndex:
+        blocks_start = np.concatenate([[0], np.cumsum(self.blocks_hours)[:-1]])
+        return self.get_hourly_snapshots(target_year=target_year)[blocks_start]
+
+
+def get_residual_load_ratios(demand: Dict[str, pd.DataFrame], agg_cf_data: Dict[str, pd.DataFrame],
+                             agg_gen_capa_data: Dict[str, pd.DataFrame],
+                             interco_capas: Dict[Tuple[str, str], float], dates: pd.DatetimeIndex) -> np.ndarray:
+    """
+    Get (hour, zone) matrix of residual loads - demand minus RES CF x capas -, relative to supply limit of each
+    zone: capas of its dispatchable units (without failure ones) plus its import capas
+    """
+    date_col = COLUMN_NAMES.date
+    value_col = COLUMN_NAMES.value
+    prod_type_agg_col = f"{COLUMN_NAMES.production_type}_agg"
+    power_capa_col = "power_capacity"
+    zones_ratios = []
+    for zone, df_demand in demand.items():
+        residual_load = df_demand[value_col].to_numpy(dtype=float)
+        df_capas = agg_gen_capa_data.get(zone)
+        zone_capas = df_capas.groupby(prod_type_agg_col)[power_capa_col].sum() \
+            if isinstance(df_capas, pd.DataFrame) else pd.Series(dtype=float)
+        cf_prod_types = []
+        df_cf = agg_cf_data.get(zone)
+        if isinstance(df_cf, pd.DataFrame) and len(df_cf) > 0:
+            df_cf_ts = df_cf.pivot(index=date_col, columns=prod_type_agg_col, values=value_col).reindex(dates)
+            cf_prod_types = list(df_cf_ts.columns)
+            residual_load = residual_load \
+                - df_cf_ts.fillna(0).to_numpy(dtype=float) @ zone_capas.reindex(cf_prod_types).fillna(0).to_numpy()
+        supply_limit = zone_capas.drop(index=cf_prod_types + [FAILURE_PROD_TYPE], errors="ignore").sum() \
+            + sum(capa for (_, zone_dest), capa in interco_capas.items() if zone_dest == zone)
+        zones_ratios.append(residual_load / supply_limit if supply_limit > 0 else np.zeros_like(residual_load))
+    return np.column_stack(zones_ratios)
+
+
+def get_stress_hours(residual_load_ratios: np.ndarray, stress_ratio: float, stress_share: float) -> np.ndarray:
+    """
+    Get hours to be kept hourly: the ones with residual load of a zone above stress_ratio x its supply limit,
+    and the share stress_share of hours with the highest (max. over zones) ratios
+    """
+    max_ratios = residual_load_ratios.max(axis=1)
+    is_stress = max_ratios >= stress_ratio
+    if stress_share > 0:
+        is_stress |= max_ratios >= np.quantile(max_ratios, 1 - stress_share)
+    return is_stress
+
+
+def get_adaptive_blocks(is_stress: np.ndarray, residual_load_ratios: np.ndarray, max_block_hours: int,
+                        max_ratios_range: float) -> List[int]:
+    """
+    Get durations of successive time steps: 1 for stress hours; consecutive calm hours merged (greedily) into
+    blocks of at most max_block_hours hours, in which (relative) residual load of each zone varies by at most
+    max_ratios_range - not to smooth away its variations with block means
+    """
+    blocks_hours = []
+    n_hours = len(is_stress)
+    block_start = 0
+    while block_start < n_hours:
+        block_end = block_start + 1
+        if not is_stress[block_start]:
+            block_min = block_max = residual_load_ratios[block_start]
+            while block_end < n_hours and not is_stress[block_end] and block_end - block_start < max_block_hours:
+                block_min = np.minimum(block_min, residual_load_ratios[block_end])
+                block_max = np.maximum(block_max, residual_load_ratios[block_end])
+                if (block_max - block_min).max() > max_ratios_range:
+                    break
+                block_end += 1
+        blocks_hours.append(block_end - block_start)
+        block_start = block_end
+    return blocks_hours
+
+
+def aggregate_countries_time_series_adaptively(demand: Dict[str, pd.DataFrame], agg_cf_data: Dict[str, pd.DataFrame],
+                                               agg_gen_capa_data: Dict[str, pd.DataFrame],
+                                               interco_capas: Dict[Tuple[str, str], float], max_block_hours: int,
+                                               max_ratios_range: float, stress_ratio: float, stress_share: float) \
+        -> (Dict[str, pd.DataFrame], Dict[str, pd.DataFrame], AdaptiveResolution):
+    """
+    Average (hourly) data over adaptive time steps - hourly on stress hours
+    :param demand, agg_cf_data, agg_gen_capa_data, interco_capas: per-zone data, as obtained with
+    get_countries_data
+    :param max_block_hours, max_ratios_range: see get_adaptive_blocks
+    :param stress_ratio, stress_share: see get_stress_hours
+    :returns: data on adaptive time steps, and adaptive resolution to set network snapshot weightings and
+    disaggregate UC results
+    """
+    dates = pd.DatetimeIndex(next(iter(demand.values()))[COLUMN_NAMES.date])
+    residual_load_ratios = get_residual_load_ratios(demand=demand, agg_cf_data=agg_cf_data,
+                                                    agg_gen_capa_data=agg_gen_capa_data,
+                                                    interco_capas=interco_capas, dates=dates)
+    is_stress = get_stress_hours(residual_load_ratios=residual_load_ratios, stress_ratio=stress_ratio,
+                                 stress_share=stress_share)
+    blocks_hours = get_adaptive_blocks(is_stress=is_stress, residual_load_ratios=residual_load_ratios,
+                                       max_block_hours=max_block_hours, max_ratios_range=max_ratios_range)
+    adaptive_resolution = AdaptiveResolution(first_date=f"{dates[0]:{DATE_FORMAT}}",
+                                             blocks_hours=[int(block_hours) for block_hours in blocks_hours])
+    value_col = COLUMN_NAMES.value
+    blocks_demand = {zone: resample_ts_df(df=df_demand, value_col=value_col, blocks_hours=blocks_hours)
+                     for zone, df_demand in demand.items()}
+    blocks_cf_data = {zone: resample_ts_df(df=df_cf, value_col=value_col, blocks_hours=blocks_hours,
+                                           group_col=f"{COLUMN_NAMES.production_type}_agg")
+                      if isinstance(df_cf, pd.DataFrame) and len(df_cf) > 0 else df_cf
+                      for zone, df_cf in agg_cf_data.items()}
+    print_out_msg(msg_level="info", msg=f"Adaptive resolution: {len(dates)} hours -> {len(blocks_hours)} time "
+                                        f"steps, of which {int(is_stress.sum())} (hourly) stress hours")
+    return blocks_demand, blocks_cf_data, adaptive_resolution
+
+
+def set_network_adaptive_resolution(network: pypsa.Network, adaptive_resolution: AdaptiveResolution,
+                                    target_year: int):
+    """
+    Set snapshots of adaptive time steps, weighted by their durations (for objective, generators and stores ->
+    elapsed hours of storage state of charge) - kept with network to disaggregate results
+    """
+    network.set_snapshots(adaptive_resolution.get_snapshots(target_year=target_year))
+    network.snapshot_weightings.loc[:, :] = np.array(adaptive_resolution.blocks_hours, dtype=float)[:, None]
+    network.meta[ADAPTIVE_RESOLUTION_META_KEY] = asdict(adaptive_resolution)
+
+
+def get_network_adaptive_resolution(network: pypsa.Network) -> Optional[AdaptiveResolution]:
+    adaptive_resolution = network.meta.get(ADAPTIVE_RESOLUTION_META_KEY)
+    if adaptive_resolution is None:
+        return None
+    return AdaptiveResolution(**adaptive_resolution)
+
+
+def get_hourly_time_series(df: pd.DataFrame, adaptive_resolution: AdaptiveResolution) -> pd.DataFrame:
+    """
+    Get UC results (df indexed by snapshots of adaptive time steps) on hourly snapshots - values of each time
+    step repeated on its hours
+    """
+    return upsample_ts_df_to_hourly(df=df, blocks_hours=adaptive_resolution.blocks_hours)
+
+
+def get_hourly_state_of_charge(network: pypsa.Network, adaptive_resolution: AdaptiveResolution) -> pd.DataFrame:
+    """
+    Get hourly state of charge of storage units - interpolated linearly within each time step, its dispatch
+    being constant over its hours (standing losses neglected)
+    """
+    state_of_charge = network.storage_units_t.state_of_charge
+    storage_units = network.storage_units.loc[state_of_charge.columns]
+    # state of charge at the beginning of UC period: last one for cyclic units, initial one otherwise
+    init_state_of_charge = np.where(storage_units["cyclic_state_of_charge"], state_of_charge.iloc[-1],
+                                    storage_units["state_of_charge_initial"])
+    steps_end_soc = state_of_charge.to_numpy()
+    steps_start_soc = np.vstack([init_state_of_charge, steps_end_soc[:-1]])
+    blocks_hours = np.array(adaptive_resolution.blocks_hours)
+    hourly_steps = np.repeat(np.arange(len(blocks_hours)), blocks_hours)
+    # share of each time step elapsed at the end of each of its hours
+    hours_in_steps = np.arange(len(hourly_steps)) - np.repeat(np.cumsum(blocks_hours) - blocks_hours, blocks_hours)
+    elapsed_shares = ((hours_in_steps + 1) / blocks_hours[hourly_steps])[:, None]
+    hourly_soc = steps_start_soc[hourly_steps] \
+        + elapsed_shares * (steps_end_soc[hourly_steps] - steps_start_soc[hourly_steps])
+    return pd.DataFrame(hourly_soc, columns=state_of_charge.columns,
+                        index=pd.date_range(start=state_of_charge.index[0], periods=len(hourly_steps), freq="h"))
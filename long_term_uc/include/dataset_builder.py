@@ -1,9 +1,12 @@
+import gzip
+import hashlib
+import os
 from pathlib import Path
 from datetime import datetime
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Optional, Tuple, Union
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 import pypsa
 
 from long_term_uc.common.error_msgs import print_errors_list, print_out_msg
@@ -11,6 +14,8 @@ from long_term_uc.common.long_term_uc_io import COMPLEM_DATA_SOURCES, COLUMN_NAM
 from long_term_uc.common.fuel_sources import FuelSources
 from long_term_uc.common.uc_run_params import UCRunParams
 from long_term_uc.utils.basic_utils import lexico_compar_str
+from long_term_uc.utils.df_utils import stack_zones_dfs
+from long_term_uc.utils.eraa_utils import IntercoCapasMatrix, is_market_node
 
 
 @dataclass
@@ -25,8 +30,11 @@ class GenUnitsPypsaParams:
 GEN_UNITS_PYPSA_PARAMS = GenUnitsPypsaParams()
 
 
-@dataclass
+@dataclass(slots=True)
 class GenerationUnitData:
+    """
+    (Per-unit) record of a generation unit - obtained from the GenerationUnitTable of all units
+    """
     name: str
     type: str
     carrier: str = None
@@ -40,22 +48,51 @@ class GenerationUnitData:
     cyclic_state_of_charge: bool = None
 
     def get_non_none_attr_names(self):
-        return [key for key, val in self.__dict__.items() if val is not None]
+        return [attr.name for attr in fields(self) if getattr(self, attr.name) is not None]
 
 
-def get_val_of_agg_pt_in_df(df_data: pd.DataFrame, prod_type_agg_col: str, 
-                            agg_prod_type: str, value_col: str, static_val: bool) \
-                                -> Union[np.ndarray, float]:
-    if static_val is True:
-        return df_data[df_data[prod_type_agg_col] == agg_prod_type][value_col].iloc[0]
-    else:
-        return np.array(df_data[df_data[prod_type_agg_col] == agg_prod_type][value_col])
+# static attributes of units, i.e. columns of GenerationUnitTable units df (in addition to name and country)
+UNIT_STATIC_ATTRS = [attr.name for attr in fields(GenerationUnitData) if attr.name != "name"]
+
+
+@dataclass
+class GenerationUnitTable:
+    """
+    Generation units of all countries in columnar format: one column per static attribute in units df (with
+    name and country ones), and p_max_pu time-series of all units in one 2-D (unit, snapshot) array - whose rows
+    are NaN for units with a static p_max_pu
+    """
+    units: pd.DataFrame
+    p_max_pu_ts: np.ndarray
+    has_p_max_pu_ts: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.units)
+
+    def get_countries(self) -> List[str]:
+        return list(self.units["country"].unique())
+
+    def get_unit_data(self, i_unit: int) -> GenerationUnitData:
+        unit_attrs = self.units.iloc[i_unit]
+        unit_data = GenerationUnitData(name=unit_attrs["name"], type=unit_attrs["type"])
+        for attr in UNIT_STATIC_ATTRS:
+            setattr(unit_data, attr, None if pd.isna(unit_attrs[attr]) else unit_attrs[attr])
+        if self.has_p_max_pu_ts[i_unit]:
+            unit_data.p_max_pu = self.p_max_pu_ts[i_unit]
+        return unit_data
+
+    def get_country_units_data(self, country: str) -> List[GenerationUnitData]:
+        return [self.get_unit_data(i_unit=i_unit)
+                for i_unit in np.flatnonzero(self.units["country"].to_numpy() == country)]
 
 
 UNIT_NAME_SEP = "_"
 
 
 def set_country_trigram(country: str) -> str:
+    # market nodes (e.g. se01, ..., se04) already short codes -> kept as is, not to merge different nodes
+    if is_market_node(zone=country):
+        return country
     return f"{country[:3].lower()}"
 
 
@@ -69,110 +106,134 @@ def set_gen_unit_name(country: str, agg_prod_type: str) -> str:
     return f"{country_trigram}{UNIT_NAME_SEP}{agg_prod_type}"
 
 
-GEN_UNITS_DATA_TYPE = Dict[str, List[GenerationUnitData]]
+def get_values_per_agg_pt(df_data: Union[pd.DataFrame, dict], prod_type_agg_col: Union[str, List[str]],
+                          value_col: str) -> Dict[Union[str, tuple], np.ndarray]:
+    """
+    Index values of a df once by aggreg. prod type -> {aggreg. prod type: array of its values, in df order}
+    (instead of filtering df with a boolean mask for each of these types)
+    :param prod_type_agg_col: aggreg. prod type column - or list of columns, e.g. [zone, aggreg. prod type], to
+    get values per tuple of their values
+    """
+    # no data for current country (e.g., {} when no RES CF data read)
+    if not isinstance(df_data, pd.DataFrame) or len(df_data) == 0:
+        return {}
+    values = df_data[value_col].to_numpy()
+    return {agg_pt: values[rows] for agg_pt, rows in df_data.groupby(prod_type_agg_col, sort=False).indices.items()}
 
 
 def get_generation_units_data(uc_run_params: UCRunParams,
                               pypsa_unit_params_per_agg_pt: Dict[str, dict], 
                               units_complem_params_per_agg_pt: Dict[str, Dict[str, str]], 
                               agg_res_cf_data: Dict[str, pd.DataFrame], 
-                              agg_gen_capa_data: Dict[str, pd.DataFrame]) -> GEN_UNITS_DATA_TYPE:
+                              agg_gen_capa_data: Dict[str, pd.DataFrame]) -> GenerationUnitTable:
     """
-    Get generation units data to create them hereafter
-    :param pypsa_unit_params_per_agg_pt: dict of per aggreg. prod type main Pypsa params
+    Get generation units data to create them hereafter - in one pass over all countries
+    :param pypsa_unit_params_per_agg_pt: dict of per aggreg. prod type main Pypsa params - not modified (copied
+    for each unit), so that this function can be called repeatedly in a same session
     :param units_complem_params_per_agg_pt: # for each aggreg. prod type, a dict. {complem. param name: source - "from_json_tb_modif"/"from_eraa_data"}
     :param agg_res_cf_data: {country: df with per aggreg. prod type RES capa factor data}
     :param agg_gen_capa_data: {country: df with per aggreg. prod type (installed) generation capa. data}
     """
-    countries = list(agg_gen_capa_data)
     prod_type_col = COLUMN_NAMES.production_type
     prod_type_agg_col = f"{prod_type_col}_agg"
     value_col = COLUMN_NAMES.value
     # TODO: set as global constants/unify...
-    power_capa_key = "power_capa"
     capa_factor_key = "capa_factors"
 
-    n_spaces_msg = 2
-
-    generation_units_data = {}
-    for country in countries:
-        print_out_msg(msg_level="info", msg=f"- for country {country}")
-        generation_units_data[country] = []
-        current_capa_data = agg_gen_capa_data[country]
-        current_res_cf_data = agg_res_cf_data[country]
-        # get list of assets to be treated from capa. data
-        agg_prod_types = list(set(current_capa_data[prod_type_agg_col]))
-        # initialize set of params for each unit by using pypsa default values
-        current_assets_data = {agg_pt: pypsa_unit_params_per_agg_pt[agg_pt] for agg_pt in agg_prod_types}
-        # and loop over pt to add complementary params
-        for agg_pt in agg_prod_types:
-            print_out_msg(msg_level="info", msg=n_spaces_msg * " " + f"* for aggreg. prod. type {agg_pt}")
-            # set and add asset name
-            gen_unit_name = set_gen_unit_name(country=country, agg_prod_type=agg_pt)
-            current_assets_data[agg_pt]["name"] = gen_unit_name
-            # and "type" (the aggreg. prod types used here, with a direct corresp. to PyPSA generators; 
-            # made explicit in JSON fixed params files)
-            current_assets_data[agg_pt]["type"] = agg_pt
-            if agg_pt in units_complem_params_per_agg_pt and len(units_complem_params_per_agg_pt[agg_pt]) > 0:
-                # add pnom attribute if needed
-                if power_capa_key in units_complem_params_per_agg_pt[agg_pt]:
-                    print_out_msg(msg_level="info", msg=2*n_spaces_msg * " " + f"-> add {power_capa_key}")
-                    current_power_capa = \
-                        get_val_of_agg_pt_in_df(df_data=current_capa_data, prod_type_agg_col=prod_type_agg_col,
-                                                agg_prod_type=agg_pt, value_col="power_capacity",
-                                                static_val=True)
-                    current_assets_data[agg_pt][GEN_UNITS_PYPSA_PARAMS.power_capa] = int(current_power_capa)
-                        
-                # add pmax_pu when variable for RES/fatal units
-                if capa_factor_key in units_complem_params_per_agg_pt[agg_pt]:
-                    print_out_msg(msg_level="info", msg=2*n_spaces_msg * " " + f"-> add {capa_factor_key}")
-                    current_assets_data[agg_pt][GEN_UNITS_PYPSA_PARAMS.capa_factors] = \
-                        get_val_of_agg_pt_in_df(df_data=current_res_cf_data, prod_type_agg_col=prod_type_agg_col,
-                                                agg_prod_type=agg_pt, value_col=value_col, static_val=False)
-                # max hours for storage-like assets (energy capa/power capa)
-
-                # marginal costs/efficiency, from FuelSources
-            elif agg_pt == 'failure':
-                current_assets_data[agg_pt]['p_nom'] = agg_gen_capa_data[country].loc[agg_gen_capa_data[country]['production_type_agg']=='failure', 'power_capacity'].iloc[0]
-                current_assets_data[agg_pt]['marginal_cost'] = uc_run_params.failure_penalty
-                current_assets_data[agg_pt]['committable'] = False
-            current_assets_data[agg_pt]['p_nom'] = agg_gen_capa_data[country].loc[agg_gen_capa_data[country]['production_type_agg']==agg_pt, 'power_capacity'].iloc[0]
-            generation_units_data[country].append(GenerationUnitData(**current_assets_data[agg_pt]))
+    # one unit per (country, aggreg. prod type) of capa. data - in order of appearance in it; data of all
+    # countries (zones) stacked, not to loop over them
+    df_units = stack_zones_dfs(zones_dfs=agg_gen_capa_data, zone_col="country")
+    df_units = df_units[["country", prod_type_agg_col, "power_capacity"]] \
+        .drop_duplicates(subset=["country", prod_type_agg_col], ignore_index=True)
+    df_units = df_units.rename(columns={prod_type_agg_col: "type",
+                                        "power_capacity": GEN_UNITS_PYPSA_PARAMS.power_capa})
+    missing_agg_pts = sorted(set(df_units["type"]) - set(pypsa_unit_params_per_agg_pt))
+    if len(missing_agg_pts) > 0:
+        raise ValueError(f"No PyPSA params for aggreg. prod types {missing_agg_pts} of gen. capa. data")
+    # per aggreg. prod type params joined - i.e. copied - to all units of this type, name/type/pnom being
+    # the ones of each unit
+    df_agg_pt_params = pd.DataFrame.from_dict(pypsa_unit_params_per_agg_pt, orient="index") \
+        .drop(columns=["name", "type", GEN_UNITS_PYPSA_PARAMS.power_capa], errors="ignore")
+    df_units = df_units.join(df_agg_pt_params, on="type")
+    df_units["name"] = [set_gen_unit_name(country=country, agg_prod_type=agg_pt)
+                        for country, agg_pt in zip(df_units["country"], df_units["type"])]
+    # failure units (without complem. params): penalty as marginal cost
+    agg_pts_with_complem = [agg_pt for agg_pt, complem_params in units_complem_params_per_agg_pt.items()
+                            if len(complem_params) > 0]
+    is_failure = (df_units["type"] == "failure") & ~df_units["type"].isin(agg_pts_with_complem)
+    df_units = df_units.reindex(columns=["name", "country"] + UNIT_STATIC_ATTRS)
+    df_units[GEN_UNITS_PYPSA_PARAMS.marginal_cost] = \
+        df_units[GEN_UNITS_PYPSA_PARAMS.marginal_cost].mask(is_failure, uc_run_params.failure_penalty)
+    df_units["committable"] = df_units["committable"].astype(object).mask(is_failure, False)
+
+    # pmax_pu time-series for RES/fatal units, from CF data of all countries indexed once by
+    # (country, aggreg. prod type)
+    agg_pts_with_cf = [agg_pt for agg_pt, complem_params in units_complem_params_per_agg_pt.items()
+                       if capa_factor_key in complem_params]
+    capa_factors = get_values_per_agg_pt(df_data=stack_zones_dfs(zones_dfs=agg_res_cf_data, zone_col="country"),
+                                         prod_type_agg_col=["country", prod_type_agg_col], value_col=value_col)
+    units_cf = {}
+    for i_unit in np.flatnonzero(df_units["type"].isin(agg_pts_with_cf).to_numpy()):
+        country, agg_pt = df_units.at[i_unit, "country"], df_units.at[i_unit, "type"]
+        unit_cf = capa_factors.get((country, agg_pt))
+        if unit_cf is None:
+            print_out_msg(msg_level="warning", msg=f"No CF data for {agg_pt} in {country} -> static "
+                                                   f"{GEN_UNITS_PYPSA_PARAMS.capa_factors} used")
+        else:
+            units_cf[i_unit] = unit_cf
+    n_snapshots = max((len(unit_cf) for unit_cf in units_cf.values()), default=0)
+    p_max_pu_ts = np.full((len(df_units), n_snapshots), np.nan)
+    has_p_max_pu_ts = np.zeros(len(df_units), dtype=bool)
+    for i_unit, unit_cf in units_cf.items():
+        p_max_pu_ts[i_unit] = unit_cf
+        has_p_max_pu_ts[i_unit] = True
+    print_out_msg(msg_level="info", msg=f"{len(df_units)} generation units, of which {len(units_cf)} with "
+                                        f"{GEN_UNITS_PYPSA_PARAMS.capa_factors} time-series")
+    return GenerationUnitTable(units=df_units, p_max_pu_ts=p_max_pu_ts, has_p_max_pu_ts=has_p_max_pu_ts)
+
+
+def overwrite_gen_units_fuel_src_params(generation_units_data: GenerationUnitTable,
+                                        updated_fuel_sources_params: Dict[str, Dict[str, float]]) \
+        -> GenerationUnitTable:
+    # TODO: add CO2 emissions, and merge both case? Q2OJ: how-to properly?
+    marginal_cost_col = GEN_UNITS_PYPSA_PARAMS.marginal_cost
+    updated_marginal_costs = {prod_type: params[marginal_cost_col]
+                              for prod_type, params in updated_fuel_sources_params.items()
+                              if marginal_cost_col in params}
+    # all units of an updated prod type at once
+    units = generation_units_data.units
+    new_marginal_costs = units["type"].map(updated_marginal_costs)
+    is_updated = new_marginal_costs.notna()
+    units.loc[is_updated, marginal_cost_col] = new_marginal_costs[is_updated]
+    # TODO: from units data info on fuel source extract and apply updated params values
     return generation_units_data
 
 
-def overwrite_gen_units_fuel_src_params(generation_units_data: GEN_UNITS_DATA_TYPE, updated_fuel_sources_params: Dict[str, Dict[str, float]]) -> GEN_UNITS_DATA_TYPE:
-    for _, units_data in generation_units_data.items():
-        # loop over all units in current country
-        for indiv_unit_data in units_data:
-            current_prod_type = get_prod_type_from_unit_name(prod_unit_name=indiv_unit_data.name)
-            if current_prod_type in updated_fuel_sources_params:
-                # TODO: add CO2 emissions, and merge both case? Q2OJ: how-to properly?
-                if GEN_UNITS_PYPSA_PARAMS.marginal_cost in updated_fuel_sources_params[current_prod_type]:
-                    indiv_unit_data.marginal_cost = updated_fuel_sources_params[current_prod_type][GEN_UNITS_PYPSA_PARAMS.marginal_cost]
-
-        # TODO: from units data info on fuel source extract and apply updated params values
-        updated_fuel_sources_params = None
-
-
-def control_min_pypsa_params_per_gen_units(generation_units_data: Dict[str, List[GenerationUnitData]],
+def control_min_pypsa_params_per_gen_units(generation_units_data: GenerationUnitTable,
                                            pypsa_min_unit_params_per_agg_pt: Dict[str, List[str]]):
     """
     Control that minimal PyPSA parameter infos has been provided before creating generation units
     """
+    units = generation_units_data.units
+    unknown_types = sorted(set(units["type"]) - set(pypsa_min_unit_params_per_agg_pt))
+    if len(unknown_types) > 0:
+        raise KeyError(f"No 'minimal' PyPSA params for unit types {unknown_types}")
+    # (unit, param) table of provided params - p_max_pu being either static or a time-series
+    params_provided = units.notna()
+    params_provided[GEN_UNITS_PYPSA_PARAMS.capa_factors] |= generation_units_data.has_p_max_pu_ts
     pypsa_params_errors_list = []
-    # loop over countries
-    for country, gen_units_data in generation_units_data.items():
-        # and unit in them
-        for elt_unit_data in gen_units_data:
-            current_unit_type = elt_unit_data.type
-            pypsa_min_unit_params_set = set(pypsa_min_unit_params_per_agg_pt[current_unit_type])
-            params_with_init_val_set = set(elt_unit_data.get_non_none_attr_names())
-            missing_pypsa_params = list(pypsa_min_unit_params_set - params_with_init_val_set)
-            if len(missing_pypsa_params) > 0:
-                current_unit_name = elt_unit_data.name
-                current_msg = f"country {country}, unit name {current_unit_name} and type {current_unit_type} -> {missing_pypsa_params}"
-                pypsa_params_errors_list.append(current_msg)
+    # loop over unit types, and check all units of a type at once
+    for current_unit_type, pypsa_min_unit_params in pypsa_min_unit_params_per_agg_pt.items():
+        is_current_type = (units["type"] == current_unit_type).to_numpy()
+        if not is_current_type.any():
+            continue
+        missing_params = ~params_provided.loc[is_current_type].reindex(columns=pypsa_min_unit_params,
+                                                                       fill_value=False)
+        for i_unit in missing_params.index[missing_params.any(axis=1)]:
+            missing_pypsa_params = list(missing_params.columns[missing_params.loc[i_unit]])
+            current_msg = f"country {units.at[i_unit, 'country']}, unit name {units.at[i_unit, 'name']} " \
+                          f"and type {current_unit_type} -> {missing_pypsa_params}"
+            pypsa_params_errors_list.append(current_msg)
     if len(pypsa_params_errors_list) > 0:
         print_errors_list(error_name="on 'minimal' PyPSA gen. units parameters; missing ones for", 
                         errors_list=pypsa_params_errors_list)     
@@ -181,7 +242,35 @@ def control_min_pypsa_params_per_gen_units(generation_units_data: Dict[str, List
 
 
 def get_country_bus_name(country: str) -> str:
-    return country.lower()[:3]
+    return set_country_trigram(country=country)
+
+
+def add_components_in_bulk(network, component_class: str, components_data: List[dict]):
+    """
+    Add a set of components of a same PyPSA class with one network.add call per group of components sharing
+    the same time-varying attributes (instead of one call per component, each one concatenating PyPSA tables)
+    :param components_data: list of {attribute name: value} - with "name" key; 1-dim arrays are considered as
+    time-varying attributes (indexed by network snapshots), None values replaced by PyPSA default ones
+    """
+    # group components by set of time-varying attributes, keeping order of first appearance
+    components_groups = {}
+    for component_data in components_data:
+        ts_attrs = tuple(attr for attr, val in component_data.items() if isinstance(val, np.ndarray))
+        components_groups.setdefault(ts_attrs, []).append(component_data)
+    for ts_attrs, group_data in components_groups.items():
+        names = [component_data["name"] for component_data in group_data]
+        attr_names = list(dict.fromkeys(attr for component_data in group_data for attr in component_data))
+        attrs_data = {}
+        for attr in attr_names:
+            if attr == "name":
+                continue
+            if attr in ts_attrs:
+                attr_values = np.column_stack([component_data[attr] for component_data in group_data])
+                attrs_data[attr] = pd.DataFrame(attr_values, index=network.snapshots, columns=names)
+            else:
+                attrs_data[attr] = [component_data.get(attr) for component_data in group_data]
+        network.add(component_class, names, **attrs_data)
+    return network
 
 
 def init_pypsa_network(df_demand_first_country: pd.DataFrame):
@@ -192,58 +281,75 @@ def init_pypsa_network(df_demand_first_country: pd.DataFrame):
 
 def add_gps_coordinates(network, countries_gps_coords: Dict[str, Tuple[float, float]]):
     print("Add GPS coordinates") 
-    for country, gps_coords in countries_gps_coords.items():
-        country_bus_name = get_country_bus_name(country=country)
-        network.add("Bus", name=f"{country_bus_name}", x=gps_coords[0], y=gps_coords[1])
-    return network
+    buses_data = [{"name": f"{get_country_bus_name(country=country)}", "x": gps_coords[0], "y": gps_coords[1]}
+                  for country, gps_coords in countries_gps_coords.items()]
+    return add_components_in_bulk(network=network, component_class="Bus", components_data=buses_data)
 
 
 def add_energy_carrier(network, fuel_sources: Dict[str, FuelSources]):
     print("Add energy carriers")
-    for carrier in list(fuel_sources.keys()):
-        network.add("Carrier", name=carrier, co2_emissions=fuel_sources[carrier].co2_emissions/1000)
-    return network
+    carriers_data = [{"name": carrier, "co2_emissions": fuel_sources[carrier].co2_emissions/1000}
+                     for carrier in list(fuel_sources.keys())]
+    return add_components_in_bulk(network=network, component_class="Carrier", components_data=carriers_data)
 
 
 STORAGE_LIKE_UNITS = ["batteries"]
 
 
-def add_generators(network, generators_data: Dict[str, List[GenerationUnitData]]):
+def add_generators(network, generators_data: GenerationUnitTable):
+    """
+    Add units of the table - associated to their respective buses -, with one network.add call per PyPSA class
+    and group of units with static/time-series p_max_pu
+    """
     print("Add generators - associated to their respective buses")
-    for country, gen_units_data in generators_data.items():
-        country_bus_name = get_country_bus_name(country=country)
-        for gen_unit_data in gen_units_data:
-            pypsa_gen_unit_dict = gen_unit_data.__dict__
-            if gen_unit_data.type in STORAGE_LIKE_UNITS:
-                network.add("StorageUnit", bus=f"{country_bus_name}", **pypsa_gen_unit_dict)
-            else:
-                network.add("Generator", bus=f"{country_bus_name}", **pypsa_gen_unit_dict)
+    units = generators_data.units
+    buses = np.array([get_country_bus_name(country=country) for country in units["country"]], dtype=object)
+    is_storage = units["type"].isin(STORAGE_LIKE_UNITS).to_numpy()
+    has_ts = generators_data.has_p_max_pu_ts
+    capa_factors_attr = GEN_UNITS_PYPSA_PARAMS.capa_factors
+    for component_class, is_class_unit in [("StorageUnit", is_storage), ("Generator", ~is_storage)]:
+        for is_ts_group in [False, True]:
+            units_idx = np.flatnonzero(is_class_unit & (has_ts == is_ts_group))
+            if len(units_idx) == 0:
+                continue
+            group_units = units.iloc[units_idx]
+            names = list(group_units["name"])
+            attrs_data = {attr: group_units[attr].to_numpy() for attr in UNIT_STATIC_ATTRS}
+            if is_ts_group:
+                attrs_data[capa_factors_attr] = pd.DataFrame(generators_data.p_max_pu_ts[units_idx].T,
+                                                             index=network.snapshots, columns=names)
+            network.add(component_class, names, bus=buses[units_idx], **attrs_data)
     print("Considered generators", network.generators)
     return network
 
 
 def add_loads(network, demand: Dict[str, pd.DataFrame]):
     print("Add loads - associated to their respective buses")
+    loads_data = []
     for country in demand:
         country_bus_name = get_country_bus_name(country=country)
-        load_data = {"name": f"{country_bus_name}-load", "bus": f"{country_bus_name}",
-                     "carrier": "AC", "p_set": demand[country]["value"].values}
-        network.add("Load", **load_data)
-    return network
+        loads_data.append({"name": f"{country_bus_name}-load", "bus": f"{country_bus_name}",
+                           "carrier": "AC", "p_set": demand[country]["value"].to_numpy()})
+    return add_components_in_bulk(network=network, component_class="Load", components_data=loads_data)
 
 
-from itertools import product
+from itertools import combinations
 
 
-def get_current_interco_capa(interco_capas: Dict[Tuple[str, str], float], country_origin: str, 
-                             country_dest: str) -> (Optional[float], Optional[bool]):
-    link_tuple = (country_origin, country_dest)
-    reverse_link_tuple = (country_dest, country_origin)
-    if link_tuple in interco_capas:
-        current_interco_capa = interco_capas[link_tuple]
-        is_sym_interco = reverse_link_tuple not in interco_capas
-    elif reverse_link_tuple in interco_capas:
-        current_interco_capa = interco_capas[reverse_link_tuple]
+def get_current_interco_capa(interco_capas: Union[Dict[Tuple[str, str], float], IntercoCapasMatrix],
+                             country_origin: str, country_dest: str) -> (Optional[float], Optional[bool]):
+    if isinstance(interco_capas, IntercoCapasMatrix):
+        # direct (array) access to capas in both directions
+        link_capa = interco_capas.get_capa(zone_origin=country_origin, zone_dest=country_dest)
+        reverse_link_capa = interco_capas.get_capa(zone_origin=country_dest, zone_dest=country_origin)
+    else:
+        link_capa = interco_capas.get((country_origin, country_dest))
+        reverse_link_capa = interco_capas.get((country_dest, country_origin))
+    if link_capa is not None:
+        current_interco_capa = link_capa
+        is_sym_interco = reverse_link_capa is None
+    elif reverse_link_capa is not None:
+        current_interco_capa = reverse_link_capa
         is_sym_interco = True
     else:
         current_interco_capa = None
@@ -251,51 +357,63 @@ def get_current_interco_capa(interco_capas: Dict[Tuple[str, str], float], countr
     return current_interco_capa, is_sym_interco
 
 
-def add_interco_links(network, countries: List[str], interco_capas: Dict[Tuple[str, str], float]):
+def get_interco_links_table(interco_capas: Dict[Tuple[str, str], float], countries: List[str]) -> pd.DataFrame:
+    """
+    Get sparse table of interco. links between a set of countries, from capas in input data format
+    - interco. given in both directions -> one (unidirectional) link per direction, p_min_pu = 0
+    - in only one direction -> one bidirectional link with this capa, p_min_pu = -1
+    :returns: df with columns zone_origin, zone_destination, p_nom, p_min_pu, and PyPSA bus0, bus1 and link name
+    """
+    zone_origin_col = COLUMN_NAMES.zone_origin
+    zone_dest_col = COLUMN_NAMES.zone_destination
+    df_links = pd.DataFrame(list(interco_capas), columns=[zone_origin_col, zone_dest_col])
+    df_links["p_nom"] = list(interco_capas.values())
+    df_links = df_links[df_links[zone_origin_col].isin(countries) & df_links[zone_dest_col].isin(countries)
+                        & (df_links[zone_origin_col] != df_links[zone_dest_col])]
+    # (hash-based) check of existence of reverse interco., for all links at once
+    links_idx = pd.MultiIndex.from_frame(df_links[[zone_origin_col, zone_dest_col]])
+    reverse_links_idx = pd.MultiIndex.from_arrays([df_links[zone_dest_col], df_links[zone_origin_col]])
+    df_links["p_min_pu"] = np.where(reverse_links_idx.isin(links_idx), 0, -1)
+    bus_names = {country: get_country_bus_name(country=country) for country in countries}
+    df_links["bus0"] = df_links[zone_origin_col].map(bus_names)
+    df_links["bus1"] = df_links[zone_dest_col].map(bus_names)
+    df_links["name"] = df_links["bus0"] + "-" + df_links["bus1"] + "_ac"
+    return df_links.reset_index(drop=True)
+
+
+def get_interco_links_wo_capa(df_links: pd.DataFrame, countries: List[str]) -> List[Tuple[str, str]]:
+    """
+    Get (lexicographically ordered) pairs of countries without interco. capa data in any direction
+    """
+    pairs_with_capa = set(map(frozenset, zip(df_links[COLUMN_NAMES.zone_origin],
+                                             df_links[COLUMN_NAMES.zone_destination])))
+    return [lexico_compar_str(string1=country_origin, string2=country_dest, return_tuple=True)
+            for country_origin, country_dest in combinations(countries, 2)
+            if frozenset((country_origin, country_dest)) not in pairs_with_capa]
+
+
+def add_interco_links(network, countries: List[str], interco_capas: Dict[Tuple[str, str], float],
+                      check_missing_capas: bool = True):
+    """
+    Add interco. links between the selected countries, built in one pass over the (sparse) interco. capas
+    :param check_missing_capas: stop if capa data is missing for a pair of countries - to be deactivated for
+    large networks (with many zones not interconnected)
+    """
     print(f"Add interco. links - between the selected countries: {countries}")
-    links = []
-    symmetric_links = []
-    links_wo_capa_msg = []
-    for country_origin, country_dest in product(countries, countries):
-        link_tuple = (country_origin, country_dest)
-        # do not add link for (country, country); neither for symmetric links already treated 
-        # (as bidirectional setting p_min_pu=-1)
-        if not country_origin == country_dest and link_tuple not in symmetric_links:
-            # TODO: fix AC/DC.... all AC here in names but not true (cf. CS students data)
-            current_interco_capa, is_sym_interco = \
-                get_current_interco_capa(interco_capas=interco_capas, country_origin=country_origin,
-                                         country_dest=country_dest)
-            if current_interco_capa is None:
-                # if symmetrical interco order lexicographically to fit with input data format
-                if is_sym_interco is True:
-                    link_wo_capa = lexico_compar_str(string1=country_origin,
-                                                     string2=country_dest, return_tuple=True)
-                else:
-                    link_wo_capa = link_tuple
-                link_wo_capa_msg = f"({link_wo_capa[0]}, {link_wo_capa[1]})"
-                if link_wo_capa_msg not in links_wo_capa_msg:
-                    links_wo_capa_msg.append(f"({link_wo_capa[0]}, {link_wo_capa[1]})")
-            else:
-                country_origin_bus_name = get_country_bus_name(country=country_origin)
-                country_dest_bus_name = get_country_bus_name(country=country_dest)
-                if is_sym_interco is True:
-                    p_min_pu, p_max_pu = -1, 1
-                    symmetric_links.append(link_tuple)
-                else:
-                    p_min_pu, p_max_pu = 0, 1
-                links.append({"name": f"{country_origin_bus_name}-{country_dest_bus_name}_ac", 
-                            "bus0": f"{country_origin_bus_name}", "bus1": f"{country_dest_bus_name}", 
-                            "p_nom": current_interco_capa, "p_min_pu": p_min_pu, "p_max_pu" : p_max_pu}
-                            )
-    if len(links_wo_capa_msg) > 0:
-        print_errors_list(error_name="-> interco. links without capacity data", 
-                          errors_list=links_wo_capa_msg)
-    
-    # add to PyPSA network
-    for link in links:
-        if link['p_nom'] > 0:
-            network.add("Link", **link)
+    # TODO: fix AC/DC.... all AC here in names but not true (cf. CS students data)
+    df_links = get_interco_links_table(interco_capas=interco_capas, countries=countries)
+    if check_missing_capas is True:
+        links_wo_capa = get_interco_links_wo_capa(df_links=df_links, countries=countries)
+        if len(links_wo_capa) > 0:
+            print_errors_list(error_name="-> interco. links without capacity data", 
+                              errors_list=[f"({link[0]}, {link[1]})" for link in links_wo_capa])
 
+    # add to PyPSA network
+    df_links = df_links[df_links["p_nom"] > 0]
+    if len(df_links) > 0:
+        network.add("Link", df_links["name"].tolist(), bus0=df_links["bus0"].to_numpy(),
+                    bus1=df_links["bus1"].to_numpy(), p_nom=df_links["p_nom"].to_numpy(),
+                    p_min_pu=df_links["p_min_pu"].to_numpy(), p_max_pu=1)
     return network
 
 
@@ -303,17 +421,79 @@ def set_period_start_file(year: int, period_start: datetime) -> str:
     return datetime(year=year, month=period_start.month, day=period_start.day).strftime("%Y-%m-%d")
 
 
-def save_lp_model(network, year: int, n_countries: int, period_start: datetime):
+@dataclass
+class LpModelFormats:
+    lp: str = "lp"
+    mps: str = "mps"
+
+
+@dataclass
+class LpModelCompressions:
+    gzip: str = "gz"
+    zstd: str = "zst"
+
+
+LP_MODEL_FORMATS = LpModelFormats()
+LP_MODEL_COMPRESSIONS = LpModelCompressions()
+# size of chunks read/written when compressing (and hashing) model files
+LP_MODEL_FILE_CHUNK_SIZE = 4 * 1024 ** 2
+
+
+def open_compressed_file_writer(file: str, compression: Optional[str]):
+    if compression is None:
+        return open(file, mode="wb")
+    if compression == LP_MODEL_COMPRESSIONS.gzip:
+        return gzip.open(file, mode="wb")
+    if compression == LP_MODEL_COMPRESSIONS.zstd:
+        # optional dependency, only needed for this compression
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Package zstandard needed for zstd compression of LP model files "
+                              "-> pip install zstandard, or use gzip compression")
+        return zstandard.ZstdCompressor().stream_writer(open(file, mode="wb"), closefd=True)
+    raise ValueError(f"Unknown LP model compression {compression}; allowed values are "
+                     f"{list(LP_MODEL_COMPRESSIONS.__dict__.values())} (or None)")
+
+
+def save_lp_model(network, year: int, n_countries: int, period_start: datetime,
+                  file_format: str = LP_MODEL_FORMATS.lp, compression: Optional[str] = None) -> str:
+    """
+    Save (linopy) optimisation model of a network in a LP/MPS file - the one built by network.optimize when
+    available, not to build it again -, named after a hash of its content -> same model in same file, no
+    collision of different ones (concurrent runs)
+    :param file_format: see LP_MODEL_FORMATS
+    :param compression: see LP_MODEL_COMPRESSIONS (None for no compression)
+    :returns: name of the saved file
+    """
     print("Save lp model")
-    import pypsa.optimization as opt
     from long_term_uc.common.long_term_uc_io import OUTPUT_DATA_FOLDER
 
-    m = opt.create_model(network)
-    # to avoid suppressing previous runs results
-    run_id = np.random.randint(99)
+    model = network.model
+    if model is None:
+        model = network.optimize.create_model()
     period_start_file = set_period_start_file(year=year, period_start=period_start)
-    file_suffix = f"{n_countries}-countries_{period_start_file}_{run_id}"
-    m.to_file(Path(f'{OUTPUT_DATA_FOLDER}/model_{file_suffix}.lp'))
+    file_prefix = f"{OUTPUT_DATA_FOLDER}/model_{n_countries}-countries_{period_start_file}"
+    os.makedirs(OUTPUT_DATA_FOLDER, exist_ok=True)
+    # model written by linopy (in slices) in a temporary file, then copied by chunks in the final - possibly
+    # compressed - one while hashing its content
+    tmp_model_file = f"{file_prefix}.{os.getpid()}.tmp.{file_format}"
+    tmp_output_file = f"{tmp_model_file}.out"
+    model.to_file(Path(tmp_model_file), io_api=file_format)
+    content_hash = hashlib.sha1()
+    try:
+        with open(tmp_model_file, mode="rb") as f_model, \
+                open_compressed_file_writer(file=tmp_output_file, compression=compression) as f_output:
+            for chunk in iter(lambda: f_model.read(LP_MODEL_FILE_CHUNK_SIZE), b""):
+                content_hash.update(chunk)
+                f_output.write(chunk)
+    finally:
+        os.remove(tmp_model_file)
+    compression_ext = "" if compression is None else f".{compression}"
+    model_file = f"{file_prefix}_{content_hash.hexdigest()[:16]}.{file_format}{compression_ext}"
+    os.replace(tmp_output_file, model_file)
+    print_out_msg(msg_level="info", msg=f"Model saved in {model_file}")
+    return model_file
 
 
 def get_stationary_batt_opt_dec(network, countries: List[str]):
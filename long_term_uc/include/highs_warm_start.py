@@ -0,0 +1,272 @@
+"""
+Warm start of HiGHS solves from the simplex basis of a previous (close) solve - e.g. consecutive rolling-horizon
+windows, adjacent climatic years or small parameter changes, giving nearly identical LPs
+- basis statuses kept per linopy variable/constraint and coordinates (snapshot, component name)
+- and mapped onto new model by component name and snapshot; snapshots absent from previous solve taking the
+statuses at the same position of its horizon (e.g. next rolling window); unmatched entries nonbasic
+(resp. basic for constraints), number of basic entries being then repaired so that HiGHS accepts the basis
+- iterations and time saved measured, if asked, against a cold re-solve of the same (warm-started) LP - doubling
+solve times, hence for benchmarking only
+e.g.
+warm_start = None
+for climatic_year/period...:
+    result, warm_start = optimize_with_warm_start(network, warm_start=warm_start, solver_name="highs")
+"""
+import os
+import tempfile
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import pypsa
+import xarray as xr
+from linopy.io import get_printers_scalar
+
+from long_term_uc.common.error_msgs import print_out_msg
+
+
+# HiGHS basis statuses (HighsBasisStatus values)
+@dataclass
+class HighsBasisStatuses:
+    lower: int = 0
+    basic: int = 1
+    upper: int = 2
+    zero: int = 3
+
+
+HIGHS_BASIS_STATUSES = HighsBasisStatuses()
+SNAPSHOT_DIM = "snapshot"
+BASIS_FILE_HEADER = "HiGHS_basis_file v2"
+
+
+@dataclass
+class WarmStartSolveStats:
+    n_iterations: int
+    solve_time: float
+    # share of model columns whose basis status was obtained from previous solve
+    mapped_share: float
+    # iterations and time saved w.r.t. a cold solve of the same LP - None if not measured
+    iterations_saved: Optional[int] = None
+    time_saved: Optional[float] = None
+
+
+@dataclass
+class HighsWarmStart:
+    # {linopy variable (resp. constraint) name: basis statuses, with coords of its labels}
+    cols_status: Dict[str, xr.DataArray]
+    rows_status: Dict[str, xr.DataArray]
+    solves_stats: List[WarmStartSolveStats] = field(default_factory=list)
+
+    def get_warm_solves_totals(self) -> Tuple[int, float]:
+        return (sum(stats.n_iterations for stats in self.solves_stats),
+                sum(stats.solve_time for stats in self.solves_stats))
+
+    def get_saved_totals(self) -> Optional[Tuple[int, float]]:
+        """
+        Get iterations and time saved over the warm-started solves where they were measured - None if none
+        """
+        measured_stats = [stats for stats in self.solves_stats if stats.iterations_saved is not None]
+        if len(measured_stats) == 0:
+            return None
+        return (sum(stats.iterations_saved for stats in measured_stats),
+                sum(stats.time_saved for stats in measured_stats))
+
+
+def get_highs_solve_info(network: pypsa.Network) -> Tuple[int, float]:
+    """
+    Get (simplex iterations, solve time) of last HiGHS solve of network
+    """
+    highs = network.model.solver_model
+    return highs.getInfo().simplex_iteration_count, highs.getRunTime()
+
+
+def get_cold_resolve_info(network: pypsa.Network) -> Tuple[int, float]:
+    """
+    Re-solve last LP solved with HiGHS from scratch - basis and solution discarded, network results kept - and
+    get its (simplex iterations, solve time)
+    """
+    highs = network.model.solver_model
+    highs.clearSolver()
+    # (run time of HiGHS instance cumulated over its runs)
+    start_run_time = highs.getRunTime()
+    highs.run()
+    return highs.getInfo().simplex_iteration_count, highs.getRunTime() - start_run_time
+
+
+def get_statuses_per_item(items, labels_order: np.ndarray, statuses: np.ndarray) -> Dict[str, xr.DataArray]:
+    """
+    Split (HiGHS ordered) statuses per linopy variable/constraint
+    :param items: model.variables or model.constraints
+    :param labels_order: linopy label of each HiGHS column/row
+    """
+    label_positions = np.full(labels_order.max() + 1 if len(labels_order) > 0 else 0, -1)
+    label_positions[labels_order] = np.arange(len(labels_order))
+    statuses_per_item = {}
+    for name in items:
+        labels = items[name].labels
+        positions = np.where(labels.values >= 0, label_positions[np.maximum(labels.values, 0)], -1)
+        # (NaN for masked labels)
+        statuses_per_item[name] = labels.copy(data=np.where(positions >= 0, statuses[positions], np.nan))
+    return statuses_per_item
+
+
+def get_warm_start_from_network(network: pypsa.Network) -> HighsWarmStart:
+    """
+    Get warm start from network last solved with HiGHS (direct API)
+    """
+    model = network.model
+    basis = model.solver_model.getBasis()
+    matrices = model.matrices
+    cols_status = get_statuses_per_item(items=model.variables, labels_order=matrices.vlabels,
+                                        statuses=np.array([int(status) for status in basis.col_status]))
+    rows_status = get_statuses_per_item(items=model.constraints, labels_order=matrices.clabels,
+                                        statuses=np.array([int(status) for status in basis.row_status]))
+    return HighsWarmStart(cols_status=cols_status, rows_status=rows_status)
+
+
+def get_coord_indexer(prev_coord: pd.Index, new_coord: pd.Index, is_snapshot_dim: bool) -> np.ndarray:
+    """
+    Get positions in previous coordinate of the new one - -1 if absent; for snapshots, absent ones are mapped
+    on the same position of previous horizon
+    """
+    indexer = prev_coord.get_indexer(new_coord)
+    if is_snapshot_dim:
+        new_positions = np.arange(len(new_coord))
+        unmatched = (indexer < 0) & (new_positions < len(prev_coord))
+        indexer[unmatched] = new_positions[unmatched]
+    return indexer
+
+
+def map_statuses(prev_statuses: Dict[str, xr.DataArray], items, labels_order: np.ndarray) -> np.ndarray:
+    """
+    Map statuses of previous solve onto a new model, by name and coordinates
+    :returns: array of statuses in (HiGHS) order of labels_order - NaN if not mapped
+    """
+    n_labels = labels_order.max() + 1 if len(labels_order) > 0 else 0
+    statuses_per_label = np.full(n_labels, np.nan)
+    for name in items:
+        labels = items[name].labels
+        prev_item_statuses = prev_statuses.get(name)
+        if prev_item_statuses is None or prev_item_statuses.dims != labels.dims:
+            continue
+        item_statuses = prev_item_statuses.values
+        for i_axis, dim in enumerate(labels.dims):
+            indexer = get_coord_indexer(prev_coord=prev_item_statuses.indexes[dim], new_coord=labels.indexes[dim],
+                                        is_snapshot_dim=dim == SNAPSHOT_DIM)
+            item_statuses = np.take(item_statuses, np.maximum(indexer, 0), axis=i_axis)
+            # unmatched coordinates -> NaN
+            unmatched_shape = [1] * item_statuses.ndim
+            unmatched_shape[i_axis] = len(indexer)
+            item_statuses = np.where((indexer < 0).reshape(unmatched_shape), np.nan, item_statuses)
+        valid_labels = labels.values >= 0
+        statuses_per_label[labels.values[valid_labels]] = item_statuses[valid_labels]
+    return statuses_per_label[labels_order]
+
+
+def get_nonbasic_statuses(lower: np.ndarray, upper: np.ndarray, statuses: np.ndarray) -> np.ndarray:
+    """
+    Set nonbasic statuses coherent with bounds: at lower bound if finite, else at upper one, else zero (free)
+    """
+    nonbasic_statuses = np.where(np.isfinite(lower), HIGHS_BASIS_STATUSES.lower,
+                                 np.where(np.isfinite(upper), HIGHS_BASIS_STATUSES.upper, HIGHS_BASIS_STATUSES.zero))
+    at_upper = (statuses == HIGHS_BASIS_STATUSES.upper) & np.isfinite(upper)
+    return np.where(at_upper, HIGHS_BASIS_STATUSES.upper, nonbasic_statuses)
+
+
+def get_mapped_basis(warm_start: HighsWarmStart, model) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Get (cols status, rows status, share of mapped cols) of a new model from warm start
+    """
+    matrices = model.matrices
+    cols_status = map_statuses(prev_statuses=warm_start.cols_status, items=model.variables,
+                               labels_order=matrices.vlabels)
+    rows_status = map_statuses(prev_statuses=warm_start.rows_status, items=model.constraints,
+                               labels_order=matrices.clabels)
+    mapped_share = float(np.mean(~np.isnan(cols_status))) if len(cols_status) > 0 else 0.
+    # unmatched cols nonbasic, unmatched rows basic (slack)
+    cols_basic = cols_status == HIGHS_BASIS_STATUSES.basic
+    rows_basic = np.isnan(rows_status) | (rows_status == HIGHS_BASIS_STATUSES.basic)
+    # repair number of basic entries (= number of rows): demote (resp. promote) rows, unmatched ones first
+    n_excess_basic = int(cols_basic.sum() + rows_basic.sum()) - len(rows_status)
+    rows_order = np.argsort(~np.isnan(rows_status), kind="stable")
+    if n_excess_basic > 0:
+        rows_basic[rows_order[rows_basic[rows_order]][:n_excess_basic]] = False
+    elif n_excess_basic < 0:
+        rows_basic[rows_order[~rows_basic[rows_order]][:-n_excess_basic]] = True
+    # if more basic cols than rows, demote last ones
+    n_excess_basic = int(cols_basic.sum() + rows_basic.sum()) - len(rows_status)
+    if n_excess_basic > 0:
+        cols_basic[np.flatnonzero(cols_basic)[-n_excess_basic:]] = False
+    rows_lower = np.where(matrices.sense != "<", matrices.b, -np.inf)
+    rows_upper = np.where(matrices.sense != ">", matrices.b, np.inf)
+    cols_status = np.where(cols_basic, HIGHS_BASIS_STATUSES.basic,
+                           get_nonbasic_statuses(lower=matrices.lb, upper=matrices.ub, statuses=cols_status))
+    rows_status = np.where(rows_basic, HIGHS_BASIS_STATUSES.basic,
+                           get_nonbasic_statuses(lower=rows_lower, upper=rows_upper, statuses=rows_status))
+    return cols_status, rows_status, mapped_share
+
+
+def write_basis_file(basis_file: str, model, cols_status: np.ndarray, rows_status: np.ndarray):
+    """
+    Write basis in HiGHS file format, with names set by linopy in solver model
+    """
+    print_variables, print_constraints = get_printers_scalar(model, explicit_coordinate_names=False)
+    matrices = model.matrices
+    with open(basis_file, mode="w") as f:
+        f.write(f"{BASIS_FILE_HEADER}\nValid\n# Columns {len(cols_status)}\n")
+        f.writelines(f"{name} {status}\n" for name, status in zip(print_variables(matrices.vlabels), cols_status))
+        f.write(f"# Rows {len(rows_status)}\n")
+        f.writelines(f"{name} {status}\n" for name, status in zip(print_constraints(matrices.clabels), rows_status))
+
+
+def optimize_with_warm_start(network: pypsa.Network, warm_start: Optional[HighsWarmStart],
+                             snapshots: pd.Index = None, extra_functionality: Callable = None,
+                             measure_savings: bool = False, **optimize_kwargs) \
+        -> Tuple[Tuple[str, str], Optional[HighsWarmStart]]:
+    """
+    Optimise network with HiGHS, warm-started from a previous solve if available
+    :param warm_start: warm start of previous solve; None for a cold start
+    :param extra_functionality: as in network.optimize, applied to the model before solving it
+    :param measure_savings: re-solve warm-started LP from scratch to measure iterations and time saved
+    :param optimize_kwargs: kwargs of network.optimize (besides solver name, forced to HiGHS)
+    :returns: (status, condition) of network.optimize, and warm start of this solve - for the next one
+    """
+    optimize_kwargs = {key: val for key, val in optimize_kwargs.items() if key != "solver_name"}
+    network.optimize.create_model(snapshots=snapshots)
+    if extra_functionality is not None:
+        extra_functionality(network, network.snapshots if snapshots is None else snapshots)
+    basis_file = None
+    mapped_share = 0.
+    if warm_start is not None:
+        cols_status, rows_status, mapped_share = get_mapped_basis(warm_start=warm_start, model=network.model)
+        basis_fd, basis_file = tempfile.mkstemp(suffix=".bas")
+        os.close(basis_fd)
+        write_basis_file(basis_file=basis_file, model=network.model, cols_status=cols_status,
+                         rows_status=rows_status)
+    try:
+        # direct API -> HiGHS columns/rows in order of linopy labels, and solver model kept to get its basis
+        result = network.optimize.solve_model(solver_name="highs", io_api="direct", warmstart_fn=basis_file,
+                                              **optimize_kwargs)
+    finally:
+        if basis_file is not None:
+            os.remove(basis_file)
+    if network.model.solver_model is None:
+        return result, None
+    # (basis of this solve extracted before a possible cold re-solve)
+    new_warm_start = get_warm_start_from_network(network=network)
+    if warm_start is not None:
+        n_iterations, solve_time = get_highs_solve_info(network=network)
+        solve_stats = WarmStartSolveStats(n_iterations=n_iterations, solve_time=solve_time, mapped_share=mapped_share)
+        saved_msg = ""
+        if measure_savings:
+            cold_n_iterations, cold_solve_time = get_cold_resolve_info(network=network)
+            solve_stats.iterations_saved = cold_n_iterations - n_iterations
+            solve_stats.time_saved = cold_solve_time - solve_time
+            saved_msg = f" -> {solve_stats.iterations_saved} iterations and {solve_stats.time_saved:.2f}s saved " \
+                        f"w.r.t. cold solve of the same LP"
+        print_out_msg(msg_level="info", msg=f"Warm-started HiGHS solve ({100 * mapped_share:.0f}% of basis mapped): "
+                                            f"{n_iterations} iterations, {solve_time:.2f}s{saved_msg}")
+        new_warm_start.solves_stats = warm_start.solves_stats + [solve_stats]
+    # basis extracted -> HiGHS instance released (memory, and network.copy not possible with it)
+    network.model.solver_model = None
+    return result, new_warm_start
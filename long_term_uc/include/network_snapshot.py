@@ -0,0 +1,88 @@
+"""
+Snapshots of built (pre-solve) PyPSA networks, saved in netCDF format together with a fingerprint of their inputs
+-> when inputs did not change, network can be directly reloaded, skipping ERAA data reading and network building
+(e.g. to re-solve it with other solver options, or for debugging)
+"""
+import hashlib
+import os
+from dataclasses import asdict
+from pprint import pformat
+from typing import Dict, List, Optional
+import pypsa
+
+from long_term_uc.common.constants_extract_eraa_data import ERAADatasetDescr
+from long_term_uc.common.error_msgs import print_out_msg
+from long_term_uc.common.fuel_sources import FuelSources
+from long_term_uc.common.long_term_uc_io import OUTPUT_NETWORK_SNAPSHOT_FOLDER, get_json_pypsa_static_params_file
+from long_term_uc.common.uc_run_params import UCRunParams
+from long_term_uc.utils.eraa_data_cache import get_source_file_signature
+from long_term_uc.utils.eraa_data_reader import get_run_eraa_files
+
+
+# to be incremented when network building changes -> all existing snapshots then ignored
+# (2: networks with zones clustering, rolling-horizon params, temporal aggregation, time resolutions; 3: storage
+# weightings of representative periods)
+SNAPSHOT_FORMAT_VERSION = 3
+FINGERPRINT_META_KEY = "inputs_fingerprint"
+
+
+def get_eraa_data_signature(eraa_files: List[str]) -> Dict[str, Optional[dict]]:
+    """
+    Get (size, modif. time) of ERAA data files - cheap signature of data used to build a network; None for
+    non-existing files (skipped when reading), so that their later addition is also seen
+    """
+    return {file: get_source_file_signature(file=file) if os.path.isfile(file) else None for file in eraa_files}
+
+
+def get_network_inputs_fingerprint(uc_run_params: UCRunParams, eraa_data_descr: ERAADatasetDescr,
+                                   fuel_sources: Dict[str, FuelSources], is_stress_test: bool = False) -> str:
+    """
+    Get fingerprint of all inputs of a network: UC run params, ERAA dataset description, fuel sources, PyPSA
+    static params, ERAA data files read for this run (see get_run_eraa_files) and versions of snapshot
+    format/PyPSA
+    """
+    eraa_files = get_run_eraa_files(uc_run_params=uc_run_params,
+                                    agg_prod_types_with_cf_data=eraa_data_descr.agg_prod_types_with_cf_data,
+                                    aggreg_prod_types_def=eraa_data_descr.aggreg_prod_types_def,
+                                    is_stress_test=is_stress_test)
+    with open(get_json_pypsa_static_params_file(), mode="rb") as f:
+        pypsa_static_params_hash = hashlib.sha1(f.read()).hexdigest()
+    # (raw selection of aggreg. prod types not used to build network, only the one expanded for its target year)
+    uc_run_params_dict = {key: val for key, val in asdict(uc_run_params).items() if key != "raw_selected_prod_types"}
+    network_inputs = {"snapshot_format_version": SNAPSHOT_FORMAT_VERSION, "pypsa_version": pypsa.__version__,
+                      "uc_run_params": uc_run_params_dict, "eraa_data_descr": asdict(eraa_data_descr),
+                      "fuel_sources": {name: asdict(fuel_source) for name, fuel_source in fuel_sources.items()},
+                      "pypsa_static_params": pypsa_static_params_hash, "eraa_data": get_eraa_data_signature(eraa_files=eraa_files)}
+    # (sorted) pretty-print to get a deterministic str of these nested structures
+    return hashlib.sha1(pformat(network_inputs, width=120).encode("utf-8")).hexdigest()
+
+
+def get_network_snapshot_file(inputs_fingerprint: str) -> str:
+    return os.path.join(OUTPUT_NETWORK_SNAPSHOT_FOLDER, f"network_{inputs_fingerprint}.nc")
+
+
+def save_network_snapshot(network: pypsa.Network, inputs_fingerprint: str):
+    snapshot_file = get_network_snapshot_file(inputs_fingerprint=inputs_fingerprint)
+    print_out_msg(msg_level="info", msg=f"Save built network in {snapshot_file}")
+    os.makedirs(OUTPUT_NETWORK_SNAPSHOT_FOLDER, exist_ok=True)
+    network.meta[FINGERPRINT_META_KEY] = inputs_fingerprint
+    # write in a temporary file then rename it, not to expose partially written snapshots to concurrent runs
+    tmp_snapshot_file = f"{snapshot_file}.{os.getpid()}.tmp"
+    network.export_to_netcdf(tmp_snapshot_file)
+    os.replace(tmp_snapshot_file, snapshot_file)
+
+
+def load_network_snapshot(inputs_fingerprint: str) -> Optional[pypsa.Network]:
+    """
+    Load network built with the same inputs - None if no such snapshot
+    """
+    snapshot_file = get_network_snapshot_file(inputs_fingerprint=inputs_fingerprint)
+    if not os.path.isfile(snapshot_file):
+        return None
+    network = pypsa.Network(snapshot_file)
+    if network.meta.get(FINGERPRINT_META_KEY) != inputs_fingerprint:
+        print_out_msg(msg_level="warning", msg=f"Network snapshot {snapshot_file} with unexpected inputs "
+                                               f"fingerprint -> not used")
+        return None
+    print_out_msg(msg_level="info", msg=f"Network with same inputs loaded from {snapshot_file}")
+    return network
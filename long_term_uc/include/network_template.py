@@ -0,0 +1,138 @@
+"""
+Network template, to build PyPSA network topology (buses, carriers, generators, loads, links) once and then only
+swap its time-series (demand, RES capa. factors, snapshots) for the successive runs of a sweep over climatic
+years/periods - e.g.
+template = build_network_template(...)
+for climatic_year/period...:
+    demand, agg_cf_data, _, _ = get_countries_data(...)
+    network = template.set_time_series(demand=demand, agg_cf_data=agg_cf_data, period_start=..., period_end=...)
+    network.optimize(solver_name="highs")
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Tuple
+import numpy as np
+import pandas as pd
+import pypsa
+
+from long_term_uc.common.error_msgs import print_out_msg
+from long_term_uc.common.fuel_sources import FuelSources
+from long_term_uc.common.long_term_uc_io import COLUMN_NAMES
+from long_term_uc.common.uc_run_params import UCRunParams
+from long_term_uc.include.dataset_builder import GenerationUnitTable, add_energy_carrier, add_generators, \
+    add_gps_coordinates, add_interco_links, add_loads, get_country_bus_name, init_pypsa_network
+
+
+def get_uc_snapshots(period_start: datetime, period_end: datetime, target_year: int,
+                     resolution_hours: int = 1) -> pd.DatetimeIndex:
+    """
+    Get snapshots of UC network for period [period_start, period_end) - ERAA dates being in a fictive
+    calendar, shifted to target year
+    :param resolution_hours: duration of time steps (see UCRunParams.time_resolution_hours)
+    """
+    return pd.date_range(start=period_start.replace(year=target_year), end=period_end.replace(year=target_year),
+                         freq=f"{resolution_hours}h")[:-1]
+
+
+# topology of a network: (countries, target year, {country: selected aggreg. prod types}, time resolution)
+TOPOLOGY_KEY_TYPE = Tuple[Tuple[str, ...], int, Tuple[Tuple[str, Tuple[str, ...]], ...], int]
+
+
+def get_topology_key(uc_run_params: UCRunParams) -> TOPOLOGY_KEY_TYPE:
+    selec_prod_types = uc_run_params.selected_prod_types
+    return (tuple(uc_run_params.selected_countries), uc_run_params.selected_target_year,
+            tuple((country, tuple(sorted(selec_prod_types.get(country) or [])))
+                  for country in uc_run_params.selected_countries), uc_run_params.time_resolution_hours)
+
+
+@dataclass
+class NetworkTemplate:
+    topology_key: TOPOLOGY_KEY_TYPE
+    network: pypsa.Network
+    # {load name: country}
+    loads_country: Dict[str, str] = field(default_factory=dict)
+    # {(PyPSA component class, unit name): (country, aggreg. prod type)} of units with capa. factors time-series
+    cf_units: Dict[Tuple[str, str], Tuple[str, str]] = field(default_factory=dict)
+
+    def is_compatible(self, uc_run_params: UCRunParams) -> bool:
+        """
+        Check that a UC run can be done with this template, i.e. that only its time-series differ
+        """
+        return get_topology_key(uc_run_params=uc_run_params) == self.topology_key
+
+    def set_time_series(self, demand: Dict[str, pd.DataFrame], agg_cf_data: Dict[str, pd.DataFrame],
+                        period_start: datetime, period_end: datetime) -> pypsa.Network:
+        """
+        Swap in time-series of a new climatic year and/or period: snapshots, loads p_set and RES units p_max_pu
+        :param demand: {country: df with demand}, as obtained with get_countries_data
+        :param agg_cf_data: {country: df with per aggreg. prod type CF}, idem
+        """
+        resolution_hours = self.topology_key[3]
+        snapshots = get_uc_snapshots(period_start=period_start, period_end=period_end,
+                                     target_year=self.topology_key[1], resolution_hours=resolution_hours)
+        # time-series (and results) of previous run are reindexed on new snapshots, then overwritten
+        self.network.set_snapshots(snapshots)
+        self.network.snapshot_weightings.loc[:, :] = resolution_hours
+        loads_p_set = {load_name: get_ts_values(df=demand[country], n_snapshots=len(snapshots), ts_name=load_name)
+                       for load_name, country in self.loads_country.items()}
+        set_dynamic_attr_values(component=self.network.components["Load"], attr_name="p_set",
+                                attr_values=loads_p_set)
+        prod_type_agg_col = f"{COLUMN_NAMES.production_type}_agg"
+        for component_class in ["Generator", "StorageUnit"]:
+            units_p_max_pu = {}
+            for (unit_class, unit_name), (country, agg_pt) in self.cf_units.items():
+                if unit_class == component_class:
+                    df_cf = agg_cf_data[country]
+                    units_p_max_pu[unit_name] = get_ts_values(df=df_cf[df_cf[prod_type_agg_col] == agg_pt],
+                                                              n_snapshots=len(snapshots), ts_name=unit_name)
+            set_dynamic_attr_values(component=self.network.components[component_class], attr_name="p_max_pu",
+                                    attr_values=units_p_max_pu)
+        return self.network
+
+
+def set_dynamic_attr_values(component, attr_name: str, attr_values: Dict[str, np.ndarray]):
+    if len(attr_values) > 0:
+        component.dynamic[attr_name].loc[:, list(attr_values)] = np.column_stack(list(attr_values.values()))
+
+
+def get_ts_values(df: pd.DataFrame, n_snapshots: int, ts_name: str) -> np.ndarray:
+    ts_values = df[COLUMN_NAMES.value].to_numpy()
+    if len(ts_values) != n_snapshots:
+        raise ValueError(f"{len(ts_values)} values for time-series of {ts_name}, "
+                         f"whereas {n_snapshots} snapshots in network")
+    return ts_values
+
+
+def build_network_template(uc_run_params: UCRunParams, generation_units_data: GenerationUnitTable,
+                           demand: Dict[str, pd.DataFrame], interco_capas: Dict[Tuple[str, str], float],
+                           countries_gps_coords: Dict[str, Tuple[float, float]],
+                           fuel_sources: Dict[str, FuelSources]) -> NetworkTemplate:
+    """
+    Build PyPSA network of a UC run - same steps as in main script - and keep infos needed to swap its time-series
+    """
+    countries = uc_run_params.selected_countries
+    network = init_pypsa_network(df_demand_first_country=demand[countries[0]])
+    network.set_snapshots(get_uc_snapshots(period_start=uc_run_params.uc_period_start,
+                                           period_end=uc_run_params.uc_period_end,
+                                           target_year=uc_run_params.selected_target_year,
+                                           resolution_hours=uc_run_params.time_resolution_hours))
+    network.snapshot_weightings.loc[:, :] = uc_run_params.time_resolution_hours
+    network = add_gps_coordinates(network=network, countries_gps_coords=countries_gps_coords)
+    network = add_energy_carrier(network=network, fuel_sources=fuel_sources)
+    network = add_generators(network=network, generators_data=generation_units_data)
+    network = add_loads(network=network, demand=demand)
+    network = add_interco_links(network, countries=countries, interco_capas=interco_capas)
+
+    network_template = NetworkTemplate(topology_key=get_topology_key(uc_run_params=uc_run_params), network=network)
+    bus_countries = {get_country_bus_name(country=country): country for country in countries}
+    network_template.loads_country = {load_name: bus_countries[bus]
+                                      for load_name, bus in network.loads["bus"].items()}
+    for component_class in ["Generator", "StorageUnit"]:
+        component = network.components[component_class]
+        for unit_name in component.dynamic["p_max_pu"].columns:
+            agg_pt = component.static.at[unit_name, "type"]
+            network_template.cf_units[(component_class, unit_name)] = \
+                (bus_countries[component.static.at[unit_name, "bus"]], agg_pt)
+    print_out_msg(msg_level="info", msg=f"Network template built: {len(network_template.loads_country)} loads and "
+                                        f"{len(network_template.cf_units)} units with time-series to be swapped")
+    return network_template
@@ -0,0 +1,117 @@
+"""
+Rolling-horizon solving of UC network: successive (overlapping) windows optimised one after the other, with
+storage state of charge carried from one window to the next -> memory bounded by window size, and time almost
+linear in horizon length (e.g. to solve a full year)
+- results (generators_t.p, buses_t.marginal_price...) of each window written in network time-series, the ones
+of its overlap with next window being then overwritten by this next window -> stitched outputs
+"""
+from typing import List, Tuple
+import numpy as np
+import pypsa
+
+from long_term_uc.common.error_msgs import print_out_msg
+from long_term_uc.include.highs_warm_start import optimize_with_warm_start
+from long_term_uc.utils.pypsa_utils import OPTIM_RESOL_STATUS
+
+
+def get_rolling_windows(snapshot_hours: np.ndarray, window_hours: float,
+                        overlap_hours: float) -> List[Tuple[int, int]]:
+    """
+    Get windows of a rolling horizon, as (first, last + 1) snapshot positions
+    :param snapshot_hours: duration (in hours) of each snapshot - not necessarily hourly ones
+    :param window_hours: duration of each window
+    :param overlap_hours: duration of overlap of 2 successive windows, only used as lookahead by the first one
+    """
+    # start time of each snapshot, plus end of horizon
+    snapshot_times = np.concatenate([[0], np.cumsum(snapshot_hours)])
+    n_snapshots = len(snapshot_hours)
+    windows = []
+    window_start = 0
+    while window_start < n_snapshots:
+        start_time = snapshot_times[window_start]
+        # (at least one snapshot per window, and one new snapshot per step)
+        window_end = max(int(np.searchsorted(snapshot_times, start_time + window_hours, side="left")),
+                         window_start + 1)
+        windows.append((window_start, min(window_end, n_snapshots)))
+        next_start = int(np.searchsorted(snapshot_times, start_time + window_hours - overlap_hours, side="left"))
+        window_start = max(next_start, window_start + 1) if window_end < n_snapshots else n_snapshots
+    return windows
+
+
+def get_operational_cost(network: pypsa.Network) -> float:
+    """
+    Operational cost of (stitched) dispatch: marginal costs of generators and storage units, weighted by
+    snapshot durations
+    """
+    weightings = network.snapshot_weightings["objective"]
+    total_cost = 0
+    for component_class, dispatch in [("Generator", network.generators_t.p),
+                                      ("StorageUnit", network.storage_units_t.p_dispatch)]:
+        if dispatch.empty:
+            continue
+        marginal_costs = network.get_switchable_as_dense(component_class, "marginal_cost")[dispatch.columns]
+        total_cost += float((marginal_costs * dispatch).mul(weightings, axis=0).sum().sum())
+    return total_cost
+
+
+def optimize_with_rolling_horizon(network: pypsa.Network, window_hours: float, overlap_hours: float = 0,
+                                  warm_start: bool = False, measure_warm_start_savings: bool = False,
+                                  **optimize_kwargs) -> Tuple[str, str, float]:
+    """
+    Optimise network on successive windows of its snapshots
+    :param window_hours: duration of each window (e.g. 7 * 24 for weekly windows)
+    :param overlap_hours: lookahead of each window on the next one - its results being then overwritten
+    :param warm_start: warm-start HiGHS solve of each window from the basis of the previous one
+    :param measure_warm_start_savings: measure iterations and time saved by warm starts, with cold re-solves of
+    windows (see optimize_with_warm_start)
+    :param optimize_kwargs: kwargs of network.optimize (solver_name...)
+    :returns: (status, condition), as with network.optimize - "ok"/optimal if all windows are; the ones of the
+    first failed window otherwise -, and cost of stitched dispatch (network.objective being the one of last
+    window)
+    """
+    if not 0 <= overlap_hours < window_hours:
+        raise ValueError(f"Rolling horizon overlap ({overlap_hours}h) must be non-negative and smaller than "
+                         f"window ({window_hours}h)")
+    snapshots = network.snapshots
+    windows = get_rolling_windows(snapshot_hours=network.snapshot_weightings["objective"].to_numpy(),
+                                  window_hours=window_hours, overlap_hours=overlap_hours)
+    print_out_msg(msg_level="info", msg=f"Rolling-horizon optimisation on {len(windows)} windows of {window_hours}h "
+                                        f"(overlap {overlap_hours}h)")
+    storage_units = network.storage_units
+    # state of charge carried from one window to the next -> not cyclic within windows (initial values
+    # restored at the end)
+    init_storage_params = storage_units[["state_of_charge_initial", "cyclic_state_of_charge"]].copy()
+    if storage_units["cyclic_state_of_charge"].any():
+        print_out_msg(msg_level="warning", msg="Cyclic state of charge of storage units not applied with "
+                                               "rolling horizon; state of charge carried between windows instead")
+    storage_units["cyclic_state_of_charge"] = False
+    status, condition = "ok", OPTIM_RESOL_STATUS.optimal
+    highs_warm_start = None
+    try:
+        for i_window, (window_start, window_end) in enumerate(windows):
+            if i_window > 0 and len(storage_units) > 0:
+                # state of charge at the end of the (committed part of) previous window
+                storage_units["state_of_charge_initial"] = \
+                    network.storage_units_t.state_of_charge.loc[snapshots[window_start - 1]].to_numpy()
+            window_snapshots = snapshots[window_start:window_end]
+            if warm_start:
+                (window_status, window_condition), highs_warm_start = \
+                    optimize_with_warm_start(network, warm_start=highs_warm_start, snapshots=window_snapshots,
+                                             measure_savings=measure_warm_start_savings, **optimize_kwargs)
+            else:
+                window_status, window_condition = network.optimize(snapshots=window_snapshots, **optimize_kwargs)
+            if window_condition != OPTIM_RESOL_STATUS.optimal and condition == OPTIM_RESOL_STATUS.optimal:
+                print_out_msg(msg_level="warning", msg=f"Window {i_window + 1}/{len(windows)} not solved to "
+                                                       f"optimality: {window_status}, {window_condition}")
+                status, condition = window_status, window_condition
+    finally:
+        storage_units[init_storage_params.columns] = init_storage_params
+    if highs_warm_start is not None and len(highs_warm_start.solves_stats) > 0:
+        warm_n_iterations, warm_solve_time = highs_warm_start.get_warm_solves_totals()
+        saved_totals = highs_warm_start.get_saved_totals()
+        saved_msg = "" if saved_totals is None \
+            else f" -> {saved_totals[0]} iterations and {saved_totals[1]:.2f}s saved w.r.t. cold solves"
+        print_out_msg(msg_level="info", msg=f"{len(highs_warm_start.solves_stats)} warm-started windows: "
+                                            f"{warm_n_iterations} simplex iterations, {warm_solve_time:.2f}s"
+                                            f"{saved_msg}")
+    return status, condition, get_operational_cost(network=network)
@@ -0,0 +1,352 @@
+"""
+Scenario runner: expand a grid of (climatic year, target year, UC period start) around the UC run params read in
+JSON files into UC runs, executed in a bounded process pool - each one building, solving and saving its network
+in an isolated run folder (output/long_term_uc/scenarios/{run name}/{scenario name})
+- scenarios grouped by network topology (same target year), each group run successively in a worker: network
+template built once then only its time-series swapped, country data cache, and HiGHS solves warm-started from the
+basis of the previous scenario of the group
+
+Grid defined in input/long_term_uc/scenarios_grid.json; run it with: python -m long_term_uc.include.scenario_runner
+"""
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from copy import deepcopy
+from dataclasses import asdict, dataclass, fields, replace
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Dict, List, Optional
+import pandas as pd
+import pypsa
+
+from long_term_uc.common.constants_extract_eraa_data import ERAADatasetDescr, UsageParameters
+from long_term_uc.common.error_msgs import print_out_msg
+from long_term_uc.common.long_term_uc_io import MAX_DATE_IN_DATA, OUTPUT_SCENARIOS_FOLDER, \
+    get_json_scenarios_grid_file, get_output_file_suffix, get_scenario_run_folder
+from long_term_uc.common.uc_run_params import DATE_FORMAT, UCRunParams
+from long_term_uc.include.highs_warm_start import HighsWarmStart, optimize_with_warm_start
+from long_term_uc.include.network_template import NetworkTemplate, get_topology_key
+from long_term_uc.include.rolling_horizon import optimize_with_rolling_horizon
+from long_term_uc.include.temporal_aggregation import add_repr_periods_storage_constraints
+from long_term_uc.include.uc_network_builder import build_uc_network, get_uc_outputs, is_network_template_usable, \
+    update_network_template
+from long_term_uc.utils.country_data_cache import COUNTRY_DATA_CACHE
+from long_term_uc.utils.pypsa_utils import OPTIM_RESOL_STATUS, get_network_obj_value
+from long_term_uc.utils.read import check_and_load_json_file, read_and_check_uc_run_params
+
+
+# env. variables limiting threads of numerical libraries in workers (HiGHS ones set with its "threads" option)
+THREADS_ENV_VARIABLES = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"]
+SCENARIO_SUMMARY_FILE = "scenario_summary.json"
+SCENARIOS_SUMMARY_FILE = "scenarios_summary.csv"
+RUN_NAME_FORMAT = "%Y-%m-%d_%H%M%S"
+
+
+@dataclass
+class UCScenario:
+    name: str
+    uc_run_params: UCRunParams
+    # climatic year in stress-test data
+    is_stress_test: bool = False
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    status: Optional[str] = None
+    condition: Optional[str] = None
+    objective: Optional[float] = None
+    run_time: Optional[float] = None
+    # iterations and time saved by warm start from previous scenario of its group - if measured (see
+    # UsageParameters.highs_warm_start_measure_savings)
+    warm_start_iterations_saved: Optional[int] = None
+    warm_start_time_saved: Optional[float] = None
+    # traceback of the exception that stopped this scenario, if any
+    error: Optional[str] = None
+
+
+def get_scenarios_grid(uc_run_params: UCRunParams, eraa_data_descr: ERAADatasetDescr,
+                       climatic_years: List[int] = None, with_stress_test_climatic_years: bool = True,
+                       target_years: List[int] = None, period_starts: List[datetime] = None) -> List[UCScenario]:
+    """
+    Expand a grid of (climatic year, target year, UC period start) into UC scenarios, other params being the
+    ones of given UC run params
+    :param climatic_years: None for all available ones
+    :param with_stress_test_climatic_years: add available stress-test climatic years
+    :param target_years: None for all available ones
+    :param period_starts: None for the one of UC run params; periods keeping the duration of this one (bounded
+    on end of ERAA data)
+    """
+    if climatic_years is None:
+        climatic_years = list(eraa_data_descr.available_climatic_years)
+    stress_test_cys = [] if not with_stress_test_climatic_years \
+        else [cy for cy in eraa_data_descr.available_climatic_years_stress_test or [] if cy not in climatic_years]
+    if target_years is None:
+        target_years = list(eraa_data_descr.available_target_years)
+    if period_starts is None:
+        period_starts = [uc_run_params.uc_period_start]
+    period_duration = uc_run_params.uc_period_end - uc_run_params.uc_period_start
+    scenarios = []
+    for climatic_year in climatic_years + stress_test_cys:
+        for target_year in target_years:
+            for period_start in period_starts:
+                # (own copy of raw aggreg. prod types selection, "all" being expanded for its target year)
+                scenario_params = replace(uc_run_params, selected_climatic_year=climatic_year,
+                                          selected_target_year=target_year, uc_period_start=period_start,
+                                          uc_period_end=min(period_start + period_duration, MAX_DATE_IN_DATA),
+                                          selected_prod_types=deepcopy(uc_run_params.raw_selected_prod_types))
+                scenario_params.coherence_check(eraa_data_descr=eraa_data_descr, year=target_year)
+                scenario_name = get_output_file_suffix(country="europe", year=target_year,
+                                                       climatic_year=climatic_year, start_horizon=period_start)
+                scenarios.append(UCScenario(name=scenario_name, uc_run_params=scenario_params,
+                                            is_stress_test=climatic_year in stress_test_cys))
+    print_out_msg(msg_level="info", msg=f"Grid of {len(scenarios)} UC scenarios: {len(climatic_years)} climatic "
+                                        f"years (+ {len(stress_test_cys)} stress-test ones) x {len(target_years)} "
+                                        f"target years x {len(period_starts)} periods")
+    return scenarios
+
+
+def save_scenario_outputs(network: pypsa.Network, run_folder: str, hourly_outputs: bool = False,
+                          resolution_hours: int = 1):
+    """
+    Save optimal dispatch and marginal prices in run folder of a scenario - see get_uc_outputs
+    """
+    opt_power, marginal_prices = get_uc_outputs(network=network, hourly_outputs=hourly_outputs,
+                                                resolution_hours=resolution_hours)
+    opt_power.to_csv(os.path.join(run_folder, "opt_power.csv"))
+    marginal_prices.to_csv(os.path.join(run_folder, "marginal_prices.csv"))
+
+
+@dataclass
+class ScenariosGroupState:
+    # state carried over the successive scenarios of a group - same network topology - run in a worker
+    network_template: Optional[NetworkTemplate] = None
+    highs_warm_start: Optional[HighsWarmStart] = None
+
+
+def run_uc_scenario(scenario: UCScenario, eraa_data_descr: ERAADatasetDescr, usage_params: UsageParameters,
+                    run_folder: str, highs_threads: int = 1,
+                    group_state: ScenariosGroupState = None) -> ScenarioResult:
+    """
+    Build, solve and save outputs of a UC scenario in its run folder - exceptions (and exits on errors) caught,
+    not to stop the other scenarios of the grid
+    :param highs_threads: number of threads of HiGHS solver
+    :param group_state: network template and HiGHS warm start of the previous scenario of its group, updated
+    with the ones of this scenario - None for an isolated scenario
+    """
+    start_time = time.perf_counter()
+    scenario_result = ScenarioResult(name=scenario.name)
+    if group_state is None:
+        group_state = ScenariosGroupState()
+    os.makedirs(run_folder, exist_ok=True)
+    try:
+        if is_network_template_usable(uc_run_params=scenario.uc_run_params):
+            uc_run_params = scenario.uc_run_params
+            group_state.network_template = \
+                update_network_template(uc_run_params=uc_run_params, eraa_data_descr=eraa_data_descr,
+                                        network_template=group_state.network_template,
+                                        is_stress_test=scenario.is_stress_test, country_data_cache=COUNTRY_DATA_CACHE)
+            network = group_state.network_template.network
+        else:
+            uc_run_params, network = build_uc_network(uc_run_params=scenario.uc_run_params,
+                                                      eraa_data_descr=eraa_data_descr,
+                                                      is_stress_test=scenario.is_stress_test,
+                                                      country_data_cache=COUNTRY_DATA_CACHE)
+        stitched_objective = None
+        if uc_run_params.rolling_horizon_window is not None:
+            scenario_result.status, scenario_result.condition, stitched_objective = \
+                optimize_with_rolling_horizon(network, window_hours=uc_run_params.rolling_horizon_window,
+                                              overlap_hours=uc_run_params.rolling_horizon_overlap,
+                                              warm_start=usage_params.highs_warm_start,
+                                              measure_warm_start_savings=usage_params.highs_warm_start_measure_savings,
+                                              solver_name="highs", threads=highs_threads)
+        elif usage_params.highs_warm_start:
+            # (from the basis of previous scenario of the group - nearly identical LP)
+            is_warm_started = group_state.highs_warm_start is not None
+            (scenario_result.status, scenario_result.condition), group_state.highs_warm_start = \
+                optimize_with_warm_start(network, warm_start=group_state.highs_warm_start,
+                                         extra_functionality=add_repr_periods_storage_constraints,
+                                         measure_savings=usage_params.highs_warm_start_measure_savings,
+                                         threads=highs_threads)
+            if is_warm_started and group_state.highs_warm_start is not None:
+                solve_stats = group_state.highs_warm_start.solves_stats[-1]
+                scenario_result.warm_start_iterations_saved = solve_stats.iterations_saved
+                scenario_result.warm_start_time_saved = solve_stats.time_saved
+        else:
+            scenario_result.status, scenario_result.condition = \
+                network.optimize(solver_name="highs", extra_functionality=add_repr_periods_storage_constraints,
+                                 threads=highs_threads)
+        if scenario_result.condition == OPTIM_RESOL_STATUS.optimal:
+            scenario_result.objective = get_network_obj_value(network=network) if stitched_objective is None \
+                else stitched_objective
+            save_scenario_outputs(network=network, run_folder=run_folder,
+                                  hourly_outputs=uc_run_params.hourly_outputs,
+                                  resolution_hours=uc_run_params.time_resolution_hours)
+    # (SystemExit raised by sys.exit on errors of ERAA data reading/network building)
+    except (Exception, SystemExit):
+        scenario_result.error = traceback.format_exc()
+        # template possibly left with time-series of different runs -> rebuilt for next scenario
+        group_state.network_template = None
+        group_state.highs_warm_start = None
+    scenario_result.run_time = time.perf_counter() - start_time
+    with open(os.path.join(run_folder, SCENARIO_SUMMARY_FILE), mode="w", encoding="utf-8") as f:
+        json.dump({**asdict(scenario_result), "uc_run_params": repr(scenario.uc_run_params)}, f, indent=2)
+    return scenario_result
+
+
+def run_uc_scenarios_group(scenarios: List[UCScenario], eraa_data_descr: ERAADatasetDescr,
+                           usage_params: UsageParameters, run_name: str,
+                           highs_threads: int = 1) -> List[ScenarioResult]:
+    """
+    Run successively - in a worker - a group of UC scenarios with the same network topology, sharing network
+    template, country data cache and HiGHS warm start
+    """
+    group_state = ScenariosGroupState()
+    return [run_uc_scenario(scenario=scenario, eraa_data_descr=eraa_data_descr, usage_params=usage_params,
+                            run_folder=get_scenario_run_folder(run_name=run_name, scenario_name=scenario.name),
+                            highs_threads=highs_threads, group_state=group_state)
+            for scenario in scenarios]
+
+
+def get_scenarios_groups(scenarios: List[UCScenario], n_groups_min: int = 1) -> List[List[UCScenario]]:
+    """
+    Group scenarios by network topology (see get_topology_key) - in grid order, i.e. neighbouring climatic
+    years/periods in each group
+    :param n_groups_min: biggest groups split in two until this number of groups is reached, not to leave
+    workers idle
+    """
+    topology_groups = {}
+    for scenario in scenarios:
+        topology_groups.setdefault(get_topology_key(uc_run_params=scenario.uc_run_params), []).append(scenario)
+    scenarios_groups = list(topology_groups.values())
+    while len(scenarios_groups) < n_groups_min:
+        i_biggest = max(range(len(scenarios_groups)), key=lambda i_group: len(scenarios_groups[i_group]))
+        biggest_group = scenarios_groups[i_biggest]
+        if len(biggest_group) < 2:
+            break
+        n_first_half = (len(biggest_group) + 1) // 2
+        scenarios_groups[i_biggest:i_biggest + 1] = [biggest_group[:n_first_half], biggest_group[n_first_half:]]
+    return scenarios_groups
+
+
+def read_scenario_result(scenario_name: str, run_folder: str) -> Optional[ScenarioResult]:
+    """
+    Read result of a scenario saved in its run folder - None if not saved
+    """
+    scenario_summary_file = os.path.join(run_folder, SCENARIO_SUMMARY_FILE)
+    if not os.path.isfile(scenario_summary_file):
+        return None
+    with open(scenario_summary_file, mode="r", encoding="utf-8") as f:
+        scenario_summary = json.load(f)
+    return ScenarioResult(**{result_field.name: scenario_summary.get(result_field.name)
+                             for result_field in fields(ScenarioResult)}) \
+        if scenario_summary.get("name") == scenario_name else None
+
+
+def set_threads_env_variables(n_threads: int) -> Dict[str, Optional[str]]:
+    """
+    Limit threads of numerical libraries in workers - env. variables read when these libraries are loaded, hence
+    set before (spawned) workers start
+    :returns: previous values of these env. variables, to restore them
+    """
+    previous_values = {env_variable: os.environ.get(env_variable) for env_variable in THREADS_ENV_VARIABLES}
+    for env_variable in THREADS_ENV_VARIABLES:
+        os.environ[env_variable] = str(n_threads)
+    return previous_values
+
+
+def restore_env_variables(env_values: Dict[str, Optional[str]]):
+    for env_variable, value in env_values.items():
+        if value is None:
+            os.environ.pop(env_variable, None)
+        else:
+            os.environ[env_variable] = value
+
+
+def run_uc_scenarios(scenarios: List[UCScenario], eraa_data_descr: ERAADatasetDescr,
+                     usage_params: UsageParameters, n_workers: int = None, highs_threads: int = 1,
+                     run_name: str = None) -> List[ScenarioResult]:
+    """
+    Run UC scenarios in a process pool, by groups of same network topology (see run_uc_scenarios_group)
+    :param n_workers: max. number of scenarios run in parallel; None to use all CPUs, given HiGHS threads
+    :param highs_threads: number of threads of HiGHS solver in each worker -> n_workers * highs_threads
+    should not exceed number of CPUs (oversubscription)
+    :param run_name: name of the folder with all scenario run folders; None for current date/time
+    :returns: scenario results, in grid order
+    """
+    n_cpus = os.cpu_count() or 1
+    if n_workers is None:
+        n_workers = max(1, n_cpus // highs_threads)
+    n_workers = max(1, min(n_workers, len(scenarios)))
+    if n_workers * highs_threads > n_cpus:
+        print_out_msg(msg_level="warning", msg=f"{n_workers} workers x {highs_threads} HiGHS threads for "
+                                               f"{n_cpus} CPUs -> oversubscription")
+    if run_name is None:
+        run_name = datetime.now().strftime(RUN_NAME_FORMAT)
+    scenarios_groups = get_scenarios_groups(scenarios=scenarios, n_groups_min=n_workers)
+    print_out_msg(msg_level="info", msg=f"Run {len(scenarios)} UC scenarios ({len(scenarios_groups)} groups of same "
+                                        f"network topology) with {n_workers} process workers ({highs_threads} "
+                                        f"HiGHS thread(s) each), in "
+                                        f"{os.path.join(OUTPUT_SCENARIOS_FOLDER, run_name)}")
+    scenarios_results = {}
+    previous_env_values = set_threads_env_variables(n_threads=highs_threads)
+    try:
+        # spawned workers -> numerical libraries loaded with the threads env. variables (not inherited already
+        # loaded, as with fork)
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=get_context("spawn")) as executor:
+            futures = {executor.submit(run_uc_scenarios_group, scenarios=scenarios_group,
+                                       eraa_data_descr=eraa_data_descr, usage_params=usage_params,
+                                       run_name=run_name, highs_threads=highs_threads): scenarios_group
+                       for scenarios_group in scenarios_groups}
+            for future in as_completed(futures):
+                try:
+                    group_results = future.result()
+                # worker failure (e.g. killed when out of memory -> BrokenProcessPool): results of the scenarios
+                # of its group read in their run folders, if saved before
+                except Exception as exc:
+                    # (same exception raised for all groups of a broken pool -> only its message kept)
+                    error = "".join(traceback.format_exception_only(exc))
+                    group_results = []
+                    for scenario in futures[future]:
+                        run_folder = get_scenario_run_folder(run_name=run_name, scenario_name=scenario.name)
+                        scenario_result = read_scenario_result(scenario_name=scenario.name, run_folder=run_folder)
+                        group_results.append(ScenarioResult(name=scenario.name, error=error)
+                                             if scenario_result is None else scenario_result)
+                for scenario_result in group_results:
+                    scenarios_results[scenario_result.name] = scenario_result
+                    msg_level = "error" if scenario_result.error is not None else "info"
+                    run_time_msg = "" if scenario_result.run_time is None else f" in {scenario_result.run_time:.1f}s"
+                    print_out_msg(msg_level=msg_level, msg=f"[{len(scenarios_results)}/{len(scenarios)}] scenario "
+                                                           f"{scenario_result.name}: {scenario_result.condition}"
+                                                           f"{run_time_msg}")
+    finally:
+        restore_env_variables(env_values=previous_env_values)
+    scenarios_results = [scenarios_results[scenario.name] for scenario in scenarios]
+    df_summary = pd.DataFrame([asdict(scenario_result) for scenario_result in scenarios_results])
+    os.makedirs(os.path.join(OUTPUT_SCENARIOS_FOLDER, run_name), exist_ok=True)
+    df_summary.to_csv(os.path.join(OUTPUT_SCENARIOS_FOLDER, run_name, SCENARIOS_SUMMARY_FILE), index=False)
+    return scenarios_results
+
+
+def read_scenarios_grid() -> Dict:
+    scenarios_grid = check_and_load_json_file(json_file=get_json_scenarios_grid_file(),
+                                              file_descr="JSON scenarios grid")
+    if scenarios_grid.get("period_starts") is not None:
+        scenarios_grid["period_starts"] = [datetime.strptime(period_start, DATE_FORMAT)
+                                           for period_start in scenarios_grid["period_starts"]]
+    return scenarios_grid
+
+
+if __name__ == "__main__":
+    usage_params, eraa_data_descr, uc_run_params = read_and_check_uc_run_params()
+    scenarios_grid = read_scenarios_grid()
+    scenarios = get_scenarios_grid(uc_run_params=uc_run_params, eraa_data_descr=eraa_data_descr,
+                                   climatic_years=scenarios_grid.get("climatic_years"),
+                                   with_stress_test_climatic_years=scenarios_grid.get("with_stress_test_climatic_years",
+                                                                                      True),
+                                   target_years=scenarios_grid.get("target_years"),
+                                   period_starts=scenarios_grid.get("period_starts"))
+    run_uc_scenarios(scenarios=scenarios, eraa_data_descr=eraa_data_descr, usage_params=usage_params,
+                     n_workers=scenarios_grid.get("n_workers"), highs_threads=scenarios_grid.get("highs_threads", 1))
@@ -0,0 +1,272 @@
+"""
+Temporal aggregation of UC period into representative periods (days, weeks...), for fast approximate runs on
+long horizons:
+- periods of joint (normalised) demand and RES CF profiles of all zones clustered - hierarchical (Ward)
+clustering -, each cluster being represented by its medoid period, weighted by its number of periods; the time
+steps of an incomplete last period kept as they are
+- data of representative periods selected - between get_countries_data and dataset_builder functions -, with
+same format as the one of get_countries_data; reduced network solved with snapshot weightings - objective and
+generators ones only, storage state of charge evolving over the real duration of time steps
+- each representative period cyclic for storage: state of charge at its end equal to the one at its beginning,
+common to all periods (initial state of charge, or the one of last time step for cyclic units) -> no energy
+shifted between representative periods, nor from the repetitions of one of them (seasonal storage not modelled)
+- UC results (dispatch, marginal prices) then disaggregated back to the full calendar; and compared to the ones of
+a full-resolution reference run with get_temporal_aggregation_errors
+"""
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import pypsa
+from scipy.cluster.hierarchy import fcluster, linkage
+
+from long_term_uc.common.error_msgs import print_out_msg
+from long_term_uc.common.long_term_uc_io import COLUMN_NAMES, DATE_FORMAT
+from long_term_uc.utils.pypsa_utils import get_network_obj_value
+
+
+TEMPORAL_AGGREGATION_META_KEY = "temporal_aggregation"
+
+
+@dataclass
+class TemporalAggregation:
+    period_hours: int
+    # duration of time steps (see UCRunParams.time_resolution_hours)
+    time_resolution_hours: int
+    # first date (ERAA calendar) and number of time steps of the full UC period
+    first_date: str
+    n_steps: int
+    # for each step of the reduced time-series, position of the (representative) step in the full UC period
+    repr_steps: List[int]
+    # for each step of the reduced time-series, number of hours of the full UC period it represents
+    repr_steps_weights: List[float]
+    # for each step of the full UC period, position of its representative step in the reduced time-series
+    steps_repr_positions: List[int]
+
+    def get_full_snapshots(self, target_year: int) -> pd.DatetimeIndex:
+        first_date = datetime.strptime(self.first_date, DATE_FORMAT)
+        return pd.date_range(start=first_date.replace(year=target_year), periods=self.n_steps,
+                             freq=f"{self.time_resolution_hours}h")
+
+    def get_snapshots(self, target_year: int) -> pd.DatetimeIndex:
+        return self.get_full_snapshots(target_year=target_year)[self.repr_steps]
+
+    def get_n_repr_periods(self) -> int:
+        # (steps of incomplete last period, if any, after the ones of representative periods)
+        period_steps = self.period_hours // self.time_resolution_hours
+        return (len(self.repr_steps) - self.n_steps % period_steps) // period_steps
+
+
+def get_zones_ts_matrix(demand: Dict[str, pd.DataFrame], agg_cf_data: Dict[str, pd.DataFrame],
+                        dates: pd.DatetimeIndex) -> np.ndarray:
+    """
+    Get (time step, time-series) matrix of demands - normalised by their max. - and RES CF of all zones
+    """
+    date_col = COLUMN_NAMES.date
+    value_col = COLUMN_NAMES.value
+    prod_type_agg_col = f"{COLUMN_NAMES.production_type}_agg"
+    zones_ts = []
+    for zone, df_demand in demand.items():
+        demand_values = df_demand[value_col].to_numpy(dtype=float)
+        max_demand = np.abs(demand_values).max()
+        zones_ts.append(demand_values / max_demand if max_demand > 0 else demand_values)
+        df_cf = agg_cf_data.get(zone)
+        if isinstance(df_cf, pd.DataFrame) and len(df_cf) > 0:
+            df_cf_ts = df_cf.pivot(index=date_col, columns=prod_type_agg_col, values=value_col).reindex(dates)
+            zones_ts.extend(df_cf_ts.fillna(0).to_numpy(dtype=float).T)
+    return np.column_stack(zones_ts)
+
+
+def get_representative_periods(periods_features: np.ndarray, n_periods: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cluster periods (hierarchical Ward clustering) and get medoid of each cluster
+    :returns: medoid periods (chronological order), and position of the medoid of each period in these ones
+    """
+    clusters = fcluster(linkage(periods_features, method="ward"), t=n_periods, criterion="maxclust")
+    medoids = []
+    for cluster in np.unique(clusters):
+        cluster_periods = np.flatnonzero(clusters == cluster)
+        cluster_features = periods_features[cluster_periods]
+        # medoid: period of the cluster closest to its centroid
+        dists_to_centroid = ((cluster_features - cluster_features.mean(axis=0)) ** 2).sum(axis=1)
+        medoids.append(cluster_periods[np.argmin(dists_to_centroid)])
+    medoids = np.sort(medoids)
+    medoid_positions = {clusters[medoid]: i_medoid for i_medoid, medoid in enumerate(medoids)}
+    return medoids, np.array([medoid_positions[cluster] for cluster in clusters])
+
+
+def select_repr_steps(df: pd.DataFrame, dates: pd.DatetimeIndex, repr_steps: np.ndarray) -> pd.DataFrame:
+    """
+    Select data of representative time steps - per aggreg. prod type for CF data
+    """
+    date_col = COLUMN_NAMES.date
+    repr_dates = dates[repr_steps]
+    prod_type_agg_col = f"{COLUMN_NAMES.production_type}_agg"
+    if prod_type_agg_col not in df.columns:
+        return df.set_index(date_col).loc[repr_dates].reset_index()[df.columns]
+    return pd.concat([df_pt.set_index(date_col).loc[repr_dates].reset_index()[df.columns]
+                      for _, df_pt in df.groupby(prod_type_agg_col, sort=False)], ignore_index=True)
+
+
+def aggregate_countries_time_series(demand: Dict[str, pd.DataFrame], agg_cf_data: Dict[str, pd.DataFrame],
+                                    n_periods: int, period_hours: int = 24, resolution_hours: int = 1) \
+        -> (Dict[str, pd.DataFrame], Dict[str, pd.DataFrame], TemporalAggregation):
+    """
+    Aggregate UC period into representative periods
+    :param demand, agg_cf_data: per-zone data, as obtained with get_countries_data
+    :param n_periods: number of representative periods
+    :param period_hours: duration of each period (e.g. 24 for days, 168 for weeks)
+    :param resolution_hours: duration of time steps of data - a divisor of period duration
+    :returns: same data on representative periods only, and temporal aggregation to set network snapshot
+    weightings and disaggregate UC results
+    """
+    dates = pd.DatetimeIndex(next(iter(demand.values()))[COLUMN_NAMES.date])
+    n_steps = len(dates)
+    period_steps = period_hours // resolution_hours
+    n_full_periods = n_steps // period_steps
+    zones_ts = get_zones_ts_matrix(demand=demand, agg_cf_data=agg_cf_data, dates=dates)
+    n_clustered_steps = n_full_periods * period_steps
+    if n_periods >= n_full_periods:
+        print_out_msg(msg_level="warning", msg=f"{n_periods} representative periods asked for {n_full_periods} "
+                                               f"periods of {period_hours}h in UC period -> no aggregation")
+        medoids, periods_medoid_pos = np.arange(n_full_periods), np.arange(n_full_periods)
+    else:
+        periods_features = zones_ts[:n_clustered_steps].reshape(n_full_periods, -1)
+        medoids, periods_medoid_pos = get_representative_periods(periods_features=periods_features,
+                                                                 n_periods=n_periods)
+    n_medoids = len(medoids)
+    steps_in_period = np.arange(period_steps)
+    # representative steps: the ones of medoid periods, then the ones of incomplete last period
+    repr_steps = np.concatenate([(medoids[:, None] * period_steps + steps_in_period).ravel(),
+                                 np.arange(n_clustered_steps, n_steps)]).astype(int)
+    periods_weights = np.bincount(periods_medoid_pos, minlength=n_medoids)
+    repr_steps_weights = resolution_hours * np.concatenate([np.repeat(periods_weights, period_steps),
+                                                            np.ones(n_steps - n_clustered_steps)])
+    steps_repr_positions = np.concatenate([(periods_medoid_pos[:, None] * period_steps + steps_in_period).ravel(),
+                                           n_medoids * period_steps + np.arange(n_steps - n_clustered_steps)])
+    temporal_aggregation = TemporalAggregation(period_hours=period_hours, time_resolution_hours=resolution_hours,
+                                               first_date=f"{dates[0]:{DATE_FORMAT}}", n_steps=n_steps,
+                                               repr_steps=repr_steps.tolist(),
+                                               repr_steps_weights=repr_steps_weights.tolist(),
+                                               steps_repr_positions=steps_repr_positions.astype(int).tolist())
+    repr_demand = {zone: select_repr_steps(df=df_demand, dates=dates, repr_steps=repr_steps)
+                   for zone, df_demand in demand.items()}
+    repr_cf_data = {zone: select_repr_steps(df=df_cf, dates=dates, repr_steps=repr_steps)
+                    if isinstance(df_cf, pd.DataFrame) and len(df_cf) > 0 else df_cf
+                    for zone, df_cf in agg_cf_data.items()}
+    # error of reproduction of (normalised) input time-series by representative periods
+    ts_rmse = np.sqrt(np.mean((zones_ts[repr_steps][steps_repr_positions] - zones_ts) ** 2))
+    print_out_msg(msg_level="info", msg=f"Temporal aggregation: {n_steps} -> {len(repr_steps)} time steps "
+                                        f"({n_medoids} representative periods of {period_hours}h), RMSE of "
+                                        f"normalised demand/CF time-series {ts_rmse:.3f}")
+    return repr_demand, repr_cf_data, temporal_aggregation
+
+
+def set_network_temporal_aggregation(network: pypsa.Network, temporal_aggregation: TemporalAggregation,
+                                     target_year: int):
+    """
+    Set snapshots of representative time steps and their weightings - kept with network to disaggregate results
+    (and set cyclic storage constraints, see add_repr_periods_storage_constraints)
+    """
+    network.set_snapshots(temporal_aggregation.get_snapshots(target_year=target_year))
+    repr_steps_weights = np.array(temporal_aggregation.repr_steps_weights)
+    network.snapshot_weightings["objective"] = repr_steps_weights
+    network.snapshot_weightings["generators"] = repr_steps_weights
+    # (state of charge evolving over the duration of each time step, not over the hours it represents)
+    network.snapshot_weightings["stores"] = float(temporal_aggregation.time_resolution_hours)
+    network.meta[TEMPORAL_AGGREGATION_META_KEY] = asdict(temporal_aggregation)
+
+
+def add_repr_periods_storage_constraints(network: pypsa.Network, snapshots: pd.Index):
+    """
+    Make each representative period cyclic for storage units: state of charge at its end equal to the one at the
+    beginning of UC period - initial one, or the one of last time step for cyclic units. To be given as
+    extra_functionality of network.optimize; no constraint without temporal aggregation
+    """
+    temporal_aggregation = get_network_temporal_aggregation(network=network)
+    if temporal_aggregation is None or network.storage_units.empty:
+        return
+    period_steps = temporal_aggregation.period_hours // temporal_aggregation.time_resolution_hours
+    periods_ends = snapshots[np.arange(1, temporal_aggregation.get_n_repr_periods() + 1) * period_steps - 1]
+    state_of_charge = network.model["StorageUnit-state_of_charge"]
+    # first period: back to the beginning of UC period
+    is_cyclic = network.storage_units["cyclic_state_of_charge"]
+    cyclic_units = is_cyclic.index[is_cyclic]
+    other_units = is_cyclic.index[~is_cyclic]
+    if len(cyclic_units) > 0:
+        network.model.add_constraints(state_of_charge.sel(snapshot=periods_ends[0], name=cyclic_units)
+                                      - state_of_charge.sel(snapshot=snapshots[-1], name=cyclic_units) == 0,
+                                      name="StorageUnit-repr_period_0_cyclic_soc")
+    if len(other_units) > 0:
+        # (in MWh)
+        init_state_of_charge = network.storage_units.loc[other_units, "state_of_charge_initial"]
+        network.model.add_constraints(state_of_charge.sel(snapshot=periods_ends[0], name=other_units)
+                                      == init_state_of_charge.rename_axis("name").to_xarray(),
+                                      name="StorageUnit-repr_period_0_initial_soc")
+    # next ones: same state of charge at the end of each period as at the end of the previous one
+    for i_period in range(1, len(periods_ends)):
+        network.model.add_constraints(state_of_charge.sel(snapshot=periods_ends[i_period])
+                                      - state_of_charge.sel(snapshot=periods_ends[i_period - 1]) == 0,
+                                      name=f"StorageUnit-repr_period_{i_period}_cyclic_soc")
+
+
+def get_network_temporal_aggregation(network: pypsa.Network) -> Optional[TemporalAggregation]:
+    temporal_aggregation = network.meta.get(TEMPORAL_AGGREGATION_META_KEY)
+    if temporal_aggregation is None:
+        return None
+    return TemporalAggregation(**temporal_aggregation)
+
+
+def disaggregate_time_series(df: pd.DataFrame, temporal_aggregation: TemporalAggregation) -> pd.DataFrame:
+    """
+    Get UC results (df indexed by snapshots of representative time steps) on full calendar - each step taking
+    the values of its representative one
+    """
+    full_snapshots = temporal_aggregation.get_full_snapshots(target_year=df.index[0].year)
+    return df.iloc[temporal_aggregation.steps_repr_positions].set_axis(full_snapshots, axis=0)
+
+
+def get_unserved_energy(network: pypsa.Network) -> float:
+    """
+    Energy (in MWh) produced by failure units - weighted by snapshot durations
+    """
+    failure_units = network.generators.index[network.generators["carrier"] == "failure"]
+    failure_dispatch = network.generators_t.p.reindex(columns=failure_units).fillna(0)
+    return float(failure_dispatch.mul(network.snapshot_weightings["generators"], axis=0).sum().sum())
+
+
+def get_temporal_aggregation_errors(network: pypsa.Network, ref_network: pypsa.Network) -> Dict[str, float]:
+    """
+    Compare UC results of network solved on representative periods - or on coarser time steps - to the ones of
+    a full-resolution reference run: relative error on objective, MAE/RMSE of marginal prices, relative errors on
+    dispatch, and adequacy ones (unserved energy in MWh, peak price)
+    """
+    temporal_aggregation = get_network_temporal_aggregation(network=network)
+    marginal_prices = network.buses_t.marginal_price
+    dispatch = network.generators_t.p
+    if temporal_aggregation is not None:
+        marginal_prices = disaggregate_time_series(df=marginal_prices, temporal_aggregation=temporal_aggregation)
+        dispatch = disaggregate_time_series(df=dispatch, temporal_aggregation=temporal_aggregation)
+    ref_marginal_prices = ref_network.buses_t.marginal_price
+    ref_dispatch = ref_network.generators_t.p
+    buses = ref_marginal_prices.columns.intersection(marginal_prices.columns)
+    units = ref_dispatch.columns.intersection(dispatch.columns)
+    prices_diff = marginal_prices[buses].reindex(ref_marginal_prices.index, method="ffill").to_numpy() \
+        - ref_marginal_prices[buses].to_numpy()
+    # (coarser time steps of network, if any, spread over the ones of reference run)
+    dispatch_diff = dispatch[units].reindex(ref_dispatch.index, method="ffill").to_numpy() \
+        - ref_dispatch[units].to_numpy()
+    units_ref_energy = ref_dispatch[units].abs().sum()
+    ref_objective = get_network_obj_value(network=ref_network)
+    errors = {"objective_rel_error": (get_network_obj_value(network=network) - ref_objective) / abs(ref_objective),
+              "marginal_prices_mae": float(np.nanmean(np.abs(prices_diff))),
+              "marginal_prices_rmse": float(np.sqrt(np.nanmean(prices_diff ** 2))),
+              # errors on energy produced by each unit over UC period, and on hourly dispatch
+              "units_energy_rel_error": float(np.abs(dispatch_diff.sum(axis=0)).sum() / units_ref_energy.sum()),
+              "dispatch_rel_mae": float(np.nanmean(np.abs(dispatch_diff)) / ref_dispatch[units].abs().mean().mean()),
+              "unserved_energy_error": get_unserved_energy(network=network) - get_unserved_energy(network=ref_network),
+              "peak_price_error": float(marginal_prices[buses].max().max() - ref_marginal_prices[buses].max().max())}
+    errors_msg = ", ".join(f"{error_name} {error_value:.4g}" for error_name, error_value in errors.items())
+    print_out_msg(msg_level="info", msg=f"Temporal aggregation errors w.r.t. full-resolution run: {errors_msg}")
+    return errors
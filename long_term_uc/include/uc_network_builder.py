@@ -0,0 +1,229 @@
+"""
+Build PyPSA network of a UC run, from ERAA data and JSON params - at country or market node granularity, with
+zones clustering, representative periods or adaptive resolution if asked -, and get its outputs mapped back to
+original zones/hourly calendar. Used by main script (single run) and scenario runner; the latter building plain
+networks through a network template (see network_template.py), its time-series being swapped between runs
+"""
+from typing import Dict, Optional, Tuple
+import pandas as pd
+import pypsa
+
+from long_term_uc.common.constants_extract_eraa_data import ERAADatasetDescr
+from long_term_uc.common.fuel_sources import FUEL_SOURCES
+from long_term_uc.common.long_term_uc_io import SPATIAL_GRANULARITIES
+from long_term_uc.common.uc_run_params import UCRunParams
+from long_term_uc.include.adaptive_resolution import aggregate_countries_time_series_adaptively, \
+    get_hourly_time_series, get_network_adaptive_resolution, set_network_adaptive_resolution
+from long_term_uc.include.dataset_builder import GenerationUnitTable, add_energy_carrier, add_generators, \
+    add_gps_coordinates, add_interco_links, add_loads, control_min_pypsa_params_per_gen_units, \
+    get_generation_units_data, init_pypsa_network
+from long_term_uc.include.network_snapshot import get_network_inputs_fingerprint, load_network_snapshot, \
+    save_network_snapshot
+from long_term_uc.include.network_template import NetworkTemplate, build_network_template, get_uc_snapshots
+from long_term_uc.include.temporal_aggregation import aggregate_countries_time_series, disaggregate_time_series, \
+    get_network_temporal_aggregation, set_network_temporal_aggregation
+from long_term_uc.include.zones_clustering import cluster_countries_data, get_clusters_gps_coords, \
+    get_network_zones_clustering, get_zones_clusters, get_zones_dispatch, get_zones_marginal_prices, \
+    set_network_zones_clustering
+from long_term_uc.utils.basic_utils import get_period_str
+from long_term_uc.utils.country_data_cache import CountryDataLRUCache
+from long_term_uc.utils.df_utils import upsample_ts_df_to_hourly
+from long_term_uc.utils.eraa_data_reader import get_countries_data
+from long_term_uc.utils.eraa_utils import read_zones_to_market_nodes
+from long_term_uc.utils.read import read_and_check_pypsa_static_params
+
+
+def get_uc_generation_units_data(uc_run_params: UCRunParams, eraa_data_descr: ERAADatasetDescr,
+                                 agg_cf_data: Dict[str, pd.DataFrame],
+                                 agg_gen_capa_data: Dict[str, pd.DataFrame]) -> GenerationUnitTable:
+    """
+    Get generation units data of a UC run - from both ERAA data and JSON parameter files -, and check that
+    'minimal' PyPSA parameters are provided for them
+    """
+    print("Get generation units data, from both ERAA data - read just before - and JSON parameter file")
+    generation_units_data = \
+        get_generation_units_data(uc_run_params=uc_run_params,
+                                  pypsa_unit_params_per_agg_pt=eraa_data_descr.pypsa_unit_params_per_agg_pt,
+                                  units_complem_params_per_agg_pt=eraa_data_descr.units_complem_params_per_agg_pt,
+                                  agg_res_cf_data=agg_cf_data, agg_gen_capa_data=agg_gen_capa_data)
+    generation_units_data.units["committable"] = False
+    # TODO: connect this properly
+    #if len(uc_run_params.updated_fuel_sources_params) > 0:
+    #   generation_units_data = overwrite_gen_units_fuel_src_params(
+    #       generation_units_data=generation_units_data,
+    #       updated_fuel_sources_params=uc_run_params.updated_fuel_sources_params)
+
+    print("Check that 'minimal' PyPSA parameters for unit creation have been provided (in JSON files)/read (from "
+          "ERAA data)")
+    pypsa_static_params = read_and_check_pypsa_static_params()
+    control_min_pypsa_params_per_gen_units(
+        generation_units_data=generation_units_data,
+        pypsa_min_unit_params_per_agg_pt=pypsa_static_params.min_unit_params_per_agg_pt)
+    return generation_units_data
+
+
+def build_uc_network(uc_run_params: UCRunParams, eraa_data_descr: ERAADatasetDescr, is_stress_test: bool = False,
+                     country_data_cache: CountryDataLRUCache = None) -> Tuple[UCRunParams, pypsa.Network]:
+    """
+    Build PyPSA network of a UC run - reloaded if already built with same inputs (network snapshots shared by
+    all runs)
+    :param country_data_cache: see get_countries_data
+    :returns: UC run params - at market node granularity if asked -, and network
+    """
+    countries_gps_coords = eraa_data_descr.gps_coordinates
+    # model at market node granularity if asked ("spatial_granularity": "market_node" in JSON params) -> zones are
+    # then the market nodes of the selected countries, with ERAA data read in market nodes folder
+    if uc_run_params.spatial_granularity == SPATIAL_GRANULARITIES.market_node:
+        zones_to_market_nodes = read_zones_to_market_nodes()
+        uc_run_params = uc_run_params.get_market_nodes_run_params(zones_to_market_nodes=zones_to_market_nodes)
+        # market nodes located at coordinates of their country
+        countries_gps_coords = {market_node: gps_coords
+                                for country, gps_coords in eraa_data_descr.gps_coordinates.items()
+                                for market_node in zones_to_market_nodes.get(country, [])}
+    # reload network if already built with same inputs - see long_term_uc/include/network_snapshot.py
+    network_inputs_fingerprint = get_network_inputs_fingerprint(uc_run_params=uc_run_params,
+                                                                eraa_data_descr=eraa_data_descr,
+                                                                fuel_sources=FUEL_SOURCES,
+                                                                is_stress_test=is_stress_test)
+    network = load_network_snapshot(inputs_fingerprint=network_inputs_fingerprint)
+    if network is not None:
+        return uc_run_params, network
+
+    uc_period_msg = get_period_str(period_start=uc_run_params.uc_period_start, period_end=uc_run_params.uc_period_end)
+    print(f"Read needed ERAA ({eraa_data_descr.eraa_edition}) data for period {uc_period_msg}")
+    demand, agg_cf_data, agg_gen_capa_data, interco_capas = \
+        get_countries_data(uc_run_params=uc_run_params,
+                           agg_prod_types_with_cf_data=eraa_data_descr.agg_prod_types_with_cf_data,
+                           aggreg_prod_types_def=eraa_data_descr.aggreg_prod_types_def, is_stress_test=is_stress_test,
+                           country_data_cache=country_data_cache)
+    uc_zones = uc_run_params.selected_countries
+    # cluster zones into a reduced network (fast screening runs), if asked
+    zones_clustering = None
+    if uc_run_params.is_zones_clustering():
+        zones_clusters = get_zones_clusters(zones=uc_zones, interco_capas=interco_capas, demand=demand,
+                                            user_clusters=uc_run_params.zones_clusters,
+                                            n_clusters=uc_run_params.n_zones_clusters)
+        demand, agg_cf_data, agg_gen_capa_data, interco_capas, zones_clustering = \
+            cluster_countries_data(demand=demand, agg_cf_data=agg_cf_data, agg_gen_capa_data=agg_gen_capa_data,
+                                   interco_capas=interco_capas, zones_clusters=zones_clusters)
+        uc_zones = zones_clustering.get_clusters()
+        countries_gps_coords = get_clusters_gps_coords(countries_gps_coords=countries_gps_coords,
+                                                       zones_clusters=zones_clusters)
+    # aggregate UC period into representative periods (approximate runs on long horizons), if asked
+    temporal_aggregation = None
+    if uc_run_params.n_representative_periods is not None:
+        demand, agg_cf_data, temporal_aggregation = \
+            aggregate_countries_time_series(demand=demand, agg_cf_data=agg_cf_data,
+                                            n_periods=uc_run_params.n_representative_periods,
+                                            period_hours=uc_run_params.representative_period_hours,
+                                            resolution_hours=uc_run_params.time_resolution_hours)
+    # merge calm hours into longer (weighted) time steps, stress ones being kept hourly, if asked
+    adaptive_resolution = None
+    if uc_run_params.adaptive_resolution_max_hours is not None:
+        demand, agg_cf_data, adaptive_resolution = aggregate_countries_time_series_adaptively(
+            demand=demand, agg_cf_data=agg_cf_data, agg_gen_capa_data=agg_gen_capa_data, interco_capas=interco_capas,
+            max_block_hours=uc_run_params.adaptive_resolution_max_hours,
+            max_ratios_range=uc_run_params.adaptive_resolution_max_ratios_range,
+            stress_ratio=uc_run_params.adaptive_resolution_stress_ratio,
+            stress_share=uc_run_params.adaptive_resolution_stress_share)
+    generation_units_data = get_uc_generation_units_data(uc_run_params=uc_run_params, eraa_data_descr=eraa_data_descr,
+                                                         agg_cf_data=agg_cf_data, agg_gen_capa_data=agg_gen_capa_data)
+
+    # create PyPSA network
+    network = init_pypsa_network(df_demand_first_country=demand[uc_zones[0]])
+    if adaptive_resolution is not None:
+        # (first hour of each time step, weighted by its duration)
+        set_network_adaptive_resolution(network=network, adaptive_resolution=adaptive_resolution,
+                                        target_year=uc_run_params.selected_target_year)
+    elif temporal_aggregation is None:
+        network.set_snapshots(get_uc_snapshots(period_start=uc_run_params.uc_period_start,
+                                               period_end=uc_run_params.uc_period_end,
+                                               target_year=uc_run_params.selected_target_year,
+                                               resolution_hours=uc_run_params.time_resolution_hours))
+        # (each snapshot standing for time_resolution_hours hours)
+        network.snapshot_weightings.loc[:, :] = uc_run_params.time_resolution_hours
+    else:
+        # (representative time steps only, weighted)
+        set_network_temporal_aggregation(network=network, temporal_aggregation=temporal_aggregation,
+                                         target_year=uc_run_params.selected_target_year)
+    network = add_gps_coordinates(network=network,
+                                  countries_gps_coords={zone: gps_coords
+                                                        for zone, gps_coords in countries_gps_coords.items()
+                                                        if zone in uc_zones})
+    network = add_energy_carrier(network=network, fuel_sources=FUEL_SOURCES)
+    network = add_generators(network=network, generators_data=generation_units_data)
+    network = add_loads(network=network, demand=demand)
+    # (many market nodes not interconnected -> missing capas accepted)
+    network = add_interco_links(network, countries=uc_zones, interco_capas=interco_capas,
+                                check_missing_capas=uc_run_params.spatial_granularity == SPATIAL_GRANULARITIES.country)
+    if zones_clustering is not None:
+        set_network_zones_clustering(network=network, zones_clustering=zones_clustering)
+    save_network_snapshot(network=network, inputs_fingerprint=network_inputs_fingerprint)
+    return uc_run_params, network
+
+
+def is_network_template_usable(uc_run_params: UCRunParams) -> bool:
+    """
+    Network template - built once, then only its time-series swapped - usable for networks of countries, on
+    (regular) snapshots of UC period: without zones clustering, representative periods nor adaptive resolution
+    """
+    return uc_run_params.spatial_granularity == SPATIAL_GRANULARITIES.country \
+        and not uc_run_params.is_zones_clustering() and uc_run_params.n_representative_periods is None \
+        and uc_run_params.adaptive_resolution_max_hours is None
+
+
+def update_network_template(uc_run_params: UCRunParams, eraa_data_descr: ERAADatasetDescr,
+                            network_template: Optional[NetworkTemplate], is_stress_test: bool = False,
+                            country_data_cache: CountryDataLRUCache = None) -> NetworkTemplate:
+    """
+    Get network template of a UC run: given one with the time-series of this run swapped in if compatible (same
+    topology), otherwise a new one built from its data
+    :param country_data_cache: see get_countries_data
+    """
+    demand, agg_cf_data, agg_gen_capa_data, interco_capas = \
+        get_countries_data(uc_run_params=uc_run_params,
+                           agg_prod_types_with_cf_data=eraa_data_descr.agg_prod_types_with_cf_data,
+                           aggreg_prod_types_def=eraa_data_descr.aggreg_prod_types_def, is_stress_test=is_stress_test,
+                           country_data_cache=country_data_cache)
+    if network_template is not None and network_template.is_compatible(uc_run_params=uc_run_params):
+        network_template.set_time_series(demand=demand, agg_cf_data=agg_cf_data,
+                                         period_start=uc_run_params.uc_period_start,
+                                         period_end=uc_run_params.uc_period_end)
+        return network_template
+    generation_units_data = get_uc_generation_units_data(uc_run_params=uc_run_params, eraa_data_descr=eraa_data_descr,
+                                                         agg_cf_data=agg_cf_data, agg_gen_capa_data=agg_gen_capa_data)
+    countries = uc_run_params.selected_countries
+    return build_network_template(uc_run_params=uc_run_params, generation_units_data=generation_units_data,
+                                  demand=demand, interco_capas=interco_capas,
+                                  countries_gps_coords={country: gps_coords for country, gps_coords
+                                                        in eraa_data_descr.gps_coordinates.items()
+                                                        if country in countries},
+                                  fuel_sources=FUEL_SOURCES)
+
+
+def get_uc_outputs(network: pypsa.Network, hourly_outputs: bool = False,
+                   resolution_hours: int = 1) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Get optimal dispatch and marginal prices - mapped back to original zones with zones clustering, and to full
+    calendar with representative periods
+    :param hourly_outputs: upsample outputs to hourly ones, with a coarser (resolution_hours) or adaptive time
+    resolution
+    """
+    zones_clustering = get_network_zones_clustering(network=network)
+    if zones_clustering is None:
+        opt_power, marginal_prices = network.generators_t.p, network.buses_t.marginal_price
+    else:
+        opt_power = get_zones_dispatch(network=network, zones_clustering=zones_clustering)
+        marginal_prices = get_zones_marginal_prices(network=network, zones_clustering=zones_clustering)
+    temporal_aggregation = get_network_temporal_aggregation(network=network)
+    if temporal_aggregation is not None:
+        opt_power = disaggregate_time_series(df=opt_power, temporal_aggregation=temporal_aggregation)
+        marginal_prices = disaggregate_time_series(df=marginal_prices, temporal_aggregation=temporal_aggregation)
+    adaptive_resolution = get_network_adaptive_resolution(network=network)
+    if hourly_outputs and resolution_hours > 1:
+        opt_power = upsample_ts_df_to_hourly(df=opt_power, resolution_hours=resolution_hours)
+        marginal_prices = upsample_ts_df_to_hourly(df=marginal_prices, resolution_hours=resolution_hours)
+    if hourly_outputs and adaptive_resolution is not None:
+        opt_power = get_hourly_time_series(df=opt_power, adaptive_resolution=adaptive_resolution)
+        marginal_prices = get_hourly_time_series(df=marginal_prices, adaptive_resolution=adaptive_resolution)
+    return opt_power, marginal_prices
@@ -0,0 +1,225 @@
+"""
+Spatial clustering of zones (countries, or market nodes) into reduced networks, for fast screening runs:
+- data of the zones of each cluster aggregated - between get_countries_data and dataset_builder functions -,
+with same format as the one of get_countries_data (clusters instead of countries as keys)
+- UC results (marginal prices, dispatch) of the reduced network then mapped back to the original zones
+"""
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import pypsa
+
+from long_term_uc.common.error_msgs import print_out_msg
+from long_term_uc.common.long_term_uc_io import COLUMN_NAMES, GEN_CAPA_SUBDT_COLS
+from long_term_uc.include.dataset_builder import get_country_bus_name, set_gen_unit_name
+from long_term_uc.utils.df_utils import stack_zones_dfs
+
+
+ZONES_CLUSTERING_META_KEY = "zones_clustering"
+CLUSTER_COL = "cluster"
+
+
+@dataclass
+class ZonesClustering:
+    # {zone: name of its cluster}
+    zones_clusters: Dict[str, str]
+    # {unit of reduced network: {unit of original zone: share of capa in this zone}} - to map dispatch back
+    units_zones_shares: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+    def get_clusters(self) -> List[str]:
+        return list(dict.fromkeys(self.zones_clusters.values()))
+
+
+def get_auto_zones_clusters(zones: List[str], interco_capas: Dict[Tuple[str, str], float],
+                            demand: Dict[str, pd.DataFrame], n_clusters: int) -> Dict[str, List[str]]:
+    """
+    Automatic clusters: zones with the biggest interco. capas between them (i.e. the most coupled ones) merged
+    successively - Kruskal-like agglomeration - until n_clusters; each cluster named after its zone with the
+    biggest demand
+    """
+    zone_parent = {zone: zone for zone in zones}
+
+    def get_root(zone: str) -> str:
+        while zone_parent[zone] != zone:
+            zone_parent[zone] = zone_parent[zone_parent[zone]]
+            zone = zone_parent[zone]
+        return zone
+
+    # capa of each pair of zones, in both directions
+    pairs_capa = {}
+    for (zone_origin, zone_dest), capa in interco_capas.items():
+        if zone_origin in zone_parent and zone_dest in zone_parent and zone_origin != zone_dest:
+            pair = tuple(sorted((zone_origin, zone_dest)))
+            pairs_capa[pair] = pairs_capa.get(pair, 0) + capa
+    n_current_clusters = len(zones)
+    for (zone1, zone2), _ in sorted(pairs_capa.items(), key=lambda pair_capa: -pair_capa[1]):
+        if n_current_clusters <= n_clusters:
+            break
+        root1, root2 = get_root(zone=zone1), get_root(zone=zone2)
+        if root1 != root2:
+            zone_parent[root2] = root1
+            n_current_clusters -= 1
+    clusters_zones = {}
+    for zone in zones:
+        clusters_zones.setdefault(get_root(zone=zone), []).append(zone)
+    total_demands = {zone: demand[zone][COLUMN_NAMES.value].sum() for zone in zones}
+    return {max(cluster_zones, key=total_demands.get): cluster_zones for cluster_zones in clusters_zones.values()}
+
+
+def get_zones_clusters(zones: List[str], interco_capas: Dict[Tuple[str, str], float],
+                       demand: Dict[str, pd.DataFrame], user_clusters: Dict[str, List[str]] = None,
+                       n_clusters: int = None) -> Dict[str, str]:
+    """
+    Get cluster of each zone
+    :param user_clusters: {cluster name: its zones} - zones not in any cluster being kept alone
+    :param n_clusters: number of automatic clusters, used if no user clusters
+    :returns: {zone: name of its cluster}
+    """
+    if user_clusters is None:
+        user_clusters = get_auto_zones_clusters(zones=zones, interco_capas=interco_capas, demand=demand,
+                                                n_clusters=n_clusters)
+    zones_clusters = {zone: cluster for cluster, cluster_zones in user_clusters.items() for zone in cluster_zones
+                      if zone in zones}
+    zones_clusters |= {zone: zone for zone in zones if zone not in zones_clusters}
+    # clusters are buses of the reduced network -> their (short) bus names must differ
+    clusters_per_bus = {}
+    for cluster in dict.fromkeys(zones_clusters.values()):
+        clusters_per_bus.setdefault(get_country_bus_name(country=cluster), []).append(cluster)
+    same_bus_clusters = [clusters for clusters in clusters_per_bus.values() if len(clusters) > 1]
+    if len(same_bus_clusters) > 0:
+        raise ValueError(f"Clusters with the same bus name in reduced network: {same_bus_clusters}; rename them")
+    return zones_clusters
+
+
+def cluster_countries_data(demand: Dict[str, pd.DataFrame], agg_cf_data: Dict[str, pd.DataFrame],
+                           agg_gen_capa_data: Dict[str, pd.DataFrame], interco_capas: Dict[Tuple[str, str], float],
+                           zones_clusters: Dict[str, str]) \
+        -> (Dict[str, pd.DataFrame], Dict[str, pd.DataFrame], Dict[str, pd.DataFrame],
+            Dict[Tuple[str, str], float], ZonesClustering):
+    """
+    Aggregate data of the zones of each cluster - demand and capas summed, CF weighted by capas of each zone,
+    interco. capas between clusters summed
+    :param demand, agg_cf_data, agg_gen_capa_data, interco_capas: per-zone data, as obtained with
+    get_countries_data
+    :returns: same data with clusters as zones, and zones clustering to map UC results back to zones
+    """
+    zone_col = COLUMN_NAMES.zone
+    date_col = COLUMN_NAMES.date
+    value_col = COLUMN_NAMES.value
+    prod_type_agg_col = f"{COLUMN_NAMES.production_type}_agg"
+    power_capa_col = "power_capacity"
+
+    # demand: sum over zones of each cluster, at each date
+    df_demand = stack_zones_dfs(zones_dfs=demand, zone_col=zone_col)
+    df_demand[CLUSTER_COL] = df_demand[zone_col].map(zones_clusters)
+    df_demand = df_demand.groupby([CLUSTER_COL, date_col], sort=False) \
+        .agg({COLUMN_NAMES.climatic_year: "first", value_col: "sum"}).reset_index(level=date_col)
+    clusters_demand = {cluster: df_cluster[[COLUMN_NAMES.climatic_year, date_col, value_col]].reset_index(drop=True)
+                       for cluster, df_cluster in df_demand.groupby(level=CLUSTER_COL, sort=False)}
+
+    # generation capas: sum over zones of each cluster, per aggreg. prod type
+    df_capas = stack_zones_dfs(zones_dfs=agg_gen_capa_data, zone_col=zone_col)
+    df_capas[CLUSTER_COL] = df_capas[zone_col].map(zones_clusters)
+    capa_cols = [col for col in GEN_CAPA_SUBDT_COLS if col in df_capas.columns]
+    df_clusters_capas = df_capas.groupby([CLUSTER_COL, prod_type_agg_col], sort=False)[capa_cols].sum() \
+        .reset_index(level=prod_type_agg_col)
+    clusters_capas = {cluster: df_cluster.reset_index(drop=True)
+                      for cluster, df_cluster in df_clusters_capas.groupby(level=CLUSTER_COL, sort=False)}
+
+    # CF: weighted by (power) capa of each zone - simple mean if no capa in cluster
+    df_cf = stack_zones_dfs(zones_dfs=agg_cf_data, zone_col=zone_col)
+    clusters_cf = {}
+    if len(df_cf) > 0:
+        df_cf[CLUSTER_COL] = df_cf[zone_col].map(zones_clusters)
+        cf_weights = df_capas.set_index([zone_col, prod_type_agg_col])[power_capa_col]
+        df_cf["weight"] = cf_weights.reindex(pd.MultiIndex.from_frame(df_cf[[zone_col, prod_type_agg_col]])) \
+            .fillna(0).to_numpy()
+        df_cf["weighted_value"] = df_cf[value_col] * df_cf["weight"]
+        df_cf = df_cf.groupby([CLUSTER_COL, prod_type_agg_col, date_col], sort=False) \
+            .agg(weighted_value=("weighted_value", "sum"), weight=("weight", "sum"), mean_value=(value_col, "mean")) \
+            .reset_index(level=[prod_type_agg_col, date_col])
+        has_weight = df_cf["weight"] > 0
+        df_cf[value_col] = np.where(has_weight, df_cf["weighted_value"] / df_cf["weight"].where(has_weight),
+                                    df_cf["mean_value"])
+        clusters_cf = {cluster: df_cluster[[prod_type_agg_col, date_col, value_col]].reset_index(drop=True)
+                       for cluster, df_cluster in df_cf.groupby(level=CLUSTER_COL, sort=False)}
+    clusters_cf |= {cluster: {} for cluster in clusters_demand if cluster not in clusters_cf}
+
+    # interco. capas: sum over pairs of zones of 2 different clusters
+    clusters_interco_capas = {}
+    for (zone_origin, zone_dest), capa in interco_capas.items():
+        if zone_origin in zones_clusters and zone_dest in zones_clusters:
+            cluster_origin, cluster_dest = zones_clusters[zone_origin], zones_clusters[zone_dest]
+            if cluster_origin != cluster_dest:
+                clusters_interco_capas[(cluster_origin, cluster_dest)] = \
+                    clusters_interco_capas.get((cluster_origin, cluster_dest), 0) + capa
+
+    # share of each zone in capa of clustered units (equal shares if no capa)
+    df_capas["cluster_capa"] = df_capas.groupby([CLUSTER_COL, prod_type_agg_col])[power_capa_col].transform("sum")
+    df_capas["n_cluster_zones"] = df_capas.groupby([CLUSTER_COL, prod_type_agg_col])[power_capa_col] \
+        .transform("size")
+    has_cluster_capa = df_capas["cluster_capa"] > 0
+    df_capas["share"] = np.where(has_cluster_capa,
+                                 df_capas[power_capa_col] / df_capas["cluster_capa"].where(has_cluster_capa),
+                                 1 / df_capas["n_cluster_zones"])
+    zones_clustering = ZonesClustering(zones_clusters=zones_clusters)
+    for zone, cluster, agg_pt, share in zip(df_capas[zone_col], df_capas[CLUSTER_COL], df_capas[prod_type_agg_col],
+                                            df_capas["share"]):
+        cluster_unit = set_gen_unit_name(country=cluster, agg_prod_type=agg_pt)
+        zones_clustering.units_zones_shares.setdefault(cluster_unit, {})[
+            set_gen_unit_name(country=zone, agg_prod_type=agg_pt)] = float(share)
+
+    print_out_msg(msg_level="info",
+                  msg=f"Zones clustering: {len(demand)} -> {len(clusters_demand)} buses, "
+                      f"{len(zones_clustering.units_zones_shares)} units instead of "
+                      f"{sum(len(zone_shares) for zone_shares in zones_clustering.units_zones_shares.values())}, "
+                      f"{len(clusters_interco_capas)} interco. capas instead of {len(interco_capas)}")
+    return clusters_demand, clusters_cf, clusters_capas, clusters_interco_capas, zones_clustering
+
+
+def get_clusters_gps_coords(countries_gps_coords: Dict[str, Tuple[float, float]],
+                            zones_clusters: Dict[str, str]) -> Dict[str, Tuple[float, float]]:
+    """
+    GPS coordinates of clusters: mean of the ones of their zones
+    """
+    clusters_coords = {}
+    for zone, cluster in zones_clusters.items():
+        if zone in countries_gps_coords:
+            clusters_coords.setdefault(cluster, []).append(countries_gps_coords[zone])
+    return {cluster: tuple(np.mean(coords, axis=0)) for cluster, coords in clusters_coords.items()}
+
+
+def set_network_zones_clustering(network: pypsa.Network, zones_clustering: ZonesClustering):
+    # kept with network (and its snapshots) to map results back to zones
+    network.meta[ZONES_CLUSTERING_META_KEY] = asdict(zones_clustering)
+
+
+def get_network_zones_clustering(network: pypsa.Network) -> Optional[ZonesClustering]:
+    zones_clustering = network.meta.get(ZONES_CLUSTERING_META_KEY)
+    if zones_clustering is None:
+        return None
+    return ZonesClustering(**zones_clustering)
+
+
+def get_zones_marginal_prices(network: pypsa.Network, zones_clustering: ZonesClustering) -> pd.DataFrame:
+    """
+    Marginal prices of original zones: the ones of their cluster -> df (snapshot, zone bus)
+    """
+    marginal_prices = network.buses_t.marginal_price
+    zones_buses = {get_country_bus_name(country=zone): get_country_bus_name(country=cluster)
+                   for zone, cluster in zones_clustering.zones_clusters.items()}
+    return marginal_prices[list(zones_buses.values())].set_axis(list(zones_buses), axis=1)
+
+
+def get_zones_dispatch(network: pypsa.Network, zones_clustering: ZonesClustering) -> pd.DataFrame:
+    """
+    Dispatch of units of original zones: the one of their clustered unit, split with capa shares
+    -> df (snapshot, unit of original zone)
+    """
+    units_dispatch = pd.concat([network.generators_t.p, network.storage_units_t.p], axis=1)
+    zones_dispatch = {zone_unit: units_dispatch[cluster_unit] * share
+                      for cluster_unit, zone_shares in zones_clustering.units_zones_shares.items()
+                      if cluster_unit in units_dispatch.columns
+                      for zone_unit, share in zone_shares.items()}
+    return pd.DataFrame(zones_dispatch, index=units_dispatch.index)
@@ -43,6 +43,26 @@ def get_key_of_val(val, my_dict: dict, dict_name: str = None):
     return corresp_keys[0]
 
 
+def get_reverse_dict_of_lists(my_dict: dict, dict_name: str = None) -> dict:
+    """
+    Get reverse correspondence {val: key} of a dict. {key: list of vals}; to replace successive calls
+    to get_key_of_val by direct lookups (first key kept when multiple keys contain a same value)
+    """
+    reverse_dict = {}
+    multiple_keys_vals = []
+    for key, vals in my_dict.items():
+        for val in vals:
+            if val in reverse_dict:
+                multiple_keys_vals.append(val)
+            else:
+                reverse_dict[val] = key
+    if len(multiple_keys_vals) > 0:
+        dict_name = "" if dict_name is None else f" {dict_name}"
+        print(f"[WARNING] Multiple corresponding keys found in{dict_name} dict. for values {multiple_keys_vals} "
+              f"-> only first one used")
+    return reverse_dict
+
+
 def get_period_str(period_start: datetime, period_end: datetime):
     dow_start = DAY_OF_WEEK[period_start.isoweekday()]
     dow_end = DAY_OF_WEEK[period_end.isoweekday()]
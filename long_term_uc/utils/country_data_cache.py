@@ -0,0 +1,77 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import FrozenSet, Optional, Tuple, Union
+import pandas as pd
+
+from long_term_uc.common.error_msgs import print_out_msg
+
+
+DEFAULT_MAX_MEMORY_MB = 1024
+# (target year, country, climatic year, is stress test, selected aggreg. prod. types, the ones with CF data read)
+COUNTRY_DATA_KEY_TYPE = Tuple[int, str, int, bool, FrozenSet[str], FrozenSet[str]]
+# (df with demand, df with per aggreg. prod type CF - {} if no RES data -, df with generation capas - None if no data)
+COUNTRY_DATA_TYPE = Tuple[pd.DataFrame, Union[pd.DataFrame, dict], Optional[pd.DataFrame]]
+
+
+def get_data_memory_bytes(country_data: COUNTRY_DATA_TYPE) -> int:
+    return int(sum(df.memory_usage(index=True, deep=True).sum() for df in country_data
+                   if isinstance(df, pd.DataFrame)))
+
+
+@dataclass
+class CountryDataLRUCache:
+    """
+    In-process cache of (full climatic year) country data already loaded, with a Least Recently Used eviction
+    of data when memory budget is exceeded -> to be shared by the successive UC runs of a session
+    """
+    max_memory_mb: float = DEFAULT_MAX_MEMORY_MB
+    n_hits: int = 0
+    n_misses: int = 0
+    n_evictions: int = 0
+    memory_bytes: int = 0
+    cached_data: OrderedDict = field(default_factory=OrderedDict, repr=False)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def get(self, key: COUNTRY_DATA_KEY_TYPE) -> Optional[COUNTRY_DATA_TYPE]:
+        with self.lock:
+            if key not in self.cached_data:
+                self.n_misses += 1
+                return None
+            self.n_hits += 1
+            self.cached_data.move_to_end(key)
+            return self.cached_data[key][0]
+
+    def put(self, key: COUNTRY_DATA_KEY_TYPE, country_data: COUNTRY_DATA_TYPE):
+        data_bytes = get_data_memory_bytes(country_data=country_data)
+        max_memory_bytes = self.max_memory_mb * 1024 ** 2
+        if data_bytes > max_memory_bytes:
+            print_out_msg(msg_level="warning",
+                          msg=f"Data of {key[1]} bigger than country data cache budget ({self.max_memory_mb}MB) "
+                              f"-> not cached")
+            return
+        with self.lock:
+            if key in self.cached_data:
+                self.memory_bytes -= self.cached_data.pop(key)[1]
+            # evict least recently used data until new one fits in memory budget
+            while self.memory_bytes + data_bytes > max_memory_bytes:
+                _, (_, evicted_bytes) = self.cached_data.popitem(last=False)
+                self.memory_bytes -= evicted_bytes
+                self.n_evictions += 1
+            self.cached_data[key] = (country_data, data_bytes)
+            self.memory_bytes += data_bytes
+
+    def clear(self):
+        with self.lock:
+            self.cached_data.clear()
+            self.memory_bytes = 0
+
+    def get_stats(self) -> dict:
+        n_requests = self.n_hits + self.n_misses
+        return {"n_entries": len(self.cached_data), "memory_mb": self.memory_bytes / 1024 ** 2,
+                "n_hits": self.n_hits, "n_misses": self.n_misses, "n_evictions": self.n_evictions,
+                "hit_rate": self.n_hits / n_requests if n_requests > 0 else None}
+
+
+# default cache instance for the runs of a Python session (notebook, sweep)
+COUNTRY_DATA_CACHE = CountryDataLRUCache()
@@ -1,12 +1,14 @@
+import numpy as np
 import pandas as pd
 from typing import Dict, List
 from datetime import datetime
 
-from long_term_uc.utils.basic_utils import get_key_of_val
+from long_term_uc.utils.basic_utils import get_reverse_dict_of_lists
 
 
 def cast_df_col_as_date(df: pd.DataFrame, date_col: str, date_format: str) -> pd.DataFrame:
-    df[date_col] = df[date_col].apply(lambda x: datetime.strptime(x, date_format))
+    # explicit format -> vectorized parsing (no per-row format inference)
+    df[date_col] = pd.to_datetime(df[date_col], format=date_format)
     return df
 
 
@@ -25,8 +27,20 @@ def concatenate_dfs(dfs: List[pd.DataFrame], reset_index: bool = True) -> pd.Dat
 
 
 def set_aggreg_col_based_on_corresp(df: pd.DataFrame, col_name: str, created_agg_col_name: str, val_cols: List[str],
-                                    agg_corresp: Dict[str, List[str]], common_aggreg_ope, other_col_for_agg: str = None) -> pd.DataFrame:
-    df[created_agg_col_name] = df[col_name].apply(get_key_of_val, args=(agg_corresp,)) 
+                                    agg_corresp: Dict[str, List[str]], common_aggreg_ope, other_col_for_agg: str = None,
+                                    reverse_agg_corresp: Dict[str, str] = None) -> pd.DataFrame:
+    """
+    Aggregate values of a df based on a correspondence {aggreg. value: list of indiv. values} for one of its columns
+    :param reverse_agg_corresp: reverse correspondence {indiv. value: aggreg. value}, if already computed
+    (to be reused when aggregating multiple dfs with the same correspondence)
+    """
+    if reverse_agg_corresp is None:
+        reverse_agg_corresp = get_reverse_dict_of_lists(my_dict=agg_corresp)
+    df[created_agg_col_name] = df[col_name].map(reverse_agg_corresp)
+    # values without correspondence reported once (and ignored in aggregation hereafter)
+    unmatched_vals = df.loc[df[created_agg_col_name].isna(), col_name].unique()
+    if len(unmatched_vals) > 0:
+        print(f"[WARNING] No corresponding key found in dict. for values {list(unmatched_vals)} -> ignored")
     agg_operations = {col: common_aggreg_ope for col in val_cols}
     if other_col_for_agg is not None:
         gpby_cols = [created_agg_col_name]
@@ -45,6 +59,58 @@ def get_subdf_from_date_range(df: pd.DataFrame, date_col: str, date_min: datetim
     return df_range
 
 
+def resample_ts_df(df: pd.DataFrame, value_col: str, resolution_hours: int = 1, group_col: str = None,
+                   blocks_hours: List[int] = None) -> pd.DataFrame:
+    """
+    Resample (hourly) time-series df to a coarser resolution: mean of values over each block of resolution_hours
+    consecutive rows - of the same group if group_col -, other columns (e.g. date) taking their first value
+    :param blocks_hours: durations of successive blocks - of variable durations, covering all rows of each
+    group -, used instead of resolution_hours if given
+    """
+    step_positions = np.arange(len(df)) if group_col is None else df.groupby(group_col, sort=False).cumcount()
+    step_positions = np.asarray(step_positions)
+    step_col = "time_step"
+    if blocks_hours is None:
+        steps = step_positions // resolution_hours
+    else:
+        steps = np.repeat(np.arange(len(blocks_hours)), blocks_hours)[step_positions]
+    df_steps = df.assign(**{step_col: steps})
+    gpby_cols = [step_col] if group_col is None else [group_col, step_col]
+    agg_operations = {col: "mean" if col == value_col else "first" for col in df.columns if col not in gpby_cols}
+    return df_steps.groupby(gpby_cols, sort=False).agg(agg_operations).reset_index()[list(df.columns)]
+
+
+def upsample_ts_df_to_hourly(df: pd.DataFrame, resolution_hours: int = 1,
+                             blocks_hours: List[int] = None) -> pd.DataFrame:
+    """
+    Upsample df indexed by (regular) snapshots at a coarser resolution to hourly ones - values of each time step
+    repeated on its hours
+    :param blocks_hours: durations of (variable) time steps of df, used instead of resolution_hours if given
+    """
+    steps_hours = resolution_hours if blocks_hours is None else np.asarray(blocks_hours)
+    hourly_positions = np.repeat(np.arange(len(df)), steps_hours)
+    hourly_index = pd.date_range(start=df.index[0], periods=len(hourly_positions), freq="h")
+    return df.iloc[hourly_positions].set_axis(hourly_index, axis=0)
+
+
 def create_dict_from_cols_in_df(df: pd.DataFrame, key_col, val_col) -> dict:
     df_to_dict = df[[key_col, val_col]]
-    return dict(pd.MultiIndex.from_frame(df_to_dict))
\ No newline at end of file
+    return dict(pd.MultiIndex.from_frame(df_to_dict))
+
+
+def create_dict_from_tuple_cols_in_df(df: pd.DataFrame, key_cols: List[str], val_col) -> dict:
+    """
+    Create dict. {(val. of key_cols[0], val. of key_cols[1], ...): val. of val_col} from the rows of a df
+    """
+    return dict(zip(zip(*[df[col] for col in key_cols]), df[val_col]))
+
+
+def stack_zones_dfs(zones_dfs: Dict[str, pd.DataFrame], zone_col: str) -> pd.DataFrame:
+    """
+    Stack per-zone dfs in a single (long) df, with a zone column - zones without data ({} or None) being
+    ignored -> zone dimension handled as an axis of this df (groupby, isin...) rather than with loops over zones
+    """
+    zones_dfs = {zone: df for zone, df in zones_dfs.items() if isinstance(df, pd.DataFrame)}
+    if len(zones_dfs) == 0:
+        return pd.DataFrame(columns=[zone_col])
+    return pd.concat(zones_dfs, names=[zone_col]).reset_index(level=zone_col).reset_index(drop=True)
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from long_term_uc.common.error_msgs import print_out_msg
+from long_term_uc.common.long_term_uc_io import COLUMN_NAMES, FILES_FORMAT, INPUT_ERAA_FOLDER, \
+    OUTPUT_ERAA_CACHE_FOLDER
+from long_term_uc.utils.eraa_utils import cast_eraa_date_col
+
+
+@dataclass
+class CacheInvalidationModes:
+    # compare size and last modification time of source file with the ones stored when creating cache
+    stat: str = "stat"
+    # idem, but if they differ compare content hash before rebuilding (robust to copies/git checkouts)
+    hash: str = "hash"
+
+
+CACHE_INVALIDATION_MODES = CacheInvalidationModes()
+# to be incremented when format of cache files changes -> all existing cache files then rebuilt
+# (2: cache id shared by data and metadata files, null masks of str columns)
+CACHE_FORMAT_VERSION = 2
+CACHE_DATA_EXT = "npz"
+CACHE_METADATA_EXT = "json"
+# key of the id of a cache data file, also stored in its metadata -> data file replaced by another run since
+# metadata was read detected
+CACHE_ID_KEY = "cache_id"
+# suffix of (array) keys of null masks, saved for str columns with missing values (lost in fixed-size unicode)
+NULL_MASK_SUFFIX = "/isnull"
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def get_file_hash(file: str) -> str:
+    file_hash = hashlib.sha1()
+    with open(file, mode="rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def get_source_file_signature(file: str, with_hash: bool = False) -> dict:
+    file_stat = os.stat(file)
+    signature = {"size": file_stat.st_size, "mtime_ns": file_stat.st_mtime_ns}
+    if with_hash is True:
+        signature["sha1"] = get_file_hash(file=file)
+    return signature
+
+
+def get_cache_files(source_file: str, cache_folder: str = OUTPUT_ERAA_CACHE_FOLDER,
+                    data_ext: str = CACHE_DATA_EXT) -> Tuple[str, str]:
+    """
+    Get (data, metadata) cache files associated to a source csv file; ERAA sub-folders tree is kept in cache folder
+    """
+    source_rel_path = os.path.relpath(os.path.abspath(source_file), os.path.abspath(INPUT_ERAA_FOLDER))
+    # file outside of ERAA data folder -> flat name, made unique with a hash of its (absolute) path
+    if source_rel_path.startswith(os.pardir):
+        path_hash = hashlib.sha1(os.path.abspath(source_file).encode()).hexdigest()[:10]
+        source_rel_path = f"{path_hash}_{os.path.basename(source_file)}"
+    cache_file_prefix = os.path.join(cache_folder, os.path.splitext(source_rel_path)[0])
+    return f"{cache_file_prefix}.{data_ext}", f"{cache_file_prefix}.{CACHE_METADATA_EXT}"
+
+
+def set_eraa_df_types(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Set "real" types of ERAA data columns: dates as datetime, values as float
+    """
+    date_col = COLUMN_NAMES.date
+    value_col = COLUMN_NAMES.value
+    if date_col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[date_col]):
+        df = cast_eraa_date_col(df=df, date_col=date_col)
+    if value_col in df.columns:
+        df[value_col] = df[value_col].astype(float)
+    return df
+
+
+def read_cache_metadata(metadata_file: str) -> Optional[dict]:
+    if not os.path.isfile(metadata_file):
+        return None
+    try:
+        with open(metadata_file, mode="r", encoding="utf-8") as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def write_cache_metadata(metadata: dict, metadata_file: str):
+    # write in a temporary file then rename it, not to expose partially written files to concurrent runs
+    tmp_metadata_file = f"{metadata_file}.{os.getpid()}.tmp"
+    with open(tmp_metadata_file, mode="w", encoding="utf-8") as f:
+        f.write(json.dumps(metadata, indent=2))
+    os.replace(tmp_metadata_file, metadata_file)
+
+
+def is_cache_valid(metadata: Optional[dict], source_file: str, invalidation_mode: str) -> bool:
+    if metadata is None or metadata.get("format_version") != CACHE_FORMAT_VERSION:
+        return False
+    cached_signature = metadata["source_signature"]
+    current_signature = get_source_file_signature(file=source_file)
+    if current_signature["size"] != cached_signature["size"]:
+        return False
+    if current_signature["mtime_ns"] == cached_signature["mtime_ns"]:
+        return True
+    # modification time changed but content may not -> check it with hash if asked
+    if invalidation_mode == CACHE_INVALIDATION_MODES.hash and "sha1" in cached_signature:
+        return get_file_hash(file=source_file) == cached_signature["sha1"]
+    return False
+
+
+def get_df_columns_data(df: pd.DataFrame) -> Tuple[Dict[str, np.ndarray], Dict[str, str]]:
+    """
+    Get (typed) arrays of the columns of a df, and their dtypes - to be saved without pickle; plus null masks of
+    str columns with missing values (see NULL_MASK_SUFFIX)
+    """
+    columns_data = {}
+    columns_dtype = {}
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            col_values = df[col].to_numpy(dtype="datetime64[ns]")
+        elif pd.api.types.is_numeric_dtype(df[col]):
+            col_values = df[col].to_numpy()
+        else:  # str columns saved with a fixed-size unicode type (no pickle needed to read them)
+            col_values = df[col].to_numpy().astype(str)
+            col_isnull = df[col].isna().to_numpy()
+            if col_isnull.any():
+                columns_data[f"{col}{NULL_MASK_SUFFIX}"] = col_isnull
+        columns_data[col] = col_values
+        columns_dtype[col] = str(col_values.dtype)
+    return columns_data, columns_dtype
+
+
+def get_df_from_columns_data(columns_data: Mapping[str, np.ndarray], columns: List[str],
+                             columns_dtype: Dict[str, str] = None, key_prefix: str = "") -> pd.DataFrame:
+    """
+    Get df back from its column arrays - see get_df_columns_data; missing values of str columns restored
+    :param columns_data: {key_prefix + column: its values}, e.g. opened npz file
+    :param columns_dtype: {column: its dtype} to cast values to (None to keep them as read)
+    """
+    df_data = {}
+    for col in columns:
+        col_values = columns_data[f"{key_prefix}{col}"]
+        if columns_dtype is not None:
+            col_values = col_values.astype(columns_dtype[col], copy=False)
+        null_mask_key = f"{key_prefix}{col}{NULL_MASK_SUFFIX}"
+        if null_mask_key in columns_data:
+            col_values = col_values.astype(object)
+            col_values[columns_data[null_mask_key]] = np.nan
+        df_data[col] = col_values
+    return pd.DataFrame(df_data)
+
+
+def df_to_cache(df: pd.DataFrame, source_file: str, data_file: str, metadata_file: str):
+    os.makedirs(os.path.dirname(data_file), exist_ok=True)
+    columns_data, columns_dtype = get_df_columns_data(df=df)
+    cache_id = uuid.uuid4().hex
+    tmp_data_file = f"{data_file}.{os.getpid()}.tmp.{CACHE_DATA_EXT}"
+    np.savez(tmp_data_file, **columns_data, **{CACHE_ID_KEY: np.array(cache_id)})
+    os.replace(tmp_data_file, data_file)
+    # metadata written last, with id of data file -> never paired with data written by another run
+    metadata = {"format_version": CACHE_FORMAT_VERSION, CACHE_ID_KEY: cache_id, "source_file": source_file,
+                "source_signature": get_source_file_signature(file=source_file, with_hash=True),
+                "columns": list(df.columns), "dtypes": columns_dtype, "n_rows": len(df)}
+    write_cache_metadata(metadata=metadata, metadata_file=metadata_file)
+
+
+def df_from_cache(data_file: str, metadata: dict) -> Optional[pd.DataFrame]:
+    """
+    Read df from cache data file - None if this file does not correspond to metadata (replaced by another run)
+    """
+    with np.load(data_file, allow_pickle=False) as cached_data:
+        if CACHE_ID_KEY not in cached_data or str(cached_data[CACHE_ID_KEY]) != metadata.get(CACHE_ID_KEY):
+            return None
+        return get_df_from_columns_data(columns_data=cached_data, columns=metadata["columns"])
+
+
+def read_eraa_csv(csv_file: str, use_cache: bool = True,
+                  invalidation_mode: str = CACHE_INVALIDATION_MODES.stat) -> pd.DataFrame:
+    """
+    Read an ERAA csv file, with typed columns (datetime dates, float values); through a columnar cache
+    file to avoid re-parsing csv file in the following runs
+    :param csv_file: ERAA csv file to be read
+    :param use_cache: read (and if needed build) cache file instead of directly parsing csv file
+    :param invalidation_mode: how to detect that csv file changed - see CACHE_INVALIDATION_MODES
+    """
+    if use_cache is False:
+        df = pd.read_csv(csv_file, sep=FILES_FORMAT.column_sep, decimal=FILES_FORMAT.decimal_sep)
+        return set_eraa_df_types(df=df)
+
+    data_file, metadata_file = get_cache_files(source_file=csv_file)
+    metadata = read_cache_metadata(metadata_file=metadata_file)
+    if os.path.isfile(data_file) \
+            and is_cache_valid(metadata=metadata, source_file=csv_file, invalidation_mode=invalidation_mode):
+        # same content but new modif. time (hash check) -> update it, for next check to be a direct one
+        current_mtime_ns = get_source_file_signature(file=csv_file)["mtime_ns"]
+        if current_mtime_ns != metadata["source_signature"]["mtime_ns"]:
+            metadata["source_signature"]["mtime_ns"] = current_mtime_ns
+            write_cache_metadata(metadata=metadata, metadata_file=metadata_file)
+        df = df_from_cache(data_file=data_file, metadata=metadata)
+        if df is not None:
+            return df
+
+    print_out_msg(msg_level="info", msg=f"(Re)build cache of ERAA file {csv_file}")
+    df = pd.read_csv(csv_file, sep=FILES_FORMAT.column_sep, decimal=FILES_FORMAT.decimal_sep)
+    df = set_eraa_df_types(df=df)
+    df_to_cache(df=df, source_file=csv_file, data_file=data_file, metadata_file=metadata_file)
+    return df
@@ -1,23 +1,69 @@
 import os
-from typing import Dict, List, Tuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
 from long_term_uc.common.constants_datatypes import DATATYPE_NAMES
 from long_term_uc.common.error_msgs import print_out_msg
 from long_term_uc.common.long_term_uc_io import INPUT_ERAA_FOLDER, DT_SUBFOLDERS, DT_FILE_PREFIX, COLUMN_NAMES, \
-    FILES_FORMAT, DATE_FORMAT, GEN_CAPA_SUBDT_COLS, INPUT_CY_STRESS_TEST_SUBFOLDER
+    GEN_CAPA_SUBDT_COLS, INPUT_CY_STRESS_TEST_SUBFOLDER, MIN_DATE_IN_DATA, MAX_DATE_IN_DATA, \
+    OUTPUT_ERAA_WAREHOUSE_FILE, get_eraa_zones_folder
 from long_term_uc.common.uc_run_params import UCRunParams
 from long_term_uc.utils.basic_utils import str_sanitizer
-from long_term_uc.utils.df_utils import cast_df_col_as_date, concatenate_dfs, selec_in_df_based_on_list, \
-    set_aggreg_col_based_on_corresp, get_subdf_from_date_range, create_dict_from_cols_in_df
+from long_term_uc.utils.country_data_cache import COUNTRY_DATA_TYPE, CountryDataLRUCache
+from long_term_uc.utils.eraa_data_cache import read_eraa_csv
+from long_term_uc.utils.eraa_data_store import get_eraa_ts_view
+from long_term_uc.utils.eraa_data_warehouse import is_in_warehouse, read_df_from_warehouse
+from long_term_uc.utils.eraa_ts_index import ERAATsIndex, are_sliced_dates_coherent, get_eraa_ts_index, \
+    read_eraa_ts_pushdown
+from long_term_uc.utils.eraa_utils import PARSED_DATE_DTYPE, cast_eraa_date_col, get_eraa_dates_from_row_position
+from long_term_uc.utils.df_utils import concatenate_dfs, selec_in_df_based_on_list, \
+    set_aggreg_col_based_on_corresp, get_subdf_from_date_range, create_dict_from_tuple_cols_in_df, resample_ts_df
 
 
 
+@dataclass
+class ParallelBackends:
+    thread: str = "thread"
+    process: str = "process"
+
+
+PARALLEL_BACKENDS = ParallelBackends()
+
+
+def is_eraa_file_available(file: str, use_data_warehouse: bool = False) -> bool:
+    return os.path.exists(file) or (use_data_warehouse is True and is_in_warehouse(file=file))
+
+
+def read_eraa_data_file(csv_file: str, use_data_cache: bool, use_data_warehouse: bool = False) -> pd.DataFrame:
+    """
+    Read (typed) data of an ERAA csv file; from data warehouse if asked and file in it
+    """
+    if use_data_warehouse is True:
+        df = read_df_from_warehouse(csv_file=csv_file)
+        if df is not None:
+            return df
+    return read_eraa_csv(csv_file=csv_file, use_cache=use_data_cache)
+
+
 def filter_input_data(df: pd.DataFrame, date_col: str, climatic_year_col: str, period_start: datetime, 
-                      period_end: datetime, climatic_year: int) -> pd.DataFrame:
-    # ERAA date format not automatically cast by pd
-    df = cast_df_col_as_date(df=df, date_col=date_col, date_format=DATE_FORMAT)
+                      period_end: datetime, climatic_year: int, ts_index: ERAATsIndex = None) -> pd.DataFrame:
+    # ERAA date format not automatically cast by pd (already done if data read from cache)
+    if not pd.api.types.is_datetime64_any_dtype(df[date_col]):
+        df = cast_eraa_date_col(df=df, date_col=date_col)
+    # direct slicing of (climatic year, period) rows when file index available
+    if ts_index is not None:
+        row_range = ts_index.get_row_range(climatic_year=climatic_year, period_start=period_start,
+                                           period_end=period_end)
+        if row_range is None:
+            return df.iloc[0:0]
+        df_filtered = df.iloc[row_range[0]:row_range[1]]
+        if are_sliced_dates_coherent(dates=df_filtered[date_col], period_start=period_start, period_end=period_end):
+            return df_filtered
     # keep only wanted date range
     df_filtered = get_subdf_from_date_range(df=df, date_col=date_col, date_min=period_start, date_max=period_end)
     # then selected climatic year
@@ -26,6 +72,49 @@ def filter_input_data(df: pd.DataFrame, date_col: str, climatic_year_col: str, p
     return df_filtered
 
 
+def get_ts_data_from_store(csv_file: str, date_col: str, climatic_year_col: str, period_start: datetime,
+                           period_end: datetime, climatic_year: int) -> Optional[pd.DataFrame]:
+    ts_view = get_eraa_ts_view(csv_file=csv_file, climatic_year=climatic_year, period_start=period_start,
+                               period_end=period_end)
+    if ts_view is None:
+        return None
+    values, first_row = ts_view
+    n_rows = len(values)
+    dates = get_eraa_dates_from_row_position(n_rows=n_rows, first_row=first_row).astype(PARSED_DATE_DTYPE)
+    # copy=False -> value column kept as a view on memory-mapped store array
+    return pd.DataFrame({climatic_year_col: np.full(n_rows, climatic_year), date_col: dates,
+                         COLUMN_NAMES.value: values},
+                        index=pd.RangeIndex(start=first_row, stop=first_row + n_rows), copy=False)
+
+
+def read_filtered_ts_data(csv_file: str, date_col: str, climatic_year_col: str, period_start: datetime,
+                          period_end: datetime, climatic_year: int, use_data_cache: bool,
+                          use_data_store: bool = False, use_data_warehouse: bool = False) -> pd.DataFrame:
+    """
+    Read ERAA time-series data (demand, RES capa. factors) for a given climatic year and period
+    """
+    # (data store built from source csv files, not available if only warehouse is)
+    if use_data_store is True and os.path.isfile(csv_file):
+        df = get_ts_data_from_store(csv_file=csv_file, date_col=date_col, climatic_year_col=climatic_year_col,
+                                    period_start=period_start, period_end=period_end, climatic_year=climatic_year)
+        if df is not None:
+            return df
+    df = read_df_from_warehouse(csv_file=csv_file) if use_data_warehouse is True else None
+    # (data of a file only in warehouse signed by warehouse file)
+    signature_file = OUTPUT_ERAA_WAREHOUSE_FILE if df is not None and not os.path.isfile(csv_file) else csv_file
+    if df is None and use_data_cache is True:
+        df = read_eraa_csv(csv_file=csv_file, use_cache=True)
+    if df is not None:
+        ts_index = get_eraa_ts_index(csv_file=csv_file, climatic_years=df[climatic_year_col].to_numpy(),
+                                     signature_file=signature_file)
+        return filter_input_data(df=df, date_col=date_col, climatic_year_col=climatic_year_col,
+                                 period_start=period_start, period_end=period_end, climatic_year=climatic_year,
+                                 ts_index=ts_index)
+    # without cache, stream file with climatic year and period filters pushed down into reading
+    return read_eraa_ts_pushdown(csv_file=csv_file, climatic_year=climatic_year, period_start=period_start,
+                                 period_end=period_end, date_col=date_col, climatic_year_col=climatic_year_col)
+
+
 def set_aggreg_cf_prod_types_data(df_cf_list: List[pd.DataFrame], pt_agg_col: str, date_col: str, val_col: str) -> pd.DataFrame:
     # concatenate, aggreg. over prod type of same aggreg. type and avg
     df_cf_agg = concatenate_dfs(dfs=df_cf_list)
@@ -42,31 +131,273 @@ def gen_capa_pt_str_sanitizer(gen_capa_prod_type: str) -> str:
 
 
 def select_interco_capas(df_intercos_capa: pd.DataFrame, countries: List[str]) -> pd.DataFrame:
-    selection_col = "selected"
-    # add selection column
-    origin_col = COLUMN_NAMES.zone_origin
-    destination_col = COLUMN_NAMES.zone_destination
-    df_intercos_capa[selection_col] = \
-        df_intercos_capa.apply(lambda col: 1 if (col[origin_col] in countries 
-                                                 and col[destination_col] in countries) else 0, axis=1)
     # keep only lines with both origin and destination zones in the list of available countries
-    df_intercos_capa = df_intercos_capa[df_intercos_capa[selection_col] == 1]
-    # remove selection column
-    all_cols = list(df_intercos_capa.columns)
-    all_cols.remove(selection_col)
-    df_intercos_capa = df_intercos_capa[all_cols]
-    return df_intercos_capa
+    is_selected = df_intercos_capa[COLUMN_NAMES.zone_origin].isin(countries) \
+        & df_intercos_capa[COLUMN_NAMES.zone_destination].isin(countries)
+    return df_intercos_capa[is_selected]
+
+
+def get_country_data_files(country: str, year: int, selec_agg_prod_types: List[str],
+                           agg_prod_types_with_cf_data: List[str], aggreg_prod_types_def: Dict[str, List[str]],
+                           is_stress_test: bool = False, eraa_folder: str = INPUT_ERAA_FOLDER) \
+        -> Tuple[str, Dict[str, Dict[str, str]], str]:
+    """
+    Get ERAA data files of a given country, as read in read_country_data - see it for parameters
+    :returns: demand file, {aggreg. prod type with CF data: {prod type: its CF file}} (files possibly not
+    existing, then skipped when reading) and generation capas file
+    """
+    # [Coding trick] f"{year}_{country}" directly fullfill string with value of year 
+    # and country variables (f-string completion)
+    current_suffix = f"{year}_{country}"  # common suffix to all ERAA data files
+    # stress-test climatic years data in a dedicated subfolder of demand and RES CF ones
+    ts_subfolder = INPUT_CY_STRESS_TEST_SUBFOLDER if is_stress_test is True else ""
+    demand_folder = os.path.join(eraa_folder, DT_SUBFOLDERS.demand, ts_subfolder)
+    res_cf_folder = os.path.join(eraa_folder, DT_SUBFOLDERS.res_capa_factors, ts_subfolder)
+    gen_capas_folder = os.path.join(eraa_folder, DT_SUBFOLDERS.generation_capas)
+    demand_file = os.path.join(demand_folder, f"{DT_FILE_PREFIX.demand}_{current_suffix}.csv")
+    aggreg_pt_cf_def = aggreg_prod_types_def[DATATYPE_NAMES.capa_factor]
+    agg_pt_cf_files = {
+        agg_prod_type: {prod_type: os.path.join(res_cf_folder,
+                                                f"{DT_FILE_PREFIX.res_capa_factors}_{prod_type}_{current_suffix}.csv")
+                        for prod_type in aggreg_pt_cf_def[agg_prod_type]}
+        for agg_prod_type in selec_agg_prod_types if agg_prod_type in agg_prod_types_with_cf_data
+    }
+    gen_capa_data_file = os.path.join(gen_capas_folder, f"{DT_FILE_PREFIX.generation_capas}_{current_suffix}.csv")
+    return demand_file, agg_pt_cf_files, gen_capa_data_file
+
+
+def get_interco_capas_file(eraa_folder: str, year: int) -> str:
+    # (unique file for all zones)
+    return os.path.join(eraa_folder, DT_SUBFOLDERS.interco_capas, f"{DT_FILE_PREFIX.interco_capas}_{year}.csv")
+
+
+def get_run_eraa_files(uc_run_params: UCRunParams, agg_prod_types_with_cf_data: List[str],
+                       aggreg_prod_types_def: Dict[str, List[str]], is_stress_test: bool = False) -> List[str]:
+    """
+    Get all ERAA data files read for a UC run - see get_countries_data for parameters
+    """
+    eraa_folder = get_eraa_zones_folder(spatial_granularity=uc_run_params.spatial_granularity)
+    eraa_files = []
+    for country in uc_run_params.selected_countries:
+        demand_file, agg_pt_cf_files, gen_capa_data_file = \
+            get_country_data_files(country=country, year=uc_run_params.selected_target_year,
+                                   selec_agg_prod_types=uc_run_params.selected_prod_types[country],
+                                   agg_prod_types_with_cf_data=agg_prod_types_with_cf_data,
+                                   aggreg_prod_types_def=aggreg_prod_types_def, is_stress_test=is_stress_test,
+                                   eraa_folder=eraa_folder)
+        eraa_files.append(demand_file)
+        eraa_files.extend(cf_file for prod_types_cf_files in agg_pt_cf_files.values()
+                          for cf_file in prod_types_cf_files.values())
+        eraa_files.append(gen_capa_data_file)
+    eraa_files.append(get_interco_capas_file(eraa_folder=eraa_folder, year=uc_run_params.selected_target_year))
+    return eraa_files
+
+
+def read_country_data(country: str, year: int, climatic_year: int, selec_agg_prod_types: List[str],
+                      period_start: datetime, period_end: datetime, agg_prod_types_with_cf_data: List[str],
+                      aggreg_prod_types_def: Dict[str, List[str]], is_stress_test: bool = False,
+                      use_data_cache: bool = True, use_data_store: bool = False,
+                      use_data_warehouse: bool = False, eraa_folder: str = INPUT_ERAA_FOLDER) -> COUNTRY_DATA_TYPE:
+    """
+    Read ERAA data of a given country, for a given period - see get_countries_data for parameters
+    :param eraa_folder: folder of ERAA data at the spatial granularity of country - see get_eraa_zones_folder
+    :returns: df with demand, df with - per aggreg. prod type CF ({} if no RES data), df with installed
+    generation capas - before user updates - (None if no data)
+    """
+    # get ERAA files to be read
+    demand_file, agg_pt_cf_files, gen_capa_data_file = \
+        get_country_data_files(country=country, year=year, selec_agg_prod_types=selec_agg_prod_types,
+                               agg_prod_types_with_cf_data=agg_prod_types_with_cf_data,
+                               aggreg_prod_types_def=aggreg_prod_types_def, is_stress_test=is_stress_test,
+                               eraa_folder=eraa_folder)
+    # column names
+    date_col = COLUMN_NAMES.date
+    climatic_year_col = COLUMN_NAMES.climatic_year
+    prod_type_col = COLUMN_NAMES.production_type
+    prod_type_agg_col = f"{prod_type_col}_agg"
+    value_col = COLUMN_NAMES.value
+
+    n_spaces_msg = 2
+
+    aggreg_pt_gen_capa_def = aggreg_prod_types_def[DATATYPE_NAMES.installed_capa]
+
+    print(f"For country: {country}")
+    # read csv files
+    # get demand
+    print("Get demand")
+    # keeping only selected period date range and climatic year
+    current_df_demand = read_filtered_ts_data(csv_file=demand_file, date_col=date_col,
+                                              climatic_year_col=climatic_year_col, period_start=period_start,
+                                              period_end=period_end, climatic_year=climatic_year,
+                                              use_data_cache=use_data_cache, use_data_store=use_data_store,
+                                              use_data_warehouse=use_data_warehouse)
+
+    # get RES capacity factor data
+    print("Get RES capacity factors")
+    current_agg_cf_data = {}
+    df_res_cf_list = []
+    # (prod types with CF data only)
+    for agg_prod_type, prod_types_cf_files in agg_pt_cf_files.items():
+        print(n_spaces_msg * " " + f"- For aggreg. prod. type: {agg_prod_type}")
+        current_agg_pt_df_res_cf_list = []
+        for prod_type, cf_data_file in prod_types_cf_files.items():
+            if is_eraa_file_available(file=cf_data_file, use_data_warehouse=use_data_warehouse) is False:
+                print(2*n_spaces_msg * " " + f"[WARNING] RES capa. factor data file does not exist: {prod_type} not accounted for here")
+            else:
+                print(2*n_spaces_msg * " " + f"* Prod. type: {prod_type}")
+                current_df_res_cf = \
+                    read_filtered_ts_data(csv_file=cf_data_file, date_col=date_col,
+                                          climatic_year_col=climatic_year_col,
+                                          period_start=period_start, period_end=period_end,
+                                          climatic_year=climatic_year, use_data_cache=use_data_cache,
+                                          use_data_store=use_data_store, use_data_warehouse=use_data_warehouse)
+                if len(current_df_res_cf) == 0:
+                    print(2*n_spaces_msg * " " + f"[WARNING] No RES capa. factor data for prod. type {prod_type} and climatic year {climatic_year}")
+                else:
+                    # add column with production type (for later aggreg.)
+                    current_df_res_cf[prod_type_agg_col] = agg_prod_type
+                    current_agg_pt_df_res_cf_list.append(current_df_res_cf)
+        if len(current_agg_pt_df_res_cf_list) == 0:
+            print(n_spaces_msg * " " + f"[WARNING] No data available for aggregate RES prod. type {agg_prod_type} -> not accounted for in UC model here")
+        else:
+            df_res_cf_list.extend(current_agg_pt_df_res_cf_list)
+
+    # concatenate, aggreg. over prod type of same aggreg. type and avg
+    if len(df_res_cf_list) == 0:
+        print(n_spaces_msg * " " + f"[WARNING] No RES data available for country {country} -> not accounted for in UC model here")
+    else:
+        current_agg_cf_data = \
+            set_aggreg_cf_prod_types_data(df_cf_list=df_res_cf_list, pt_agg_col=prod_type_agg_col, date_col=date_col,
+                                          val_col=value_col)
+
+    # get installed generation capacity data
+    print("Get installed generation capacities (unique file per country and year, with all prod. types in it)")
+    if is_eraa_file_available(file=gen_capa_data_file, use_data_warehouse=use_data_warehouse) is False:
+        print_out_msg(msg_level="warning", msg=f"Generation capas data file does not exist: {country} not accounted for here")
+        current_df_gen_capa = None
+    else:
+        current_df_gen_capa = read_eraa_data_file(csv_file=gen_capa_data_file, use_data_cache=use_data_cache,
+                                                  use_data_warehouse=use_data_warehouse)
+        # Keep sanitize prod. types col values
+        current_df_gen_capa[prod_type_col] = current_df_gen_capa[prod_type_col].apply(gen_capa_pt_str_sanitizer)
+        # Keep only selected aggreg. prod. types
+        current_df_gen_capa = \
+            set_aggreg_col_based_on_corresp(df=current_df_gen_capa, col_name=prod_type_col,
+                                            created_agg_col_name=prod_type_agg_col, val_cols=GEN_CAPA_SUBDT_COLS, 
+                                            agg_corresp=aggreg_pt_gen_capa_def, common_aggreg_ope="sum")
+        current_df_gen_capa = \
+            selec_in_df_based_on_list(df=current_df_gen_capa, selec_col=prod_type_agg_col,
+                                      selec_vals=selec_agg_prod_types)
+
+    return current_df_demand, current_agg_cf_data, current_df_gen_capa
+
+
+def set_country_gen_capa_updates(df_gen_capa: Optional[pd.DataFrame], country: str,
+                                 uc_run_params: UCRunParams) -> Optional[pd.DataFrame]:
+    """
+    Apply user updates to generation capas of a given country: capacity values, and failure asset
+    """
+    if df_gen_capa is None:
+        return None
+    selec_agg_prod_types = uc_run_params.selected_prod_types
+    power_capacities = uc_run_params.updated_capacities_prod_types
+    # copy not to modify data possibly shared with other runs (cache)
+    current_df_gen_capa = df_gen_capa.copy()
+    if country in power_capacities:
+        for k, v in power_capacities[country].items():
+            current_df_gen_capa.loc[current_df_gen_capa['production_type_agg']==k, 'power_capacity'] = v
+
+    if 'failure' in selec_agg_prod_types[country]:
+        failure_df = pd.DataFrame.from_dict({
+            'production_type_agg': ['failure'],
+            'power_capacity': [uc_run_params.failure_power_capa],
+            'power_capacity_turbine': [0.0],
+            'power_capacity_pumping': [0.0],
+            'power_capacity_injection': [0.0],
+            'power_capacity_offtake': [0.0]
+        })
+        current_df_gen_capa = pd.concat([current_df_gen_capa, failure_df], ignore_index=True)
+
+    if country in power_capacities:
+        for k, v in power_capacities[country].items():
+            current_df_gen_capa.loc[current_df_gen_capa['production_type_agg']==k, 'power_capacity'] = v
+    print('#'*100)
+    print(current_df_gen_capa)
+    print('#'*100)
+
+    return current_df_gen_capa
+
+
+def get_country_data(country: str, uc_run_params: UCRunParams, agg_prod_types_with_cf_data: List[str],
+                     aggreg_prod_types_def: Dict[str, List[str]], is_stress_test: bool = False,
+                     use_data_cache: bool = True, use_data_store: bool = False, use_data_warehouse: bool = False,
+                     country_data_cache: CountryDataLRUCache = None) -> COUNTRY_DATA_TYPE:
+    """
+    Get ERAA data of a given country - see get_countries_data for parameters
+    :returns: df with demand, df with - per aggreg. prod type CF ({} if no RES data), df with installed
+    generation capas (None if no data)
+    """
+    year = uc_run_params.selected_target_year
+    climatic_year = uc_run_params.selected_climatic_year
+    selec_agg_prod_types = uc_run_params.selected_prod_types[country]
+    period_start = uc_run_params.uc_period_start
+    period_end = uc_run_params.uc_period_end
+    read_kwargs = {"country": country, "year": year, "climatic_year": climatic_year,
+                   "selec_agg_prod_types": selec_agg_prod_types,
+                   "agg_prod_types_with_cf_data": agg_prod_types_with_cf_data,
+                   "aggreg_prod_types_def": aggreg_prod_types_def, "is_stress_test": is_stress_test,
+                   "use_data_cache": use_data_cache, "use_data_store": use_data_store,
+                   "use_data_warehouse": use_data_warehouse,
+                   "eraa_folder": get_eraa_zones_folder(spatial_granularity=uc_run_params.spatial_granularity)}
+    if country_data_cache is None:
+        current_df_demand, current_agg_cf_data, current_df_gen_capa = \
+            read_country_data(period_start=period_start, period_end=period_end, **read_kwargs)
+    else:
+        # full climatic year data cached -> other periods of following runs directly obtained from it
+        cache_key = (year, country, climatic_year, is_stress_test, frozenset(selec_agg_prod_types),
+                     frozenset(agg_prod_types_with_cf_data).intersection(selec_agg_prod_types))
+        full_cy_data = country_data_cache.get(key=cache_key)
+        if full_cy_data is None:
+            full_cy_data = read_country_data(period_start=MIN_DATE_IN_DATA, period_end=MAX_DATE_IN_DATA,
+                                             **read_kwargs)
+            country_data_cache.put(key=cache_key, country_data=full_cy_data)
+        else:
+            print(f"For country: {country} -> data already loaded (cache)")
+        full_cy_df_demand, full_cy_agg_cf_data, current_df_gen_capa = full_cy_data
+        date_col = COLUMN_NAMES.date
+        current_df_demand = get_subdf_from_date_range(df=full_cy_df_demand, date_col=date_col,
+                                                      date_min=period_start, date_max=period_end)
+        current_agg_cf_data = full_cy_agg_cf_data
+        if isinstance(full_cy_agg_cf_data, pd.DataFrame):
+            current_agg_cf_data = \
+                get_subdf_from_date_range(df=full_cy_agg_cf_data, date_col=date_col, date_min=period_start,
+                                          date_max=period_end).reset_index(drop=True)
+    current_df_gen_capa = set_country_gen_capa_updates(df_gen_capa=current_df_gen_capa, country=country,
+                                                       uc_run_params=uc_run_params)
+    return current_df_demand, current_agg_cf_data, current_df_gen_capa
 
 
 def get_countries_data(uc_run_params: UCRunParams, agg_prod_types_with_cf_data: List[str],
-                       aggreg_prod_types_def: Dict[str, List[str]], is_stress_test: bool = False) \
+                       aggreg_prod_types_def: Dict[str, List[str]], is_stress_test: bool = False,
+                       use_data_cache: bool = True, use_data_store: bool = False, use_data_warehouse: bool = False,
+                       n_workers: int = 1,
+                       parallel_backend: str = PARALLEL_BACKENDS.thread,
+                       country_data_cache: CountryDataLRUCache = None) \
                         -> (Dict[str, pd.DataFrame], Dict[str, pd.DataFrame], 
                             Dict[str, pd.DataFrame], Dict[Tuple[str, str], float]):
     """
-    Get ERAA data necessary for the selected countries
+    Get ERAA data necessary for the selected countries - or market nodes, at market node spatial granularity
+    (see UCRunParams.get_market_nodes_run_params); read from the ERAA data folder of this granularity
     :param uc_run_params: UC run parameters, from which main reading infos will be obtained
     :param agg_prod_types_with_cf_data: aggreg. production types for which CF data must be read
     :param aggreg_prod_types_def: per-datatype definition of aggreg. to indiv. production types
+    :param use_data_cache: read ERAA files through their (typed, columnar) cache files - built at first reading
+    :param use_data_store: get demand and RES capa. factors as views on memory-mapped (climatic year, hour) arrays
+    :param use_data_warehouse: read ERAA data from single-file warehouse (if built) - see eraa_data_warehouse
+    :param n_workers: max. number of countries whose data is read in parallel (1 for sequential reading)
+    :param parallel_backend: pool used when n_workers > 1 - see PARALLEL_BACKENDS
+    :param country_data_cache: in-process cache of already loaded country data (e.g. COUNTRY_DATA_CACHE) to
+    be used for multiple runs in a session - None to always read data
     :returns: {country: df with demand of this country}, {country: df with - per aggreg. prod type CF}, 
     {country: df with installed generation capas}, df with all interconnection capas (for considered 
     countries and year)
@@ -74,163 +405,74 @@ def get_countries_data(uc_run_params: UCRunParams, agg_prod_types_with_cf_data:
     # set shorter names for simplicity
     countries = uc_run_params.selected_countries
     year = uc_run_params.selected_target_year
-    climatic_year = uc_run_params.selected_climatic_year
-    selec_agg_prod_types = uc_run_params.selected_prod_types
-    power_capacities = uc_run_params.updated_capacities_prod_types
-    period_start = uc_run_params.uc_period_start
-    period_end = uc_run_params.uc_period_end
-    # get - per datatype - folder names
-    demand_folder = os.path.join(INPUT_ERAA_FOLDER, DT_SUBFOLDERS.demand)
-    res_cf_folder = os.path.join(INPUT_ERAA_FOLDER, DT_SUBFOLDERS.res_capa_factors)
-    gen_capas_folder = os.path.join(INPUT_ERAA_FOLDER, DT_SUBFOLDERS.generation_capas)
-    interco_capas_folder = os.path.join(INPUT_ERAA_FOLDER, DT_SUBFOLDERS.interco_capas)
-    # file prefix
-    demand_prefix = DT_FILE_PREFIX.demand
-    res_cf_prefix = DT_FILE_PREFIX.res_capa_factors
-    gen_capas_prefix = DT_FILE_PREFIX.generation_capas
-    interco_capas_prefix = DT_FILE_PREFIX.interco_capas
-    # column names
-    date_col = COLUMN_NAMES.date
-    climatic_year_col = COLUMN_NAMES.climatic_year
-    prod_type_col = COLUMN_NAMES.production_type
-    prod_type_agg_col = f"{prod_type_col}_agg"
     value_col = COLUMN_NAMES.value
-    # separators for csv reader
-    column_sep = FILES_FORMAT.column_sep
-    decimal_sep = FILES_FORMAT.decimal_sep
+
+    get_country_data_kwargs = {"uc_run_params": uc_run_params,
+                               "agg_prod_types_with_cf_data": agg_prod_types_with_cf_data,
+                               "aggreg_prod_types_def": aggreg_prod_types_def, "is_stress_test": is_stress_test,
+                               "use_data_cache": use_data_cache, "use_data_store": use_data_store,
+                               "use_data_warehouse": use_data_warehouse}
+    n_workers = min(n_workers, len(countries))
+    if country_data_cache is not None and n_workers > 1 and parallel_backend == PARALLEL_BACKENDS.process:
+        print_out_msg(msg_level="warning", msg="Country data cache cannot be shared with process workers -> not used")
+        country_data_cache = None
+    get_country_data_kwargs["country_data_cache"] = country_data_cache
+    if n_workers > 1:
+        print_out_msg(msg_level="info", msg=f"Read countries data with {n_workers} {parallel_backend} workers")
+        pool_class = ProcessPoolExecutor if parallel_backend == PARALLEL_BACKENDS.process else ThreadPoolExecutor
+        with pool_class(max_workers=n_workers) as executor:
+            # map keeps order of countries -> same results as with sequential reading
+            countries_data = list(executor.map(partial(get_country_data, **get_country_data_kwargs), countries))
+    else:
+        countries_data = [get_country_data(country=country, **get_country_data_kwargs) for country in countries]
 
     demand = {}
     agg_cf_data = {}
     agg_gen_capa_data = {}
-
-    n_spaces_msg = 2
-
-    aggreg_pt_cf_def = aggreg_prod_types_def[DATATYPE_NAMES.capa_factor]
-    aggreg_pt_gen_capa_def = aggreg_prod_types_def[DATATYPE_NAMES.installed_capa]
-
-    for country in countries:
-        print(f"For country: {country}")
-        # read csv files
-        # [Coding trick] f"{year}_{country}" directly fullfill string with value of year 
-        # and country variables (f-string completion)
-        current_suffix = f"{year}_{country}"  # common suffix to all ERAA data files
-        # get demand
-        print("Get demand")
-        if is_stress_test is True:
-            demand_folder_full = f"{demand_folder}/{INPUT_CY_STRESS_TEST_SUBFOLDER}"
-        else:
-             demand_folder_full = f"{demand_folder}"
-        demand_file = f"{demand_folder_full}/{demand_prefix}_{current_suffix}.csv"
-        current_df_demand = pd.read_csv(demand_file, sep=column_sep, decimal=decimal_sep)
-        # then keep only selected period date range and climatic year
-        demand[country] = filter_input_data(df=current_df_demand, date_col=date_col, 
-                                            climatic_year_col=climatic_year_col, period_start=period_start,
-                                            period_end=period_end, climatic_year=climatic_year)
-
-        # get RES capacity factor data
-        print("Get RES capacity factors")
-        agg_cf_data[country] = {}
-        df_res_cf_list = []
-        for agg_prod_type in selec_agg_prod_types[country]:
-            # if prod type with CF data
-            if agg_prod_type in agg_prod_types_with_cf_data:
-                print(n_spaces_msg * " " + f"- For aggreg. prod. type: {agg_prod_type}")
-                current_agg_pt_df_res_cf_list = []
-                for prod_type in aggreg_pt_cf_def[agg_prod_type]:
-                    if is_stress_test is True:
-                        res_cf_folder_full = f"{res_cf_folder}/{INPUT_CY_STRESS_TEST_SUBFOLDER}"
-                    else:
-                        res_cf_folder_full = f"{res_cf_folder}"
-                    cf_filename = f"{res_cf_prefix}_{prod_type}_{current_suffix}.csv" 
-                    cf_data_file = f"{res_cf_folder_full}/{cf_filename}"
-                    if os.path.exists(cf_data_file) is False:
-                        print(2*n_spaces_msg * " " + f"[WARNING] RES capa. factor data file does not exist: {prod_type} not accounted for here")
-                    else:
-                        print(2*n_spaces_msg * " " + f"* Prod. type: {prod_type}")
-                        current_df_res_cf = pd.read_csv(cf_data_file, sep=column_sep, decimal=decimal_sep) 
-                        current_df_res_cf = \
-                            filter_input_data(df=current_df_res_cf, date_col=date_col,
-                                              climatic_year_col=climatic_year_col, 
-                                              period_start=period_start, period_end=period_end, 
-                                              climatic_year=climatic_year)
-                        if len(current_df_res_cf) == 0:
-                            print(2*n_spaces_msg * " " + f"[WARNING] No RES capa. factor data for prod. type {prod_type} and climatic year {climatic_year}")
-                        else:
-                            # add column with production type (for later aggreg.)
-                            current_df_res_cf[prod_type_agg_col] = agg_prod_type
-                            current_agg_pt_df_res_cf_list.append(current_df_res_cf)
-                if len(current_agg_pt_df_res_cf_list) == 0:
-                    print(n_spaces_msg * " " + f"[WARNING] No data available for aggregate RES prod. type {agg_prod_type} -> not accounted for in UC model here")
-                else:
-                    df_res_cf_list.extend(current_agg_pt_df_res_cf_list)
-
-        # concatenate, aggreg. over prod type of same aggreg. type and avg
-        if len(df_res_cf_list) == 0:
-            print(n_spaces_msg * " " + f"[WARNING] No RES data available for country {country} -> not accounted for in UC model here")
-        else:
-            agg_cf_data[country] = \
-                set_aggreg_cf_prod_types_data(df_cf_list=df_res_cf_list, pt_agg_col=prod_type_agg_col, date_col=date_col,
-                                              val_col=value_col)
-        
-        # get installed generation capacity data
-        print("Get installed generation capacities (unique file per country and year, with all prod. types in it)")
-        gen_capa_data_file = f"{gen_capas_folder}/{gen_capas_prefix}_{current_suffix}.csv"
-        if os.path.exists(gen_capa_data_file) is False:
-            print_out_msg(msg_level="warning", msg=f"Generation capas data file does not exist: {country} not accounted for here")
-        else:
-            current_df_gen_capa = pd.read_csv(gen_capa_data_file, sep=column_sep, decimal=decimal_sep)
-            # Keep sanitize prod. types col values
-            current_df_gen_capa[prod_type_col] = current_df_gen_capa[prod_type_col].apply(gen_capa_pt_str_sanitizer)
-            # Keep only selected aggreg. prod. types
-            current_df_gen_capa = \
-                set_aggreg_col_based_on_corresp(df=current_df_gen_capa, col_name=prod_type_col,
-                                                created_agg_col_name=prod_type_agg_col, val_cols=GEN_CAPA_SUBDT_COLS, 
-                                                agg_corresp=aggreg_pt_gen_capa_def, common_aggreg_ope="sum")
-            current_df_gen_capa = \
-                selec_in_df_based_on_list(df=current_df_gen_capa, selec_col=prod_type_agg_col,
-                                          selec_vals=selec_agg_prod_types[country])
-            if country in power_capacities:
-                for k, v in power_capacities[country].items():
-                    current_df_gen_capa.loc[current_df_gen_capa['production_type_agg']==k, 'power_capacity'] = v
-            
-            if 'failure' in selec_agg_prod_types[country]:
-                failure_df = pd.DataFrame.from_dict({
-                    'production_type_agg': ['failure'],
-                    'power_capacity': [uc_run_params.failure_power_capa],
-                    'power_capacity_turbine': [0.0],
-                    'power_capacity_pumping': [0.0],
-                    'power_capacity_injection': [0.0],
-                    'power_capacity_offtake': [0.0]
-                })
-                current_df_gen_capa = pd.concat([current_df_gen_capa, failure_df], ignore_index=True)
-            
-            if country in power_capacities:
-                for k, v in power_capacities[country].items():
-                    current_df_gen_capa.loc[current_df_gen_capa['production_type_agg']==k, 'power_capacity'] = v
+    for country, (current_df_demand, current_agg_cf_data, current_df_gen_capa) in zip(countries, countries_data):
+        demand[country] = current_df_demand
+        agg_cf_data[country] = current_agg_cf_data
+        if current_df_gen_capa is not None:
             agg_gen_capa_data[country] = current_df_gen_capa
-            print('#'*100)
-            print(current_df_gen_capa)
-            print('#'*100)
 
     # read interconnection capas file
     print("Get interconnection capacities, with unique file for all nodes (zones=countries) and year")
-    interco_capas_data_file = f"{interco_capas_folder}/{interco_capas_prefix}_{year}.csv"
-    if os.path.exists(interco_capas_data_file) is False:
+    interco_capas_data_file = get_interco_capas_file(
+        eraa_folder=get_eraa_zones_folder(spatial_granularity=uc_run_params.spatial_granularity), year=year)
+    if is_eraa_file_available(file=interco_capas_data_file, use_data_warehouse=use_data_warehouse) is False:
         print_out_msg(msg_level="warning", msg=f"Generation capas data file does not exist: {country} not accounted for here")
     else:
-        df_interco_capas = pd.read_csv(interco_capas_data_file, sep=column_sep, decimal=decimal_sep)
+        df_interco_capas = read_eraa_data_file(csv_file=interco_capas_data_file, use_data_cache=use_data_cache,
+                                               use_data_warehouse=use_data_warehouse)
     # and select information needed for selected countries
     df_interco_capas = select_interco_capas(df_intercos_capa=df_interco_capas, countries=countries)
-    # set as dictionary
-    origin_col = COLUMN_NAMES.zone_origin
-    destination_col = COLUMN_NAMES.zone_destination
-    tuple_key_col = "tuple_key"
-    df_interco_capas[tuple_key_col] = \
-        df_interco_capas.apply(lambda col: (col[origin_col], col[destination_col]),
-                               axis=1)
-    interco_capas = create_dict_from_cols_in_df(df=df_interco_capas, key_col=tuple_key_col, val_col=value_col)
+    # set as dictionary {(zone origin, zone destination): capa}
+    interco_capas = \
+        create_dict_from_tuple_cols_in_df(df=df_interco_capas, key_cols=[COLUMN_NAMES.zone_origin,
+                                                                         COLUMN_NAMES.zone_destination],
+                                          val_col=value_col)
     # add interco capas values set by user
     interco_capas |= uc_run_params.interco_capas_updated_values
 
+    if uc_run_params.time_resolution_hours > 1:
+        demand, agg_cf_data = resample_countries_ts(demand=demand, agg_cf_data=agg_cf_data,
+                                                    resolution_hours=uc_run_params.time_resolution_hours)
+
     return demand, agg_cf_data, agg_gen_capa_data, interco_capas
+
+
+def resample_countries_ts(demand: Dict[str, pd.DataFrame], agg_cf_data: Dict[str, pd.DataFrame],
+                          resolution_hours: int) -> (Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]):
+    """
+    Resample demand and RES CF of all countries to a coarser time resolution (mean over each time step)
+    """
+    print_out_msg(msg_level="info", msg=f"Resample demand and CF data to a {resolution_hours}h resolution")
+    value_col = COLUMN_NAMES.value
+    demand = {country: resample_ts_df(df=df_demand, value_col=value_col, resolution_hours=resolution_hours)
+              for country, df_demand in demand.items()}
+    agg_cf_data = {country: resample_ts_df(df=df_cf, value_col=value_col, resolution_hours=resolution_hours,
+                                           group_col=f"{COLUMN_NAMES.production_type}_agg")
+                   if isinstance(df_cf, pd.DataFrame) and len(df_cf) > 0 else df_cf
+                   for country, df_cf in agg_cf_data.items()}
+    return demand, agg_cf_data
     
\ No newline at end of file
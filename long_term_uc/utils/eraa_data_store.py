@@ -0,0 +1,119 @@
+"""
+Dense store of ERAA hourly time-series (demand, RES capa. factors - incl. stress-test climatic years): one
+(climatic year, hour) float array per source file, saved in .npy format and memory-mapped when read
+-> different runs/processes share the same OS page cache, and getting data for a period is a simple view
+
+Build it with: python -m long_term_uc.utils.eraa_data_store
+"""
+import glob
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from long_term_uc.common.error_msgs import print_out_msg
+from long_term_uc.common.long_term_uc_io import COLUMN_NAMES, DT_SUBFOLDERS, INPUT_CY_STRESS_TEST_SUBFOLDER, \
+    INPUT_ERAA_FOLDER, INPUT_PECD_SUBFOLDER, N_HOURS_PER_CLIMATIC_YEAR, OUTPUT_ERAA_DATA_STORE_FOLDER
+from long_term_uc.utils.eraa_data_cache import get_cache_files, get_source_file_signature, read_cache_metadata, \
+    read_eraa_csv, write_cache_metadata
+from long_term_uc.utils.eraa_ts_index import build_eraa_ts_index, get_hour_offset
+
+
+STORE_FORMAT_VERSION = 1
+STORE_DATA_EXT = "npy"
+# ERAA subfolders with hourly time-series (each one possibly with a stress-test climatic years subfolder)
+TS_DATA_SUBFOLDERS = [DT_SUBFOLDERS.demand, DT_SUBFOLDERS.res_capa_factors, INPUT_PECD_SUBFOLDER]
+
+# arrays already memory-mapped in current process {store data file: (source signature, array, climatic years)}
+OPENED_STORE_ARRAYS: Dict[str, Tuple[dict, np.ndarray, List[int]]] = {}
+
+
+def get_data_store_files(csv_file: str) -> Tuple[str, str]:
+    return get_cache_files(source_file=csv_file, cache_folder=OUTPUT_ERAA_DATA_STORE_FOLDER,
+                           data_ext=STORE_DATA_EXT)
+
+
+def is_store_entry_valid(catalog: Optional[dict], csv_file: str) -> bool:
+    if catalog is None or catalog.get("format_version") != STORE_FORMAT_VERSION:
+        return False
+    current_signature = get_source_file_signature(file=csv_file)
+    return all(current_signature[key] == catalog["source_signature"][key] for key in current_signature)
+
+
+def build_store_entry(csv_file: str, data_file: str, catalog_file: str) -> Optional[dict]:
+    df = read_eraa_csv(csv_file=csv_file)
+    ts_index = build_eraa_ts_index(climatic_years=df[COLUMN_NAMES.climatic_year].to_numpy())
+    if ts_index is None:
+        print_out_msg(msg_level="warning",
+                      msg=f"ERAA file {csv_file} not made of full climatic year blocks -> not added to data store")
+        return None
+    values = df[COLUMN_NAMES.value].to_numpy(dtype=float).reshape(-1, N_HOURS_PER_CLIMATIC_YEAR)
+    os.makedirs(os.path.dirname(data_file), exist_ok=True)
+    tmp_data_file = f"{data_file}.{os.getpid()}.tmp.{STORE_DATA_EXT}"
+    np.save(tmp_data_file, values)
+    os.replace(tmp_data_file, data_file)
+    catalog = {"format_version": STORE_FORMAT_VERSION, "source_file": csv_file,
+               "source_signature": get_source_file_signature(file=csv_file),
+               "climatic_years": list(ts_index.cy_first_row), "shape": list(values.shape)}
+    write_cache_metadata(metadata=catalog, metadata_file=catalog_file)
+    return catalog
+
+
+def get_store_array(csv_file: str) -> Optional[Tuple[np.ndarray, List[int]]]:
+    """
+    Get (read-only, memory-mapped) array of an ERAA time-series file - built if missing or outdated -,
+    and climatic years corresponding to its rows
+    """
+    data_file, catalog_file = get_data_store_files(csv_file=csv_file)
+    catalog = read_cache_metadata(metadata_file=catalog_file)
+    if not (os.path.isfile(data_file) and is_store_entry_valid(catalog=catalog, csv_file=csv_file)):
+        catalog = build_store_entry(csv_file=csv_file, data_file=data_file, catalog_file=catalog_file)
+        if catalog is None:
+            return None
+    opened_array = OPENED_STORE_ARRAYS.get(data_file)
+    if opened_array is None or opened_array[0] != catalog["source_signature"]:
+        opened_array = (catalog["source_signature"], np.load(data_file, mmap_mode="r"), catalog["climatic_years"])
+        OPENED_STORE_ARRAYS[data_file] = opened_array
+    return opened_array[1], opened_array[2]
+
+
+def get_eraa_ts_view(csv_file: str, climatic_year: int, period_start: datetime,
+                     period_end: datetime) -> Optional[Tuple[np.ndarray, int]]:
+    """
+    Get a (zero-copy) view on values of an ERAA time-series file for a given climatic year and period
+    [period_start, period_end); with position of its first row in file
+    -> None if this file cannot be stored; empty view if climatic year not in it
+    """
+    store_array = get_store_array(csv_file=csv_file)
+    if store_array is None:
+        return None
+    values, climatic_years = store_array
+    if climatic_year not in climatic_years:
+        return values[0, 0:0], 0
+    i_cy = climatic_years.index(climatic_year)
+    start_offset = get_hour_offset(date=period_start)
+    end_offset = max(get_hour_offset(date=period_end, round_up=True), start_offset)
+    return values[i_cy, start_offset:end_offset], i_cy * N_HOURS_PER_CLIMATIC_YEAR + start_offset
+
+
+def list_eraa_ts_files() -> List[str]:
+    ts_files = []
+    for subfolder in TS_DATA_SUBFOLDERS:
+        for folder in [os.path.join(INPUT_ERAA_FOLDER, subfolder),
+                       os.path.join(INPUT_ERAA_FOLDER, subfolder, INPUT_CY_STRESS_TEST_SUBFOLDER)]:
+            ts_files.extend(sorted(glob.glob(os.path.join(folder, "*.csv"))))
+    return ts_files
+
+
+def build_eraa_data_store():
+    ts_files = list_eraa_ts_files()
+    print_out_msg(msg_level="info", msg=f"Build ERAA data store, from {len(ts_files)} time-series files")
+    n_stored = 0
+    for csv_file in ts_files:
+        if get_store_array(csv_file=csv_file) is not None:
+            n_stored += 1
+    print_out_msg(msg_level="info", msg=f"{n_stored} series available in {OUTPUT_ERAA_DATA_STORE_FOLDER}")
+
+
+if __name__ == "__main__":
+    build_eraa_data_store()
@@ -0,0 +1,149 @@
+"""
+Single-file warehouse of ERAA data: all csv files of ERAA folder (time-series, generation and interco. capas,
+zones to market nodes...) as typed column arrays, plus raw copies of other data files (PEMMDB xlsx), in one
+compressed container with a catalog -> cold starts (new machine, container) need one file instead of hundreds
+
+Build it with: python -m long_term_uc.utils.eraa_data_warehouse
+"""
+import glob
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from long_term_uc.common.error_msgs import print_out_msg
+from long_term_uc.common.long_term_uc_io import INPUT_ERAA_FOLDER, OUTPUT_ERAA_WAREHOUSE_FILE
+from long_term_uc.utils.eraa_data_cache import get_df_columns_data, get_df_from_columns_data, read_eraa_csv
+
+
+WAREHOUSE_FORMAT_VERSION = 1
+CATALOG_KEY = "catalog"
+# extensions of files stored as typed tables (resp. as raw bytes)
+TABLE_FILES_EXT = "csv"
+RAW_FILES_EXT = ["xlsx"]
+
+# warehouse already opened in current process {(file, modif. time): (lazy npz file, catalog)}
+OPENED_WAREHOUSES: Dict[Tuple[str, int], Tuple[np.lib.npyio.NpzFile, dict]] = {}
+
+
+def get_warehouse_entry_name(file: str) -> Optional[str]:
+    """
+    Get name of a file in warehouse catalog: its path relatively to ERAA folder (None if outside of it)
+    """
+    rel_path = os.path.relpath(os.path.abspath(file), os.path.abspath(INPUT_ERAA_FOLDER))
+    if rel_path.startswith(os.pardir):
+        return None
+    return rel_path.replace(os.sep, "/")
+
+
+def list_eraa_files() -> Tuple[List[str], List[str]]:
+    table_files = sorted(glob.glob(os.path.join(INPUT_ERAA_FOLDER, "**", f"*.{TABLE_FILES_EXT}"), recursive=True))
+    raw_files = []
+    for raw_ext in RAW_FILES_EXT:
+        raw_files.extend(sorted(glob.glob(os.path.join(INPUT_ERAA_FOLDER, "**", f"*.{raw_ext}"), recursive=True)))
+    return table_files, raw_files
+
+
+def build_eraa_warehouse(warehouse_file: str = OUTPUT_ERAA_WAREHOUSE_FILE):
+    table_files, raw_files = list_eraa_files()
+    print_out_msg(msg_level="info", msg=f"Build ERAA data warehouse, from {len(table_files)} csv and "
+                                        f"{len(raw_files)} raw files")
+    arrays = {}
+    entries = {}
+    for i_file, csv_file in enumerate(table_files):
+        df = read_eraa_csv(csv_file=csv_file, use_cache=False)
+        columns_data, columns_dtype = get_df_columns_data(df=df)
+        key_prefix = f"t{i_file}"
+        for col, col_values in columns_data.items():
+            arrays[f"{key_prefix}/{col}"] = col_values
+        entries[get_warehouse_entry_name(file=csv_file)] = \
+            {"kind": "table", "key_prefix": key_prefix, "columns": list(df.columns), "dtypes": columns_dtype,
+             "n_rows": len(df), "source_size": os.path.getsize(csv_file)}
+    for i_file, raw_file in enumerate(raw_files):
+        key_prefix = f"r{i_file}"
+        with open(raw_file, mode="rb") as f:
+            arrays[key_prefix] = np.frombuffer(f.read(), dtype=np.uint8)
+        entries[get_warehouse_entry_name(file=raw_file)] = \
+            {"kind": "raw", "key_prefix": key_prefix, "source_size": os.path.getsize(raw_file)}
+    catalog = {"format_version": WAREHOUSE_FORMAT_VERSION, "source_folder": INPUT_ERAA_FOLDER, "entries": entries}
+    arrays[CATALOG_KEY] = np.frombuffer(json.dumps(catalog).encode("utf-8"), dtype=np.uint8)
+    os.makedirs(os.path.dirname(warehouse_file), exist_ok=True)
+    # write in a temporary file then rename it, not to expose partially written warehouse to concurrent runs
+    tmp_warehouse_file = f"{warehouse_file}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(tmp_warehouse_file, **arrays)
+    os.replace(tmp_warehouse_file, warehouse_file)
+    print_out_msg(msg_level="info", msg=f"{len(entries)} files stored in {warehouse_file} "
+                                        f"({os.path.getsize(warehouse_file) / 1024 ** 2:.1f}MB)")
+
+
+def get_opened_warehouse(warehouse_file: str = OUTPUT_ERAA_WAREHOUSE_FILE) \
+        -> Optional[Tuple[np.lib.npyio.NpzFile, dict]]:
+    """
+    Get (lazily read) warehouse and its catalog - None if no (valid) warehouse file
+    """
+    if not os.path.isfile(warehouse_file):
+        return None
+    warehouse_key = (os.path.abspath(warehouse_file), os.stat(warehouse_file).st_mtime_ns)
+    if warehouse_key not in OPENED_WAREHOUSES:
+        warehouse = np.load(warehouse_file, allow_pickle=False)
+        catalog = json.loads(warehouse[CATALOG_KEY].tobytes().decode("utf-8"))
+        if catalog.get("format_version") != WAREHOUSE_FORMAT_VERSION:
+            print_out_msg(msg_level="warning", msg=f"Outdated ERAA data warehouse format in {warehouse_file} "
+                                                   f"-> not used; rebuild it")
+            return None
+        OPENED_WAREHOUSES[warehouse_key] = (warehouse, catalog)
+    return OPENED_WAREHOUSES[warehouse_key]
+
+
+def get_warehouse_entry(file: str, warehouse_file: str = OUTPUT_ERAA_WAREHOUSE_FILE) \
+        -> Optional[Tuple[np.lib.npyio.NpzFile, dict]]:
+    """
+    Get (warehouse, catalog entry) of a given ERAA file - None if not in (up-to-date) warehouse
+    """
+    opened_warehouse = get_opened_warehouse(warehouse_file=warehouse_file)
+    entry_name = get_warehouse_entry_name(file=file)
+    if opened_warehouse is None or entry_name is None:
+        return None
+    warehouse, catalog = opened_warehouse
+    entry = catalog["entries"].get(entry_name)
+    if entry is None:
+        return None
+    # source file still present (not needed) but changed since warehouse build -> read it directly
+    if os.path.isfile(file) and os.path.getsize(file) != entry["source_size"]:
+        print_out_msg(msg_level="warning", msg=f"ERAA file {file} changed since warehouse build -> read from file")
+        return None
+    return warehouse, entry
+
+
+def is_in_warehouse(file: str, warehouse_file: str = OUTPUT_ERAA_WAREHOUSE_FILE) -> bool:
+    return get_warehouse_entry(file=file, warehouse_file=warehouse_file) is not None
+
+
+def read_df_from_warehouse(csv_file: str, warehouse_file: str = OUTPUT_ERAA_WAREHOUSE_FILE) \
+        -> Optional[pd.DataFrame]:
+    """
+    Read (typed) data of an ERAA csv file from warehouse - None if not in it
+    """
+    warehouse_entry = get_warehouse_entry(file=csv_file, warehouse_file=warehouse_file)
+    if warehouse_entry is None or warehouse_entry[1]["kind"] != "table":
+        return None
+    warehouse, entry = warehouse_entry
+    key_prefix = entry["key_prefix"]
+    return get_df_from_columns_data(columns_data=warehouse, columns=entry["columns"], columns_dtype=entry["dtypes"],
+                                    key_prefix=f"{key_prefix}/")
+
+
+def read_raw_file_from_warehouse(file: str, warehouse_file: str = OUTPUT_ERAA_WAREHOUSE_FILE) -> Optional[bytes]:
+    """
+    Read raw content of an ERAA (non-csv) file from warehouse - None if not in it
+    """
+    warehouse_entry = get_warehouse_entry(file=file, warehouse_file=warehouse_file)
+    if warehouse_entry is None or warehouse_entry[1]["kind"] != "raw":
+        return None
+    warehouse, entry = warehouse_entry
+    return warehouse[entry["key_prefix"]].tobytes()
+
+
+if __name__ == "__main__":
+    build_eraa_warehouse()
@@ -0,0 +1,138 @@
+import math
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from long_term_uc.common.long_term_uc_io import COLUMN_NAMES, DATE_FORMAT, FILES_FORMAT, MIN_DATE_IN_DATA, \
+    N_HOURS_PER_CLIMATIC_YEAR
+from long_term_uc.utils.eraa_utils import PARSED_DATE_DTYPE, cast_eraa_date_col
+
+
+# number of rows parsed at once when streaming an ERAA time-series file
+TS_READ_CHUNK_SIZE = N_HOURS_PER_CLIMATIC_YEAR
+
+
+def get_hour_offset(date: datetime, round_up: bool = False) -> int:
+    """
+    Get (hour) offset of a date relatively to the first date in ERAA data, bounded to a climatic year length
+    """
+    n_hours = (date - MIN_DATE_IN_DATA).total_seconds() / 3600
+    n_hours = math.ceil(n_hours) if round_up is True else math.floor(n_hours)
+    return min(max(n_hours, 0), N_HOURS_PER_CLIMATIC_YEAR)
+
+
+@dataclass
+class ERAATsIndex:
+    # position of first row of each climatic year block in ERAA time-series file
+    cy_first_row: Dict[int, int]
+    n_hours_per_cy: int = N_HOURS_PER_CLIMATIC_YEAR
+
+    def get_row_range(self, climatic_year: int, period_start: datetime,
+                      period_end: datetime) -> Optional[Tuple[int, int]]:
+        """
+        Get [first row, last row + 1) of data for a given climatic year and period [period_start, period_end)
+        -> None if climatic year not in file
+        """
+        if climatic_year not in self.cy_first_row:
+            return None
+        first_row = self.cy_first_row[climatic_year]
+        start_offset = get_hour_offset(date=period_start)
+        end_offset = max(get_hour_offset(date=period_end, round_up=True), start_offset)
+        return first_row + start_offset, first_row + end_offset
+
+
+def build_eraa_ts_index(climatic_years: np.ndarray) -> Optional[ERAATsIndex]:
+    """
+    Build index of an ERAA time-series file from its climatic year column values
+    -> None if the file does not follow the fixed layout (one full block of hourly values per climatic year)
+    """
+    n_rows = len(climatic_years)
+    if n_rows == 0 or n_rows % N_HOURS_PER_CLIMATIC_YEAR != 0:
+        return None
+    cy_blocks = np.asarray(climatic_years).reshape(-1, N_HOURS_PER_CLIMATIC_YEAR)
+    blocks_cy = cy_blocks[:, 0]
+    if not np.all(cy_blocks == blocks_cy[:, None]) or len(np.unique(blocks_cy)) < len(blocks_cy):
+        return None
+    return ERAATsIndex(cy_first_row={int(cy): i_block * N_HOURS_PER_CLIMATIC_YEAR
+                                     for i_block, cy in enumerate(blocks_cy)})
+
+
+# indexes already built in current process {(file, size, modif. time of file signing its data): index - None
+# for files without fixed layout}
+ERAA_TS_INDEXES: Dict[Tuple[str, int, int], Optional[ERAATsIndex]] = {}
+
+
+def get_eraa_ts_index(csv_file: str, climatic_years: np.ndarray, signature_file: str = None) \
+        -> Optional[ERAATsIndex]:
+    """
+    Get index of an ERAA time-series file - built (full check of its climatic year blocks) once per file and
+    process, then kept as long as the file is unchanged
+    :param climatic_years: climatic year column values of file, to build index if not yet done
+    :param signature_file: file whose size and modif. time sign data of csv_file (e.g. data warehouse, if csv
+    file only in it); csv_file itself by default
+    """
+    signature_file = csv_file if signature_file is None else signature_file
+    if not os.path.isfile(signature_file):
+        return build_eraa_ts_index(climatic_years=climatic_years)
+    file_stat = os.stat(signature_file)
+    index_key = (os.path.abspath(csv_file), file_stat.st_size, file_stat.st_mtime_ns)
+    if index_key not in ERAA_TS_INDEXES:
+        ERAA_TS_INDEXES[index_key] = build_eraa_ts_index(climatic_years=climatic_years)
+    return ERAA_TS_INDEXES[index_key]
+
+
+def read_eraa_ts_pushdown(csv_file: str, climatic_year: int, period_start: datetime, period_end: datetime,
+                          date_col: str = COLUMN_NAMES.date, climatic_year_col: str = COLUMN_NAMES.climatic_year,
+                          value_col: str = COLUMN_NAMES.value,
+                          chunk_size: int = TS_READ_CHUNK_SIZE) -> pd.DataFrame:
+    """
+    Stream an ERAA time-series file by chunks, keeping only rows of a climatic year and period
+    [period_start, period_end) - only (climatic year, date, float value) columns are parsed; reading stops once
+    past the period, ERAA files being made of contiguous climatic year blocks sorted by date
+    """
+    # ERAA dates format being "big-endian" and zero-padded, str dates can be directly compared
+    period_start_str = period_start.strftime(DATE_FORMAT)
+    period_end_str = period_end.strftime(DATE_FORMAT)
+    chunks_filtered = []
+    cy_block_found = False
+    with pd.read_csv(csv_file, sep=FILES_FORMAT.column_sep, decimal=FILES_FORMAT.decimal_sep,
+                     usecols=[climatic_year_col, date_col, value_col], dtype={value_col: float},
+                     chunksize=chunk_size) as chunks:
+        for chunk in chunks:
+            is_cy = (chunk[climatic_year_col] == climatic_year).to_numpy()
+            if not is_cy.any():
+                if cy_block_found is True:
+                    break
+                continue
+            chunk_dates = chunk[date_col]
+            is_in_period = is_cy & (chunk_dates >= period_start_str).to_numpy() \
+                & (chunk_dates < period_end_str).to_numpy()
+            if is_in_period.any():
+                chunks_filtered.append(chunk[is_in_period])
+            # end of climatic year block, or of the period, reached in this chunk
+            if not is_cy[-1] or chunk_dates.iloc[-1] >= period_end_str:
+                break
+            cy_block_found = True
+    if len(chunks_filtered) == 0:
+        return pd.DataFrame({climatic_year_col: pd.Series(dtype=int), date_col: pd.Series(dtype=PARSED_DATE_DTYPE),
+                             value_col: pd.Series(dtype=float)})
+    # dates only cast for kept rows
+    return cast_eraa_date_col(df=pd.concat(chunks_filtered), date_col=date_col)
+
+
+def are_sliced_dates_coherent(dates: pd.Series, period_start: datetime, period_end: datetime) -> bool:
+    """
+    Check first and last dates of a slice obtained with index, to fall back on a scan if file layout unexpected
+    """
+    start_offset = get_hour_offset(date=period_start)
+    end_offset = max(get_hour_offset(date=period_end, round_up=True), start_offset)
+    if len(dates) != end_offset - start_offset:
+        return False
+    if len(dates) == 0:
+        return True
+    expected_first_date = pd.Timestamp(MIN_DATE_IN_DATA) + pd.Timedelta(hours=start_offset)
+    expected_last_date = pd.Timestamp(MIN_DATE_IN_DATA) + pd.Timedelta(hours=end_offset - 1)
+    return dates.iloc[0] == expected_first_date and dates.iloc[-1] == expected_last_date
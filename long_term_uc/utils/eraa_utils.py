@@ -1,6 +1,13 @@
-from typing import Dict, List, Tuple, Union
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
 
-from long_term_uc.common.long_term_uc_io import INTERCO_STR_SEP
+from long_term_uc.common.long_term_uc_io import COLUMN_NAMES, FILES_FORMAT, INTERCO_STR_SEP, DATE_FORMAT, \
+    MIN_DATE_IN_DATA, N_HOURS_PER_CLIMATIC_YEAR, get_zones_to_market_nodes_file
+from long_term_uc.utils.df_utils import cast_df_col_as_date
 
 
 def set_interco_to_tuples(interco_names: str, return_corresp: bool = False) \
@@ -9,4 +16,89 @@ def set_interco_to_tuples(interco_names: str, return_corresp: bool = False) \
         return {interco: tuple(interco.split(INTERCO_STR_SEP)) for interco in interco_names}
     else:
         return [tuple(interco.split(INTERCO_STR_SEP)) for interco in interco_names]
-    
\ No newline at end of file
+
+
+@lru_cache(maxsize=1)
+def read_zones_to_market_nodes() -> Dict[str, Tuple[str, ...]]:
+    """
+    Read correspondence {(meta-)country: its ERAA market nodes} - empty if no correspondence file
+    """
+    corresp_file = get_zones_to_market_nodes_file()
+    if not os.path.isfile(corresp_file):
+        return {}
+    df_corresp = pd.read_csv(corresp_file, sep=FILES_FORMAT.column_sep)
+    return df_corresp.groupby(COLUMN_NAMES.zone, sort=False)[COLUMN_NAMES.market_node].agg(tuple).to_dict()
+
+
+def is_market_node(zone: str) -> bool:
+    return any(zone in market_nodes for market_nodes in read_zones_to_market_nodes().values())
+
+
+@dataclass
+class IntercoCapasMatrix:
+    zones: List[str]
+    # capas[i, j] capacity from zones[i] to zones[j]; NaN when no interco. data
+    capas: np.ndarray
+    zone_idx: Dict[str, int] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.zone_idx = {zone: i for i, zone in enumerate(self.zones)}
+
+    def get_capa(self, zone_origin: str, zone_dest: str) -> Optional[float]:
+        if zone_origin not in self.zone_idx or zone_dest not in self.zone_idx:
+            return None
+        capa = self.capas[self.zone_idx[zone_origin], self.zone_idx[zone_dest]]
+        return None if np.isnan(capa) else float(capa)
+
+
+def set_interco_capas_matrix(interco_capas: Dict[Tuple[str, str], float], zones: List[str]) -> IntercoCapasMatrix:
+    """
+    Set (zone origin, zone destination) matrix of interco. capas, from dict. {(zone origin, zone destination): capa}
+    """
+    interco_capas_matrix = IntercoCapasMatrix(zones=zones, capas=np.full((len(zones), len(zones)), np.nan))
+    zone_idx = interco_capas_matrix.zone_idx
+    selec_intercos = [(interco, capa) for interco, capa in interco_capas.items()
+                      if interco[0] in zone_idx and interco[1] in zone_idx]
+    if len(selec_intercos) > 0:
+        origin_idx = np.array([zone_idx[interco[0]] for interco, _ in selec_intercos])
+        dest_idx = np.array([zone_idx[interco[1]] for interco, _ in selec_intercos])
+        interco_capas_matrix.capas[origin_idx, dest_idx] = [capa for _, capa in selec_intercos]
+    return interco_capas_matrix
+
+
+# datetime type obtained when parsing ERAA dates (resolution is pandas version dependent)
+PARSED_DATE_DTYPE = pd.to_datetime(pd.Series([MIN_DATE_IN_DATA.strftime(DATE_FORMAT)]), format=DATE_FORMAT).dtype
+
+
+def get_eraa_dates_from_row_position(n_rows: int, first_row: int = 0) -> np.ndarray:
+    """
+    Get dates of an ERAA time-series file, from row positions only; based on its fixed layout:
+    successive blocks of N_HOURS_PER_CLIMATIC_YEAR hourly values (one per climatic year) on the 1900 calendar
+    """
+    hour_offsets = np.arange(first_row, first_row + n_rows, dtype="int64") % N_HOURS_PER_CLIMATIC_YEAR
+    return np.datetime64(MIN_DATE_IN_DATA, "ns") + hour_offsets.astype("timedelta64[h]")
+
+
+def is_fixed_eraa_layout(date_strs: pd.Series) -> bool:
+    """
+    Check - on first and last rows of each climatic year block - that dates (str) follow the fixed ERAA layout
+    """
+    n_rows = len(date_strs)
+    if n_rows == 0 or n_rows % N_HOURS_PER_CLIMATIC_YEAR != 0:
+        return False
+    block_starts = np.arange(0, n_rows, N_HOURS_PER_CLIMATIC_YEAR)
+    check_positions = np.concatenate([block_starts, block_starts + N_HOURS_PER_CLIMATIC_YEAR - 1])
+    expected_dates = pd.DatetimeIndex(get_eraa_dates_from_row_position(n_rows=n_rows)[check_positions])
+    return bool(np.all(date_strs.iloc[check_positions].to_numpy() == expected_dates.strftime(DATE_FORMAT).to_numpy()))
+
+
+def cast_eraa_date_col(df: pd.DataFrame, date_col: str) -> pd.DataFrame:
+    """
+    Cast (str) date column of an ERAA data df as datetime; directly from row positions when fixed
+    ERAA layout is detected, with (vectorized) parsing of the dates otherwise
+    """
+    if is_fixed_eraa_layout(date_strs=df[date_col]):
+        df[date_col] = pd.Series(get_eraa_dates_from_row_position(n_rows=len(df)),
+                                 index=df.index).astype(PARSED_DATE_DTYPE)
+        return df
+    return cast_df_col_as_date(df=df, date_col=date_col, date_format=DATE_FORMAT)